@@ -8,8 +8,10 @@ from pathlib import Path
 from dotenv import load_dotenv
 
 from modules.data_models import NovelProject
-from modules.storage import ProjectStorage
+from modules.storage import BaseProjectStorage, create_storage
 from modules.ai_client import AIClient
+from modules.async_client import AsyncAIClient
+from modules.jobs import JobRunner, sync_session_project
 
 # 環境変数の読み込み
 load_dotenv()
@@ -22,12 +24,43 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+
+@st.cache_resource
+def get_storage() -> BaseProjectStorage:
+    """プロセス全体で共有するストレージ（保存先は AI_NOVELIST_STORAGE で選ぶ）"""
+    return create_storage()
+
+
+@st.cache_resource
+def get_ai_client() -> AIClient:
+    """プロセス全体で共有する AIClient（SDK は初回の呼び出し時に初期化）"""
+    return AIClient()
+
+
+@st.cache_resource
+def get_async_ai_client() -> AsyncAIClient:
+    """プロセス全体で共有する AsyncAIClient（同時実行数の上限も共有される）"""
+    return AsyncAIClient(get_ai_client())
+
+
+@st.cache_resource
+def get_job_runner() -> JobRunner:
+    """プロセス全体で共有するジョブの実行（ページを移動しても生成が続く）"""
+    return JobRunner.from_env(get_ai_client(), get_storage())
+
+
 # セッション状態の初期化
 if 'storage' not in st.session_state:
-    st.session_state.storage = ProjectStorage()
+    st.session_state.storage = get_storage()
 
 if 'ai_client' not in st.session_state:
-    st.session_state.ai_client = AIClient()
+    st.session_state.ai_client = get_ai_client()
+
+if 'async_ai_client' not in st.session_state:
+    st.session_state.async_ai_client = get_async_ai_client()
+
+if 'job_runner' not in st.session_state:
+    st.session_state.job_runner = get_job_runner()
 
 if 'current_project' not in st.session_state:
     st.session_state.current_project = None
@@ -35,6 +68,9 @@ if 'current_project' not in st.session_state:
 if 'project_name' not in st.session_state:
     st.session_state.project_name = ""
 
+# バックグラウンドのジョブが完了していれば、保存された結果を読み直す
+sync_session_project(st.session_state, st.session_state.job_runner, st.session_state.storage)
+
 
 def save_current_project():
     """現在のプロジェクトを保存"""
@@ -82,6 +118,10 @@ with st.sidebar:
     else:
         st.warning("⚠ Anthropic API キーが未設定")
 
+    local_base_url = os.getenv("AI_LOCAL_BASE_URL")
+    if local_base_url:
+        st.success(f"✓ ローカルモデル: {local_base_url}")
+
     st.divider()
 
     # プロジェクト選択
@@ -109,30 +149,66 @@ with st.sidebar:
                 st.error("プロジェクト名を入力してください")
 
     else:  # 既存プロジェクトを開く
-        projects = st.session_state.storage.list_projects()
-
-        if projects:
-            selected_project = st.selectbox(
-                "プロジェクトを選択",
-                projects,
-                key="selected_project"
+        # 索引から読むので、プロジェクトの数が多くても各ファイルは開かない
+        project_infos = st.session_state.storage.list_project_info()
+
+        if project_infos:
+            filter_text = st.text_input("名前で絞り込み", key="project_filter")
+            sort_order = st.selectbox(
+                "並び順",
+                ["更新日時が新しい順", "作成日時が新しい順", "名前順", "本文が長い順"],
+                key="project_sort"
             )
 
-            if st.button("プロジェクトを開く", type="primary", use_container_width=True):
-                if load_project(selected_project):
-                    st.success(f"プロジェクト '{selected_project}' を開きました")
-                    st.rerun()
-                else:
-                    st.error("プロジェクトの読み込みに失敗しました")
-
-            # プロジェクト削除
-            if st.button("プロジェクトを削除", use_container_width=True):
-                if st.session_state.storage.delete_project(selected_project):
-                    st.success(f"プロジェクト '{selected_project}' を削除しました")
-                    if st.session_state.project_name == selected_project:
-                        st.session_state.current_project = None
-                        st.session_state.project_name = ""
-                    st.rerun()
+            if filter_text:
+                project_infos = [
+                    info for info in project_infos
+                    if filter_text.lower() in info.name.lower()
+                ]
+            if sort_order == "更新日時が新しい順":
+                project_infos.sort(key=lambda info: info.updated_at, reverse=True)
+            elif sort_order == "作成日時が新しい順":
+                project_infos.sort(key=lambda info: info.created_at, reverse=True)
+            elif sort_order == "名前順":
+                project_infos.sort(key=lambda info: info.name)
+            else:
+                project_infos.sort(key=lambda info: info.novel_chars, reverse=True)
+
+            infos_by_name = {info.name: info for info in project_infos}
+            if not infos_by_name:
+                st.info("条件に合うプロジェクトはありません")
+            else:
+                selected_project = st.selectbox(
+                    "プロジェクトを選択",
+                    list(infos_by_name),
+                    format_func=lambda name: (
+                        f"{name}（{len(infos_by_name[name].completed_steps)}/6, "
+                        f"{infos_by_name[name].novel_chars:,}文字）"
+                    ),
+                    key="selected_project"
+                )
+
+                selected_info = infos_by_name[selected_project]
+                st.caption(
+                    f"更新: {selected_info.updated_at[:16].replace('T', ' ')} / "
+                    f"登場人物 {selected_info.character_count}人"
+                )
+
+                if st.button("プロジェクトを開く", type="primary", use_container_width=True):
+                    if load_project(selected_project):
+                        st.success(f"プロジェクト '{selected_project}' を開きました")
+                        st.rerun()
+                    else:
+                        st.error("プロジェクトの読み込みに失敗しました")
+
+                # プロジェクト削除
+                if st.button("プロジェクトを削除", use_container_width=True):
+                    if st.session_state.storage.delete_project(selected_project):
+                        st.success(f"プロジェクト '{selected_project}' を削除しました")
+                        if st.session_state.project_name == selected_project:
+                            st.session_state.current_project = None
+                            st.session_state.project_name = ""
+                        st.rerun()
         else:
             st.info("保存されているプロジェクトはありません")
 
@@ -142,20 +218,9 @@ with st.sidebar:
         st.subheader("現在のプロジェクト")
         st.write(f"**{st.session_state.project_name}**")
 
-        # 進捗状況
-        progress = []
-        if st.session_state.current_project.idea_fragments:
-            progress.append("✓ アイデア選択")
-        if st.session_state.current_project.settings:
-            progress.append("✓ 設定決定")
-        if st.session_state.current_project.plots:
-            progress.append("✓ プロット作成")
-        if st.session_state.current_project.characters:
-            progress.append("✓ 登場人物")
-        if st.session_state.current_project.writing_config:
-            progress.append("✓ 執筆設定")
-        if st.session_state.current_project.novel_text:
-            progress.append("✓ 本文執筆")
+        # 進捗状況（本文などまだ読み込んでいない部分は保存時の件数で判定する）
+        project_info = st.session_state.storage.describe_project(st.session_state.current_project)
+        progress = [f"✓ {step}" for step in project_info.completed_steps]
 
         if progress:
             st.write("進捗:")
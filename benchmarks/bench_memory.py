@@ -0,0 +1,145 @@
+"""
+メモリ使用量のベンチマーク
+保存済みのプロジェクトを読み込んだときのメモリ使用量を tracemalloc で計測し、
+以前のデータクラス（__slots__ なし、作成日時は文字列）と比較する
+
+    python benchmarks/bench_memory.py --sessions 20 --fragments 2000
+
+1セッションで1つの大きなプロジェクトを保持している状態を想定し、
+セッションあたりと1件あたりのメモリ使用量を表示する。
+"""
+import argparse
+import gc
+import json
+import random
+import sys
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from modules.data_models import section_from_data  # noqa: E402
+
+
+# 以前の定義
+@dataclass
+class LegacyIdeaFragment:
+    text: str
+    selected: bool = False
+    category: Optional[str] = None
+
+
+@dataclass
+class LegacySetting:
+    text: str
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+
+
+@dataclass
+class LegacyPlot:
+    text: str
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+
+
+@dataclass
+class LegacyCharacter:
+    name: str
+    personality: str
+    background: Optional[str] = None
+    role: Optional[str] = None
+
+
+LEGACY_TYPES = {
+    "idea_fragments": LegacyIdeaFragment,
+    "settings": LegacySetting,
+    "plots": LegacyPlot,
+    "characters": LegacyCharacter,
+}
+
+CATEGORIES = ["人物", "舞台", "出来事", "雰囲気", "テーマ"]
+ROLES = ["主人公", "ヒロイン", "ライバル", "脇役", "敵役"]
+KANA = "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん"
+
+
+def make_text(rng: random.Random, length: int) -> str:
+    return "".join(rng.choice(KANA) for _ in range(length))
+
+
+def make_sections(rng: random.Random, args) -> dict:
+    """1つのプロジェクトの部分データ（保存されている JSON の形）"""
+    start = datetime(2025, 1, 1)
+
+    def created_at() -> str:
+        return (start + timedelta(microseconds=rng.randrange(10 ** 13))).isoformat()
+
+    return {
+        "idea_fragments": [
+            {"text": make_text(rng, 20), "selected": rng.random() < 0.3, "category": rng.choice(CATEGORIES)}
+            for _ in range(args.fragments)
+        ],
+        "settings": [{"text": make_text(rng, 300), "created_at": created_at()} for _ in range(args.settings)],
+        "plots": [{"text": make_text(rng, 300), "created_at": created_at()} for _ in range(args.plots)],
+        "characters": [
+            {
+                "name": make_text(rng, 4),
+                "personality": make_text(rng, 40),
+                "background": make_text(rng, 80),
+                "role": rng.choice(ROLES),
+            }
+            for _ in range(args.characters)
+        ],
+    }
+
+
+def load_legacy(name: str, data: list) -> list:
+    cls = LEGACY_TYPES[name]
+    return [cls(**item) for item in data]
+
+
+def measure(sources: list, name: str, load) -> int:
+    """JSON から各セッションの部分を読み込んだあとに残るメモリ（バイト）"""
+    gc.collect()
+    tracemalloc.start()
+    loaded = [load(name, json.loads(source)[name]) for source in sources]
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del loaded
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="データモデルのメモリ使用量のベンチマーク")
+    parser.add_argument("--sessions", type=int, default=20, help="同時に保持するセッション数")
+    parser.add_argument("--fragments", type=int, default=2000, help="1プロジェクトのアイデアの断片の数")
+    parser.add_argument("--settings", type=int, default=50, help="1プロジェクトの設定の数")
+    parser.add_argument("--plots", type=int, default=50, help="1プロジェクトのプロットの数")
+    parser.add_argument("--characters", type=int, default=100, help="1プロジェクトの登場人物の数")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    # セッションごとに別々に読み込む（文字列が共有されないよう JSON から作る）
+    sources = [json.dumps(make_sections(rng, args), ensure_ascii=False) for _ in range(args.sessions)]
+    counts = {name: getattr(args, name.split("_")[-1]) for name in LEGACY_TYPES}
+
+    print(f"{args.sessions}セッション / 1セッションあたりの KB と 1件あたりのバイト数\n")
+    print(f"{'部分':>16} {'件数':>7} {'以前(KB)':>10} {'現在(KB)':>10} {'以前(B/件)':>11} {'現在(B/件)':>11} {'削減':>6}")
+    totals = [0, 0]
+    for name in LEGACY_TYPES:
+        legacy = measure(sources, name, load_legacy) / args.sessions
+        current = measure(sources, name, section_from_data) / args.sessions
+        totals[0] += legacy
+        totals[1] += current
+        count = counts[name]
+        print(f"{name:>16} {count:>7} {legacy / 1024:>10.1f} {current / 1024:>10.1f}"
+              f" {legacy / count:>11.0f} {current / count:>11.0f} {1 - current / legacy:>6.0%}")
+    print(f"{'合計':>16} {sum(counts.values()):>7} {totals[0] / 1024:>10.1f} {totals[1] / 1024:>10.1f}"
+          f" {'':>11} {'':>11} {1 - totals[1] / totals[0]:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+パイプライン全体のベンチマーク
+ネットワークに接続せず、偽プロバイダー（FakeProvider）を使って
+アイデア → 設定 → プロット → 登場人物 → プロンプト → 本文 の6ステップを通しで実行し、
+ステップごとの応答時間（中央値・95%）と全体のスループットを計測する
+
+    python benchmarks/bench_pipeline.py --runs 20 --workers 4
+    python benchmarks/bench_pipeline.py --latency 0 --chars-per-second 0   # 待ち時間なし（CPU の処理だけ）
+
+各ステップは画面と同じく AIClient のメソッドを呼び、結果をプロジェクトに反映して保存するまでを計測する。
+本文はストリームで受け取り、stream_into_project で途中経過を保存しながら書き込む。
+応答の遅延・生成速度・レート制限・壊れた応答の割合はオプションで指定できる。
+"""
+import argparse
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from modules.ai_client import AIClient  # noqa: E402
+from modules.data_models import (  # noqa: E402
+    Character, IdeaFragment, NovelProject, Plot, SECTION_NAMES, Setting, WritingConfig
+)
+from modules.metrics import MetricsRegistry  # noqa: E402
+from modules.providers import FakeProvider  # noqa: E402
+from modules.retry import AIClientError, RequestExecutor, RetryPolicy  # noqa: E402
+from modules.sqlite_storage import SQLiteProjectStorage  # noqa: E402
+from modules.storage import ProjectStorage  # noqa: E402
+from modules.streaming import stream_into_project  # noqa: E402
+
+STEPS = ["アイデア", "膨らませる", "設定", "プロット", "登場人物", "プロンプト", "本文", "読み込み"]
+
+
+class Recorder:
+    """ステップごとの所要時間と失敗数（スレッドセーフ）"""
+
+    def __init__(self):
+        self.timings = {step: [] for step in STEPS}
+        self.failures = {step: {} for step in STEPS}
+        self._lock = threading.Lock()
+
+    def step(self, name: str, func):
+        start = time.perf_counter()
+        try:
+            result = func()
+        except AIClientError as e:
+            with self._lock:
+                self.failures[name][e.kind] = self.failures[name].get(e.kind, 0) + 1
+            raise
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.timings[name].append(elapsed)
+        return result
+
+
+def run_pipeline(client: AIClient, storage, recorder: Recorder, name: str, args) -> int:
+    """1つのプロジェクトを最初から本文まで進め、本文の文字数を返す"""
+    project = NovelProject(project_name=name)
+
+    def ideas():
+        project.idea_fragments = [IdeaFragment(text) for text in client.generate_idea_fragments_stream(20)]
+        for fragment in project.idea_fragments[:3]:
+            fragment.selected = True
+        storage.save_project(project)
+
+    def expand():
+        selected = [f.text for f in project.idea_fragments if f.selected]
+        project.expanded_ideas.append(client.expand_ideas(selected))
+        storage.save_project(project)
+
+    def setting():
+        project.settings.append(Setting(client.generate_setting(project.expanded_ideas[-1])))
+        project.selected_setting_index = 0
+        storage.save_project(project)
+
+    def plot():
+        project.plots.append(Plot(client.generate_plot(project.settings[0].text)))
+        project.selected_plot_index = 0
+        storage.save_project(project)
+
+    def characters():
+        project.characters = [
+            Character(**c)
+            for c in client.generate_characters(project.settings[0].text, project.plots[0].text, 3)
+        ]
+        storage.save_project(project)
+
+    def prompt():
+        project.writing_config = WritingConfig(args.length, "文学的", "ミステリアス", args.model)
+        storage.save_project(project)
+        return client.generate_novel_prompt(
+            project.settings[0].text,
+            project.plots[0].text,
+            [c.to_dict() for c in project.characters],
+            args.length,
+            "文学的",
+            "ミステリアス"
+        )
+
+    def novel():
+        config = project.writing_config
+        chunks = client.write_novel_stream(
+            project.settings[0].text,
+            project.plots[0].text,
+            [c.to_dict() for c in project.characters],
+            config.length,
+            config.style,
+            config.tone,
+            config.ai_model
+        )
+        return stream_into_project(chunks, project, storage)
+
+    def load():
+        loaded = storage.load_project(name)
+        for section in SECTION_NAMES:
+            getattr(loaded, section)
+
+    for step, func in zip(STEPS, (ideas, expand, setting, plot, characters, prompt, novel, load)):
+        recorder.step(step, func)
+    return len(project.novel_text)
+
+
+def percentile(values: list, q: float) -> float:
+    """q 分位点（最近順位法）"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(q * len(ordered) + 0.5) - 1))]
+
+
+def make_client(args) -> AIClient:
+    def provider(name: str, seed: int) -> FakeProvider:
+        return FakeProvider(
+            name=name,
+            seed=seed,
+            latency=args.latency,
+            chars_per_second=args.chars_per_second or float("inf"),
+            chunk_chars=args.chunk_chars,
+            requests_per_minute=args.rpm,
+            malformed_rate=args.malformed_rate
+        )
+
+    return AIClient(
+        cache=None,
+        executor=RequestExecutor(policy=RetryPolicy(max_attempts=4, base_delay=0.1, max_delay=5.0)),
+        metrics=MetricsRegistry(),
+        providers={"gemini": provider("gemini", args.seed), "anthropic": provider("anthropic", args.seed + 1)}
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="6ステップのパイプライン全体のベンチマーク（オフライン）")
+    parser.add_argument("--runs", type=int, default=20, help="実行するパイプラインの数")
+    parser.add_argument("--workers", type=int, default=1, help="同時に実行するパイプラインの数")
+    parser.add_argument("--storage", choices=["files", "sqlite"], default="files", help="保存先")
+    parser.add_argument("--model", default="haiku3.5", help="本文の執筆に使うモデル")
+    parser.add_argument("--length", default="短編", choices=["短編", "中編", "長編"], help="本文の分量")
+    parser.add_argument("--latency", type=float, default=0.05, help="最初の断片までの秒数")
+    parser.add_argument("--chars-per-second", type=float, default=2000.0, help="生成速度（0 なら待たない）")
+    parser.add_argument("--chunk-chars", type=int, default=40, help="ストリームの1断片の文字数")
+    parser.add_argument("--rpm", type=float, default=0, help="偽プロバイダーの1分あたりの呼び出し上限（0 なら制限なし）")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="応答が途中で途切れる確率")
+    parser.add_argument("--seed", type=int, default=0, help="偽プロバイダーの乱数の種")
+    args = parser.parse_args()
+
+    client = make_client(args)
+    recorder = Recorder()
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_pipeline_"))
+    try:
+        if args.storage == "sqlite":
+            storage = SQLiteProjectStorage(str(work_dir / "projects.db"))
+        else:
+            storage = ProjectStorage(str(work_dir / "projects"))
+
+        def run(i: int):
+            try:
+                return run_pipeline(client, storage, recorder, f"ベンチマーク{i:04d}", args)
+            except AIClientError:
+                return None
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            results = list(pool.map(run, range(args.runs)))
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    completed = [chars for chars in results if chars is not None]
+    print(f"{args.runs}回 / 同時実行 {args.workers} / 保存先 {args.storage} / 遅延 {args.latency}秒"
+          f" / {args.chars_per_second:g}文字/秒 / 壊れた応答 {args.malformed_rate:.0%}\n")
+    print(f"{'ステップ':>10} {'回数':>5} {'中央値(ms)':>11} {'95%(ms)':>10} {'失敗':>5}")
+    for step in STEPS:
+        timings = recorder.timings[step]
+        failures = sum(recorder.failures[step].values())
+        if timings:
+            print(f"{step:>10} {len(timings):>5} {percentile(timings, 0.5) * 1000:>11.1f}"
+                  f" {percentile(timings, 0.95) * 1000:>10.1f} {failures:>5}")
+        else:
+            print(f"{step:>10} {0:>5} {'-':>11} {'-':>10} {failures:>5}")
+
+    print(f"\n完了 {len(completed)}/{args.runs}  所要時間 {elapsed:.2f}秒")
+    print(f"スループット: {len(completed) / elapsed:.2f} パイプライン/秒, {sum(completed) / elapsed:,.0f} 本文文字/秒")
+
+    errors = {
+        f"{step}: {kind}": count
+        for step in STEPS for kind, count in recorder.failures[step].items()
+    }
+    if errors:
+        print("失敗の内訳: " + "、".join(f"{key} {count}" for key, count in errors.items()))
+
+    print("\nモデルごとの API 呼び出し（MetricsRegistry）")
+    for model, stats in sorted(client.metrics.by_model().items()):
+        print(f"  {model}: {stats.calls}回, 平均 {(stats.latency.mean or 0) * 1000:.1f} ms,"
+              f" 入力 {stats.input_tokens:,} / 出力 {stats.output_tokens:,} トークン")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+シリアライズのベンチマーク
+従来の方法（asdict + 整形した JSON）と、各保存形式の変換時間とサイズを比較する
+
+    python benchmarks/bench_serialization.py --sizes 10 100 1000 5000
+
+サイズは従来の JSON にしたときのおおよその KB 数。
+zstd / msgpack は対応するパッケージがインストールされている場合のみ計測する。
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from dataclasses import asdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from modules import serialization  # noqa: E402
+from modules.data_models import (  # noqa: E402
+    Chapter, Character, IdeaFragment, NovelProject, Plot, Setting, WritingConfig
+)
+
+# 本文の材料（同じ文の繰り返しだと圧縮率が実際より高く出るため、語をつないで文を作る）
+WORDS = (
+    "波 音 遠く 彼女 古い 手紙 灯台 階段 十年 町 人々 夜 窓 季節 雪 少年 答え ポケット 鍵 "
+    "風向き 潮 匂い 記憶 手がかり 港 船 約束 祖母 写真 坂道 夕暮れ 沈黙 足音 扉 影 光 "
+    "海 空 声 名前 時計 地図 列車 駅 雨 傘 花 森 川 橋 星 月 夢 涙 笑顔 秘密 嘘 真実"
+).split()
+PARTICLES = ["は", "が", "を", "に", "で", "と", "の", "から", "まで", "へ"]
+ENDINGS = ["た。", "ていた。", "だった。", "ように思えた。", "のだろうか。", "ことに気づいた。", "」と言った。"]
+
+
+def make_sentence(rng: random.Random) -> str:
+    parts = []
+    for _ in range(rng.randint(3, 7)):
+        parts.append(rng.choice(WORDS) + rng.choice(PARTICLES))
+    return "".join(parts) + rng.choice(WORDS) + rng.choice(ENDINGS)
+
+
+def make_text(rng: random.Random, sentences: int) -> str:
+    return "".join(make_sentence(rng) for _ in range(sentences))
+
+
+def make_project(target_kb: int) -> NovelProject:
+    """従来の JSON でおよそ target_kb KB になるプロジェクト"""
+    rng = random.Random(target_kb)
+    project = NovelProject(project_name=f"ベンチマーク{target_kb}KB")
+    project.idea_fragments = [IdeaFragment(f"アイデア{i}", selected=i % 2 == 0) for i in range(20)]
+    project.settings = [Setting(make_text(rng, 20)) for _ in range(3)]
+    project.plots = [Plot(make_text(rng, 20)) for _ in range(3)]
+    project.characters = [Character(f"人物{i}", make_text(rng, 3)) for i in range(5)]
+    project.chapters = [Chapter(f"第{i + 1}章", make_text(rng, 3)) for i in range(5)]
+    project.writing_config = WritingConfig("長編", "文学的", "静か")
+
+    base_bytes = len(json.dumps(asdict(project), ensure_ascii=False, indent=2).encode("utf-8"))
+    # 日本語は UTF-8 で1文字3バイト
+    text_chars = max(0, (target_kb * 1024 - base_bytes) // 3)
+    paragraphs = []
+    total = 0
+    while total < text_chars:
+        paragraph = make_text(rng, rng.randint(3, 8))
+        paragraphs.append(paragraph)
+        total += len(paragraph) + 1
+    project.novel_text = "\n".join(paragraphs)[:text_chars]
+    return project
+
+
+def timed(func, repeat: int) -> float:
+    """repeat 回実行したときの中央値（ミリ秒）"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def available_formats() -> list[str]:
+    formats = []
+    for storage_format in serialization.FORMATS:
+        try:
+            serialization.dumps({}, storage_format)
+        except RuntimeError:
+            continue
+        formats.append(storage_format)
+    return formats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="プロジェクトのシリアライズのベンチマーク")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000], help="プロジェクトの大きさ（KB）")
+    parser.add_argument("--repeat", type=int, default=5, help="計測回数")
+    args = parser.parse_args()
+
+    formats = available_formats()
+    skipped = [f for f in serialization.FORMATS if f not in formats]
+    if skipped:
+        print(f"パッケージがないため省略: {', '.join(skipped)}\n")
+
+    print(f"{'大きさ':>8} {'方法':>10} {'保存(ms)':>10} {'読込(ms)':>10} {'サイズ(KB)':>11} {'比率':>6}")
+    for size_kb in args.sizes:
+        project = make_project(size_kb)
+
+        # 従来: asdict で複製してから整形した JSON にする
+        legacy_blob = json.dumps(asdict(project), ensure_ascii=False, indent=2).encode("utf-8")
+        legacy_save = timed(
+            lambda: json.dumps(asdict(project), ensure_ascii=False, indent=2).encode("utf-8"), args.repeat
+        )
+        legacy_load = timed(lambda: NovelProject.from_dict(json.loads(legacy_blob)), args.repeat)
+        legacy_size = len(legacy_blob)
+        print(f"{size_kb:>6}KB {'従来':>10} {legacy_save:>10.2f} {legacy_load:>10.2f}"
+              f" {legacy_size / 1024:>11.1f} {1:>6.2f}")
+
+        for storage_format in formats:
+            blob = serialization.dumps(project.to_dict(), storage_format)
+            save = timed(lambda: serialization.dumps(project.to_dict(), storage_format), args.repeat)
+            load = timed(lambda: NovelProject.from_dict(serialization.loads(blob)), args.repeat)
+            print(f"{size_kb:>6}KB {storage_format:>10} {save:>10.2f} {load:>10.2f}"
+                  f" {len(blob) / 1024:>11.1f} {len(blob) / legacy_size:>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+起動ベンチマーク
+AIClient の初回起動時間と、セッションごとのメモリ使用量を計測する
+
+    python benchmarks/bench_startup.py --sessions 20
+
+「eager」は旧実装と同じく構築時に SDK を初期化した場合、
+「lazy」は SDK を初回の呼び出しまで初期化しない現在の実装。
+SDK がインストールされていない環境では eager の計測を省略する。
+"""
+import argparse
+import gc
+import os
+import subprocess
+import sys
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# ネットワークには接続しないため、ダミーのキーで十分
+DUMMY_ENV = {
+    "GOOGLE_API_KEY": "dummy-google-key",
+    "ANTHROPIC_API_KEY": "dummy-anthropic-key"
+}
+
+COLD_START_SCRIPT = """
+import time
+start = time.perf_counter()
+from modules.ai_client import AIClient, GEMINI_FLASH_MODEL, GEMINI_PRO_MODEL
+client = AIClient()
+if {eager}:
+    client.providers["gemini"].model(GEMINI_FLASH_MODEL)
+    client.providers["gemini"].model(GEMINI_PRO_MODEL)
+    client.providers["anthropic"].client
+print(time.perf_counter() - start)
+"""
+
+
+def sdks_available() -> bool:
+    """Gemini と Anthropic の SDK が読み込めるか"""
+    try:
+        import anthropic  # noqa: F401
+        import google.generativeai  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def measure_cold_start(eager: bool, repeat: int) -> list[float]:
+    """新しいプロセスで import から AIClient 構築までの秒数を計測"""
+    env = {**os.environ, **DUMMY_ENV}
+    timings = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", COLD_START_SCRIPT.format(eager=eager)],
+            cwd=ROOT,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return timings
+
+
+def measure_session_memory(sessions: int, shared: bool, eager: bool) -> int:
+    """sessions 個のセッションがクライアントを持つときの確保メモリ（バイト）"""
+    from modules.ai_client import AIClient, GEMINI_FLASH_MODEL, GEMINI_PRO_MODEL
+
+    os.environ.update(DUMMY_ENV)
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+
+    shared_client = AIClient() if shared else None
+    clients = []
+    for _ in range(sessions):
+        client = shared_client or AIClient()
+        if eager:
+            client.providers["gemini"].model(GEMINI_FLASH_MODEL)
+            client.providers["gemini"].model(GEMINI_PRO_MODEL)
+            client.providers["anthropic"].client
+        clients.append(client)
+
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return used
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AIClient の起動ベンチマーク")
+    parser.add_argument("--sessions", type=int, default=20, help="同時セッション数")
+    parser.add_argument("--repeat", type=int, default=5, help="コールドスタートの計測回数")
+    args = parser.parse_args()
+
+    modes = [("lazy", False)]
+    if sdks_available():
+        modes.insert(0, ("eager", True))
+    else:
+        print("SDK が見つからないため eager の計測を省略します\n")
+
+    print("== コールドスタート（import + AIClient 構築） ==")
+    for name, eager in modes:
+        timings = sorted(measure_cold_start(eager, args.repeat))
+        print(f"{name:>6}: 中央値 {timings[len(timings) // 2] * 1000:8.1f} ms"
+              f"（最小 {timings[0] * 1000:.1f} ms / 最大 {timings[-1] * 1000:.1f} ms）")
+
+    print(f"\n== セッションあたりのメモリ（{args.sessions}セッション） ==")
+    for name, eager in modes:
+        for shared in (False, True):
+            used = measure_session_memory(args.sessions, shared, eager)
+            label = f"{name}, {'共有' if shared else 'セッションごと'}"
+            print(f"{label:>20}: 合計 {used / 1024:9.1f} KiB"
+                  f"（1セッションあたり {used / args.sessions / 1024:.1f} KiB）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+ストレージのベンチマーク
+フォルダ形式（ProjectStorage）と SQLite（SQLiteProjectStorage）で、
+プロジェクト数ごとの保存・読み込み・一覧の時間を比較する
+
+    python benchmarks/bench_storage.py --counts 10 1000 10000
+
+「保存」は読み込んだプロジェクトに登場人物を1人追加して保存するまで、
+「読み込み」は読み込んで全部分にアクセスするまで、
+「一覧」は list_project_info の時間。
+"""
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from modules.data_models import (  # noqa: E402
+    Chapter, Character, IdeaFragment, NovelProject, Plot, SECTION_NAMES, Setting, WritingConfig
+)
+from modules.sqlite_storage import SQLiteProjectStorage  # noqa: E402
+from modules.storage import ProjectStorage  # noqa: E402
+
+
+def make_project(name: str, text_chars: int) -> NovelProject:
+    """一通りのステップを終えた程度の大きさのプロジェクト"""
+    project = NovelProject(project_name=name)
+    project.idea_fragments = [IdeaFragment(f"アイデアの断片{i}", selected=i % 3 == 0) for i in range(20)]
+    project.expanded_ideas = ["膨らませたアイデア。" * 30]
+    project.settings = [Setting("舞台は海辺の小さな町。" * 40) for _ in range(3)]
+    project.plots = [Plot("主人公は失った記憶を探して旅に出る。" * 40) for _ in range(3)]
+    project.characters = [Character(f"人物{i}", "穏やかで芯が強い。" * 5, "港町で育った。" * 5, "脇役") for i in range(5)]
+    project.chapters = [Chapter(f"第{i + 1}章", "出来事の概要。" * 10) for i in range(5)]
+    project.selected_setting_index = 0
+    project.selected_plot_index = 0
+    project.writing_config = WritingConfig("長編", "文学的", "静か")
+    project.novel_text = ("波の音が遠くで響いていた。" * (text_chars // 13 + 1))[:text_chars]
+    return project
+
+
+def populate(storage, count: int, text_chars: int) -> None:
+    for i in range(count):
+        storage.save_project(make_project(f"プロジェクト{i:05d}", text_chars))
+
+
+def timed(func, repeat: int) -> float:
+    """repeat 回実行したときの中央値（ミリ秒）"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def bench_backend(storage, target: str, repeat: int) -> dict:
+    def save():
+        project = storage.load_project(target)
+        project.characters.append(Character("追加の人物", "好奇心旺盛"))
+        storage.save_project(project)
+
+    def load():
+        project = storage.load_project(target)
+        for section in SECTION_NAMES:
+            getattr(project, section)
+
+    return {
+        "保存": timed(save, repeat),
+        "読み込み": timed(load, repeat),
+        "一覧": timed(storage.list_project_info, repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ストレージの保存・読み込みベンチマーク")
+    parser.add_argument("--counts", type=int, nargs="+", default=[10, 1000, 10000], help="プロジェクト数")
+    parser.add_argument("--text-chars", type=int, default=20000, help="1プロジェクトあたりの本文の文字数")
+    parser.add_argument("--repeat", type=int, default=20, help="各操作の計測回数")
+    args = parser.parse_args()
+
+    backends = [
+        ("files", lambda path: ProjectStorage(str(path / "projects"))),
+        ("sqlite", lambda path: SQLiteProjectStorage(str(path / "projects.db"))),
+    ]
+
+    print(f"本文 {args.text_chars:,}文字 / 中央値（ミリ秒）\n")
+    print(f"{'件数':>7} {'保存先':>7} {'作成(秒)':>9} {'保存':>8} {'読み込み':>8} {'一覧':>9}")
+    for count in args.counts:
+        for name, factory in backends:
+            work_dir = Path(tempfile.mkdtemp(prefix="bench_storage_"))
+            try:
+                storage = factory(work_dir)
+                start = time.perf_counter()
+                populate(storage, count, args.text_chars)
+                populate_seconds = time.perf_counter() - start
+
+                results = bench_backend(storage, f"プロジェクト{count // 2:05d}", args.repeat)
+                print(f"{count:>7} {name:>7} {populate_seconds:>9.1f} {results['保存']:>8.2f}"
+                      f" {results['読み込み']:>8.2f} {results['一覧']:>9.2f}")
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,172 +3,260 @@ AI API連携モジュール
 Gemini と Claude API を使用したテキスト生成
 """
 import os
-from typing import Optional
-import google.generativeai as genai
-from anthropic import Anthropic
+import re
+from dataclasses import dataclass, replace
+from typing import Callable, Iterator, Optional
 
+from .cache import ResponseCache
+from .data_models import Character
+from .json_stream import JSONObjectExtractor, validate_fields
+from .metrics import MetricsRegistry, instrumented
+from .prompts import LENGTH_GUIDE, PLATFORM_NOTES, PROMPTS, RenderedPrompt, bullet_list, format_characters
+from .providers import Capabilities, Provider, default_providers
+from .retry import AIClientError, RequestExecutor
+from .tokens import (
+    MODEL_SPECS, CallEstimate, ModelSpec, estimate_call, estimate_tokens, model_spec, split_to_token_budget
+)
 
-class AIClient:
-    """AI API クライアント"""
-
-    def __init__(self):
-        # API キーの読み込み
-        self.google_api_key = os.getenv("GOOGLE_API_KEY")
-        self.anthropic_api_key = os.getenv("ANTHROPIC_API_KEY")
-
-        # Gemini の初期化
-        if self.google_api_key:
-            genai.configure(api_key=self.google_api_key)
-            self.gemini_flash = genai.GenerativeModel('gemini-2.0-flash-exp')
-            self.gemini_pro = genai.GenerativeModel('gemini-2.0-flash-thinking-exp-1219')
-
-        # Claude の初期化
-        if self.anthropic_api_key:
-            self.anthropic = Anthropic(api_key=self.anthropic_api_key)
-
-    def generate_idea_fragments(self, count: int = 20) -> list[str]:
-        """アイデアの断片を生成（Gemini Flash使用）"""
-        if not self.google_api_key:
-            return ["APIキーが設定されていません"]
-
-        prompt = f"""
-小説のアイデアとなる魅力的なフレーズや断片を{count}個生成してください。
-以下のカテゴリーからバランスよく選んでください：
-
-- 設定（舞台、世界観）
-- キャラクター要素（人物の特徴、職業、性格）
-- 出来事（事件、遭遇、発見）
-- テーマ（愛、冒険、成長、裏切り、など）
-- 物（アイテム、遺物、武器、書物）
-- 雰囲気（ミステリアス、ノスタルジック、緊張感）
-
-各フレーズは1-2行程度で、創造力を刺激する具体的で印象的なものにしてください。
-番号付きリストで出力してください。
-"""
-
-        try:
-            response = self.gemini_flash.generate_content(prompt)
-            # レスポンスを行ごとに分割して、各アイデアを抽出
-            lines = response.text.strip().split('\n')
-            fragments = []
-            for line in lines:
-                line = line.strip()
-                if line and any(line.startswith(f"{i}.") for i in range(1, count + 1)):
-                    # 番号を削除
-                    fragment = line.split('.', 1)[1].strip()
-                    fragments.append(fragment)
-
-            return fragments if fragments else [response.text]
-        except Exception as e:
-            return [f"エラー: {str(e)}"]
 
-    def expand_ideas(self, selected_fragments: list[str]) -> str:
-        """選択された断片からアイデアを膨らませる（Gemini Flash使用）"""
-        if not self.google_api_key:
-            return "APIキーが設定されていません"
-
-        fragments_text = "\n".join(f"- {f}" for f in selected_fragments)
-        prompt = f"""
-以下のアイデアの断片を組み合わせて、小説の核となる魅力的なコンセプトを3-4段落で説明してください：
-
-{fragments_text}
-
-これらの要素を自然に組み合わせ、独創的で面白い物語の方向性を提示してください。
-"""
+# Gemini のモデル名
+GEMINI_FLASH_MODEL = 'gemini-2.0-flash-exp'
+GEMINI_PRO_MODEL = 'gemini-2.0-flash-thinking-exp-1219'
 
-        try:
-            response = self.gemini_flash.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            return f"エラー: {str(e)}"
 
-    def generate_setting(self, idea_text: str) -> str:
-        """設定を生成（Gemini Flash使用）"""
-        if not self.google_api_key:
-            return "APIキーが設定されていません"
 
-        prompt = f"""
-以下のアイデアに基づいて、小説の基本設定を2-3文で簡潔に書いてください：
+@dataclass(frozen=True)
+class ModelRoute:
+    """アプリで選ぶモデル名に対応する呼び出し先"""
+    provider: str  # AIClient.providers のキー
+    model: str  # API のモデル名（空ならプロバイダーの既定のモデル）
+    max_tokens: Optional[int] = None  # 出力の上限（None ならプロバイダーの既定）
 
-{idea_text}
 
-設定には以下を含めてください：
-- 主人公の基本情報
-- 物語の始まりとなる状況や出来事
-- 舞台となる世界や時代（必要に応じて）
-"""
+# モデル名の変換（執筆設定の ai_model と AI_DRAFT_MODEL で指定する名前）
+MODEL_ROUTES = {
+    "haiku3.5": ModelRoute("anthropic", "claude-3-5-haiku-20241022", 8192),
+    "sonnet4.5": ModelRoute("anthropic", "claude-sonnet-4-20250514", 8192),
+    "gemini2.5pro": ModelRoute("gemini", GEMINI_PRO_MODEL),
+    "flash": ModelRoute("gemini", GEMINI_FLASH_MODEL),
+    "local": ModelRoute("local", ""),
+}
+DEFAULT_WRITING_MODEL = "haiku3.5"
 
-        try:
-            response = self.gemini_flash.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            return f"エラー: {str(e)}"
+# アイデア・設定・プロット・登場人物・章立て・あらすじなど、本文以外の生成に使うモデル
+DEFAULT_DRAFT_MODEL = "flash"
 
-    def generate_plot(self, setting: str) -> str:
-        """プロットを生成（Gemini Flash使用）"""
-        if not self.google_api_key:
-            return "APIキーが設定されていません"
+# 長編の章ごと執筆で1章あたりに求める分量（最大トークン数に収まる長さ）
+CHAPTER_LENGTH_GUIDE = "3000-4000文字程度"
 
-        prompt = f"""
-以下の設定に基づいて、小説のプロットを作成してください：
+# 出力のトークン数の見積もりに使う文字数（各分量の目安の上限）
+LENGTH_OUTPUT_CHARS = {
+    "短編": 3000,
+    "中編": 8000,
+    "長編": 15000
+}
+CHAPTER_OUTPUT_CHARS = 4000
 
-{setting}
+# 続きの執筆で1回に求める分量と、プロンプトに含める直前の本文の文字数
+CONTINUATION_LENGTH_GUIDE = "2000-3000文字程度"
+CONTINUATION_OUTPUT_CHARS = 3000
+CONTINUATION_TAIL_CHARS = 1000
 
-プロットには以下の要素を含めてください：
-1. 発端（物語の始まり）
-2. 展開（事件や困難の発生）
-3. クライマックス（最大の山場）
-4. 結末（物語の締めくくり）
+# 章ごと執筆で引き継ぐあらすじの最大文字数
+SUMMARY_MAX_CHARS = 600
 
-各要素を2-3文で説明してください。
-"""
+# 登場人物の生成で、人数が足りないときに依頼する最大回数（初回を含む）
+CHARACTER_REQUEST_ATTEMPTS = 2
 
-        try:
-            response = self.gemini_flash.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            return f"エラー: {str(e)}"
+# アイデア断片の生成時に「提示済み」として渡す断片の最大数
+EXCLUDE_FRAGMENTS_MAX = 30
 
-    def generate_characters(self, setting: str, plot: str, count: int = 3) -> list[dict]:
-        """登場人物を生成（Gemini Flash使用）"""
-        if not self.google_api_key:
-            return [{"name": "エラー", "personality": "APIキーが設定されていません"}]
 
-        prompt = f"""
-以下の設定とプロットに基づいて、主要な登場人物を{count}人作成してください：
+def parse_numbered_line(line: str) -> Optional[str]:
+    """「1. ○○」形式の行から番号を除いた本文を取り出す（該当しなければ None）"""
+    match = re.match(r'^\s*\**\s*\d+\s*[\.．、)）]\s*(.+)$', line)
+    if not match:
+        return None
+    return match.group(1).strip().strip('*').strip() or None
 
-【設定】
-{setting}
 
-【プロット】
-{plot}
+class AIClient:
+    """AI API クライアント
 
-各キャラクターについて以下の情報をJSON形式で出力してください：
-- name: 名前
-- role: 役割（主人公、ライバル、メンター、など）
-- personality: 性格（2-3文）
-- background: 背景（簡単な経歴や動機）
+    生成に失敗した場合は、エラー文字列を生成結果として返さず AIClientError を送出する。
+    """
 
-JSON配列形式で出力してください。
-"""
+    def __init__(
+        self,
+        cache: Optional[ResponseCache] = None,
+        executor: Optional[RequestExecutor] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        providers: Optional[dict[str, Provider]] = None,
+        draft_model: Optional[str] = None
+    ):
+        # API の呼び出し先（省略時は環境変数の設定を使う Gemini・Claude・ローカルの OpenAI 互換サーバー。
+        # SDK は初回の呼び出し時に読み込んで初期化する）
+        self.providers = providers if providers is not None else default_providers()
+
+        # 本文以外の生成に使うモデル（MODEL_ROUTES の名前。AI_DRAFT_MODEL で変更できる）
+        self.draft = self.route(draft_model or os.getenv("AI_DRAFT_MODEL") or DEFAULT_DRAFT_MODEL, DEFAULT_DRAFT_MODEL)
+
+        # 生成結果のキャッシュ（AI_CACHE_ENABLED で有効化）
+        self.cache = cache if cache is not None else ResponseCache.from_env()
+
+        # 再試行・レート制限
+        self.executor = executor or RequestExecutor.from_env()
+
+        # 呼び出しの計測（AI_METRICS_LOG を指定すると JSONL にも記録する）
+        self.metrics = metrics if metrics is not None else MetricsRegistry.from_env()
+
+    @instrumented
+    def generate_idea_fragments(
+        self,
+        count: int = 20,
+        force_fresh: bool = False,
+        exclude: Optional[list[str]] = None
+    ) -> list[str]:
+        """アイデアの断片を生成（下書き用のモデル使用）"""
+        self._require_key(self.draft.provider)
+
+        prompt = self._build_idea_fragments_prompt(count, exclude)
+
+        text = self._generate_on(self.draft, prompt, force_fresh)
+        # レスポンスを行ごとに分割して、各アイデアを抽出
+        fragments = []
+        for line in text.strip().split('\n'):
+            fragment = parse_numbered_line(line)
+            if fragment:
+                fragments.append(fragment)
+
+        return fragments[:count] if fragments else [text]
+
+    @instrumented
+    def generate_idea_fragments_stream(
+        self,
+        count: int = 20,
+        force_fresh: bool = False,
+        exclude: Optional[list[str]] = None
+    ) -> Iterator[str]:
+        """アイデアの断片をストリーミングで生成（番号付きの行が完成するたびに返す）"""
+        self._require_key(self.draft.provider)
+
+        prompt = self._build_idea_fragments_prompt(count, exclude)
+
+        buffer = ""
+        emitted = 0
+        for chunk in self._stream_on(self.draft, prompt, force_fresh):
+            buffer += chunk
+            *lines, buffer = buffer.split('\n')
+            for line in lines:
+                fragment = parse_numbered_line(line)
+                if fragment and emitted < count:
+                    emitted += 1
+                    yield fragment
+
+        fragment = parse_numbered_line(buffer)
+        if fragment and emitted < count:
+            yield fragment
+
+    def _build_idea_fragments_prompt(self, count: int, exclude: Optional[list[str]] = None) -> RenderedPrompt:
+        """アイデア断片生成のプロンプトを組み立てる"""
+        excluded = ""
+        if exclude:
+            # 直近の断片だけを渡してプロンプトの大きさを抑える
+            excluded = PROMPTS.render("idea_fragments_excluded", fragments=bullet_list(exclude, EXCLUDE_FRAGMENTS_MAX))
+        return PROMPTS.render("idea_fragments", count=count, excluded=excluded)
+
+    @instrumented
+    def expand_ideas(self, selected_fragments: list[str], force_fresh: bool = False) -> str:
+        """選択された断片からアイデアを膨らませる（下書き用のモデル使用）"""
+        self._require_key(self.draft.provider)
+
+        prompt = PROMPTS.render("expand_ideas", fragments=bullet_list(selected_fragments))
+        return self._generate_on(self.draft, prompt, force_fresh)
+
+    @instrumented
+    def generate_setting(self, idea_text: str, force_fresh: bool = False) -> str:
+        """設定を生成（下書き用のモデル使用）"""
+        self._require_key(self.draft.provider)
+
+        prompt = PROMPTS.render("setting", idea=idea_text)
+        return self._generate_on(self.draft, prompt, force_fresh)
+
+    @instrumented
+    def generate_plot(self, setting: str, force_fresh: bool = False) -> str:
+        """プロットを生成（下書き用のモデル使用）"""
+        self._require_key(self.draft.provider)
+
+        prompt = PROMPTS.render("plot", setting=setting)
+        return self._generate_on(self.draft, prompt, force_fresh)
+
+    @instrumented
+    def generate_characters(
+        self,
+        setting: str,
+        plot: str,
+        count: int = 3,
+        force_fresh: bool = False
+    ) -> list[dict]:
+        """登場人物を生成（下書き用のモデル使用）"""
+        return list(self.generate_characters_stream(setting, plot, count, force_fresh))
+
+    @instrumented
+    def generate_characters_stream(
+        self,
+        setting: str,
+        plot: str,
+        count: int = 3,
+        force_fresh: bool = False
+    ) -> Iterator[dict]:
+        """登場人物をストリーミングで生成（キャラクターのJSONが閉じるたびに返す）
+
+        出力が途中で途切れたり崩れたりして人数が足りない場合は、
+        生成済みのキャラクターを伝えたうえで不足分だけを追加で依頼する。
+        """
+        self._require_key(self.draft.provider)
+
+        names: list[str] = []
+        for _ in range(CHARACTER_REQUEST_ATTEMPTS):
+            remaining = count - len(names)
+            prompt = self._build_characters_prompt(setting, plot, remaining, names)
+
+            extractor = JSONObjectExtractor()
+            # JSON モードのプロバイダーでは {"characters": [...]} のように包んで返されることがある
+            for chunk in self._stream_on(self.draft, prompt, force_fresh, json_mode=True):
+                for obj in _character_objects(extractor.feed(chunk)):
+                    character = validate_fields(obj, Character)
+                    if character and character["name"] not in names and len(names) < count:
+                        names.append(character["name"])
+                        yield character
+            for obj in _character_objects(extractor.finish()):
+                character = validate_fields(obj, Character)
+                if character and character["name"] not in names and len(names) < count:
+                    names.append(character["name"])
+                    yield character
+
+            if len(names) >= count:
+                return
+
+        if not names:
+            raise AIClientError(
+                "invalid_response", provider=self.draft.provider, detail="キャラクターのJSONを解釈できませんでした"
+            )
 
-        try:
-            response = self.gemini_flash.generate_content(prompt)
-            # JSONパースを試みる（簡易的な実装）
-            import json
-            import re
-
-            # JSON部分を抽出
-            text = response.text
-            json_match = re.search(r'\[.*\]', text, re.DOTALL)
-            if json_match:
-                characters = json.loads(json_match.group())
-                return characters
-            else:
-                # JSONが見つからない場合はテキストを返す
-                return [{"name": "生成失敗", "personality": text}]
-        except Exception as e:
-            return [{"name": "エラー", "personality": str(e)}]
+    def _build_characters_prompt(
+        self,
+        setting: str,
+        plot: str,
+        count: int,
+        existing_names: Optional[list[str]] = None
+    ) -> RenderedPrompt:
+        """登場人物生成のプロンプトを組み立てる"""
+        existing = ""
+        if existing_names:
+            # 再依頼では不足分だけを生成させる
+            existing = PROMPTS.render("characters_existing", count=count, names="、".join(existing_names))
+        return PROMPTS.render("characters", count=count, setting=setting, plot=plot, existing=existing)
 
     def generate_novel_prompt(
         self,
@@ -179,205 +267,531 @@ JSON配列形式で出力してください。
         style: str,
         tone: str,
         ai_platform: str = "claude"
-    ) -> str:
+    ) -> RenderedPrompt:
         """チャットAI用の小説執筆プロンプトを生成"""
-
-        characters_text = "\n".join(
-            f"- **{c.get('name', '名前なし')}** ({c.get('role', '役割不明')})\n"
-            f"  - 性格: {c.get('personality', '')}\n"
-            f"  - 背景: {c.get('background', '不明')}"
-            for c in characters
+        return PROMPTS.render(
+            "chat_novel",
+            platform_note=PLATFORM_NOTES.get(ai_platform, ''),
+            setting=setting,
+            plot=plot,
+            characters=format_characters(characters, detailed=True),
+            length=length,
+            length_guide=LENGTH_GUIDE.get(length, ''),
+            style=style,
+            tone=tone
         )
 
-        length_guide = {
-            "短編": "2000-3000文字程度",
-            "中編": "5000-8000文字程度",
-            "長編": "10000文字以上"
-        }
-
-        # プラットフォーム別の推奨事項
-        platform_notes = {
-            "claude": "# Claude用プロンプト\n\n長文生成に優れています。必要に応じて「続きを書いて」と指示してください。",
-            "chatgpt": "# ChatGPT用プロンプト\n\n長文の場合は複数回に分けて生成を依頼してください。",
-            "gemini": "# Gemini用プロンプト\n\n長文生成が可能です。プロンプトをそのまま貼り付けて使用してください。"
-        }
-
-        prompt = f"""{platform_notes.get(ai_platform, '')}
-
-あなたはプロの小説家です。以下の設定に基づいて、魅力的な小説を執筆してください。
-
-## 📖 基本設定
-
-{setting}
-
-## 📋 プロット（物語の流れ）
-
-{plot}
-
-## 👥 登場人物
-
-{characters_text}
-
-## ✍️ 執筆指示（必ず守ってください）
-
-### 分量
-{length}（目安: {length_guide.get(length, '')}）
-
-### 文体
-{style}で書いてください。
+    @instrumented
+    def write_novel(
+        self,
+        setting: str,
+        plot: str,
+        characters: list[dict],
+        length: str,
+        style: str,
+        tone: str,
+        model: str = "haiku3.5",
+        force_fresh: bool = False
+    ) -> str:
+        """小説本文を執筆"""
+        prompt = self._build_novel_prompt(setting, plot, characters, length, style, tone)
+        return self._write(prompt, model, force_fresh)
 
-### 雰囲気・読後感
-{tone}雰囲気の作品にしてください。
+    @instrumented
+    def write_novel_stream(
+        self,
+        setting: str,
+        plot: str,
+        characters: list[dict],
+        length: str,
+        style: str,
+        tone: str,
+        model: str = "haiku3.5",
+        force_fresh: bool = False
+    ) -> Iterator[str]:
+        """小説本文をストリーミングで執筆（生成されたテキストを断片ごとに返す）
 
-## 📝 執筆のポイント
+        途中で失敗した場合も、呼び出し側はそれまでに受け取った断片を保存できる。
+        """
+        prompt = self._build_novel_prompt(setting, plot, characters, length, style, tone)
+        return self._stream(prompt, model, force_fresh)
 
-1. **心理描写**: 登場人物の内面を丁寧に描写してください
-2. **情景描写**: 五感を使った描写で読者を物語の世界に引き込んでください
-3. **プロット遵守**: 上記のプロットに沿いつつも、自然な展開を心がけてください
-4. **文体の統一**: 指定された文体「{style}」を最後まで維持してください
-5. **雰囲気の維持**: 「{tone}」という読後感を意識して執筆してください
-6. **完成度**: 途中で終わらせず、起承転結のある完結した作品にしてください
+    def estimate_novel(
+        self,
+        setting: str,
+        plot: str,
+        characters: list[dict],
+        length: str,
+        style: str,
+        tone: str,
+        model: str = "haiku3.5"
+    ) -> CallEstimate:
+        """write_novel / write_novel_stream の入出力のトークン数と料金を見積もる"""
+        prompt = self._build_novel_prompt(setting, plot, characters, length, style, tone)
+        route = self.route(model)
+        return estimate_call(
+            route.model, prompt, LENGTH_OUTPUT_CHARS.get(length, 0), route.max_tokens, self._model_spec(route)
+        )
 
----
+    def estimate_chapters(
+        self,
+        setting: str,
+        plot: str,
+        characters: list[dict],
+        style: str,
+        tone: str,
+        chapters: list[dict],
+        model: str = "haiku3.5"
+    ) -> list[CallEstimate]:
+        """章ごと執筆の各章の見積もり（あらすじと直前の本文は最大の長さで見積もる）"""
+        route = self.route(model)
+        spec = self._model_spec(route)
+        placeholder = "あ" * SUMMARY_MAX_CHARS
+        return [
+            estimate_call(
+                route.model,
+                self._build_chapter_prompt(
+                    setting, plot, characters, style, tone, i, len(chapters),
+                    chapter.get("title", ""), chapter.get("beat", ""), placeholder, placeholder
+                ),
+                CHAPTER_OUTPUT_CHARS,
+                route.max_tokens,
+                spec
+            )
+            for i, chapter in enumerate(chapters)
+        ]
 
-それでは、上記の設定に基づいて小説を執筆してください。
-"""
+    @instrumented
+    def generate_chapter_beats(
+        self,
+        setting: str,
+        plot: str,
+        chapter_count: int,
+        force_fresh: bool = False
+    ) -> list[dict]:
+        """プロットを章ごとの展開に分割（下書き用のモデル使用）"""
+        self._require_key(self.draft.provider)
+
+        prompt = PROMPTS.render("chapter_beats", chapter_count=chapter_count, setting=setting, plot=plot)
+
+        text = self._generate_on(self.draft, prompt, force_fresh)
+
+        beats = []
+        for line in text.strip().split('\n'):
+            match = re.match(r'^\s*\**\s*(\d+)\s*[\.．、)）]\s*(.+)$', line)
+            if not match:
+                continue
+            body = match.group(2).strip().strip('*').strip()
+            for separator in ('｜', '|'):
+                title, sep, beat = body.partition(separator)
+                if sep:
+                    break
+            else:
+                title, beat = f"第{match.group(1)}章", body
+            beats.append({"title": title.strip().strip("*").strip(), "beat": beat.strip()})
 
-        return prompt
+        return beats[:chapter_count]
 
-    def write_novel(
+    @instrumented
+    def write_chapter(
         self,
         setting: str,
         plot: str,
         characters: list[dict],
-        length: str,
         style: str,
         tone: str,
-        model: str = "haiku3.5"
+        chapter_index: int,
+        chapter_count: int,
+        title: str,
+        beat: str,
+        summary: str = "",
+        previous_tail: str = "",
+        model: str = "haiku3.5",
+        force_fresh: bool = False
     ) -> str:
-        """小説本文を執筆"""
+        """長編の1章分を執筆
+
+        これまでのあらすじと直前の本文末尾だけを渡すため、
+        章が増えてもプロンプトの大きさは一定に保たれる。
+        """
+        prompt = self._build_chapter_prompt(
+            setting, plot, characters, style, tone, chapter_index, chapter_count,
+            title, beat, summary, previous_tail
+        )
+        return self._write(prompt, model, force_fresh)
 
-        # モデルに応じて適切なAPIを使用
-        if model == "gemini2.5pro":
-            return self._write_with_gemini(setting, plot, characters, length, style, tone)
+    def _build_chapter_prompt(
+        self,
+        setting: str,
+        plot: str,
+        characters: list[dict],
+        style: str,
+        tone: str,
+        chapter_index: int,
+        chapter_count: int,
+        title: str,
+        beat: str,
+        summary: str,
+        previous_tail: str
+    ) -> RenderedPrompt:
+        """章ごと執筆のプロンプトを組み立てる"""
+        if chapter_index + 1 < chapter_count:
+            ending = "この章の出来事を描き切り、次の章へ自然に続く形で締めくくってください。"
         else:
-            return self._write_with_claude(setting, plot, characters, length, style, tone, model)
+            ending = "最終章です。物語を結末まで描き、完結させてください。"
+
+        return PROMPTS.render(
+            "chapter",
+            story=self._build_story_context(setting, plot, characters),
+            chapter_count=chapter_count,
+            summary=summary or "（これが最初の章です）",
+            previous_tail=previous_tail or "（なし）",
+            chapter_number=chapter_index + 1,
+            title=title,
+            beat=beat,
+            length_guide=CHAPTER_LENGTH_GUIDE,
+            style=style,
+            tone=tone,
+            ending=ending
+        )
 
-    def _write_with_gemini(
+    @instrumented
+    def continue_novel(
         self,
         setting: str,
         plot: str,
         characters: list[dict],
-        length: str,
         style: str,
-        tone: str
+        tone: str,
+        summary: str,
+        previous_tail: str,
+        direction: str = "",
+        model: str = "haiku3.5",
+        force_fresh: bool = False
     ) -> str:
-        """Gemini Pro で小説を執筆"""
-        if not self.google_api_key:
-            return "APIキーが設定されていません"
-
-        characters_text = "\n".join(
-            f"- {c.get('name', '名前なし')}: {c.get('personality', '')}"
-            for c in characters
+        """本文の続きを執筆（続きの部分だけを返す）"""
+        prompt = self._build_continuation_prompt(
+            setting, plot, characters, style, tone, summary, previous_tail, direction
         )
+        return self._write(prompt, model, force_fresh)
 
-        length_guide = {
-            "短編": "2000-3000文字程度",
-            "中編": "5000-8000文字程度",
-            "長編": "10000文字以上"
-        }
-
-        prompt = f"""
-以下の要素に基づいて、小説を執筆してください：
-
-【設定】
-{setting}
-
-【プロット】
-{plot}
+    @instrumented
+    def continue_novel_stream(
+        self,
+        setting: str,
+        plot: str,
+        characters: list[dict],
+        style: str,
+        tone: str,
+        summary: str,
+        previous_tail: str,
+        direction: str = "",
+        model: str = "haiku3.5",
+        force_fresh: bool = False
+    ) -> Iterator[str]:
+        """本文の続きをストリーミングで執筆
+
+        本文全体ではなく、あらすじと直前の本文末尾（CONTINUATION_TAIL_CHARS 文字まで）だけを渡すため、
+        本文が長くなってもプロンプトの大きさは一定に保たれる。
+        """
+        prompt = self._build_continuation_prompt(
+            setting, plot, characters, style, tone, summary, previous_tail, direction
+        )
+        return self._stream(prompt, model, force_fresh)
 
-【登場人物】
-{characters_text}
+    def estimate_continuation(
+        self,
+        setting: str,
+        plot: str,
+        characters: list[dict],
+        style: str,
+        tone: str,
+        direction: str = "",
+        model: str = "haiku3.5"
+    ) -> CallEstimate:
+        """続きの執筆の見積もり（あらすじと直前の本文は最大の長さで見積もる）"""
+        route = self.route(model)
+        prompt = self._build_continuation_prompt(
+            setting, plot, characters, style, tone,
+            "あ" * SUMMARY_MAX_CHARS, "あ" * CONTINUATION_TAIL_CHARS, direction
+        )
+        return estimate_call(
+            route.model, prompt, CONTINUATION_OUTPUT_CHARS, route.max_tokens, self._model_spec(route)
+        )
 
-【執筆指示】
-- 長さ: {length}（{length_guide.get(length, '')}）
-- 文体: {style}
-- 雰囲気・読後感: {tone}
+    def _build_continuation_prompt(
+        self,
+        setting: str,
+        plot: str,
+        characters: list[dict],
+        style: str,
+        tone: str,
+        summary: str,
+        previous_tail: str,
+        direction: str
+    ) -> RenderedPrompt:
+        """続きの執筆のプロンプトを組み立てる"""
+        return PROMPTS.render(
+            "continuation",
+            story=self._build_story_context(setting, plot, characters),
+            summary=summary or "（なし）",
+            previous_tail=previous_tail[-CONTINUATION_TAIL_CHARS:],
+            direction=direction or "（指定なし。プロットに沿って自然に展開してください）",
+            length_guide=CONTINUATION_LENGTH_GUIDE,
+            style=style,
+            tone=tone
+        )
 
-物語を魅力的に描写し、読者を引き込む小説を書いてください。
-"""
+    @instrumented
+    def summarize_story(self, previous_summary: str, new_text: str) -> str:
+        """これまでのあらすじに新しい本文を織り込んだ要約を作成
+
+        要約は SUMMARY_MAX_CHARS 文字以内に収める。
+        本文がモデルの入力の上限を超える場合は、分割して順に織り込む。
+        """
+        # 要約には下書き用のモデル（使えなければ軽量な Claude）を使う
+        route = self.draft if self.provider_available(self.draft.provider) else self.route(DEFAULT_WRITING_MODEL)
+
+        spec = self._model_spec(route)
+        budget = (
+            spec.context_window
+            - spec.max_output_tokens
+            - estimate_tokens(self._build_summary_prompt("あ" * SUMMARY_MAX_CHARS, ""), spec.provider)
+        )
+        summary = previous_summary
+        for chunk in split_to_token_budget(new_text, budget, spec.provider):
+            summary = self._generate_on(route, self._build_summary_prompt(summary, chunk)).strip()[:SUMMARY_MAX_CHARS]
+        return summary
+
+    def _build_summary_prompt(self, previous_summary: str, new_text: str) -> RenderedPrompt:
+        """あらすじの要約のプロンプトを組み立てる"""
+        return PROMPTS.render(
+            "summary",
+            max_chars=SUMMARY_MAX_CHARS,
+            previous_summary=previous_summary or "（なし）",
+            new_text=new_text
+        )
 
-        try:
-            response = self.gemini_pro.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            return f"エラー: {str(e)}"
+    def _build_story_context(self, setting: str, plot: str, characters: list[dict]) -> str:
+        """本文・章の執筆で共通の前半（同じ設定・プロット・登場人物なら毎回同じ文字列になる）"""
+        return PROMPTS.render("story", setting=setting, plot=plot, characters=format_characters(characters))
 
-    def _write_with_claude(
+    def _build_novel_prompt(
         self,
         setting: str,
         plot: str,
         characters: list[dict],
         length: str,
         style: str,
-        tone: str,
-        model: str
-    ) -> str:
-        """Claude で小説を執筆"""
-        if not self.anthropic_api_key:
-            return "APIキーが設定されていません"
-
-        characters_text = "\n".join(
-            f"- {c.get('name', '名前なし')}: {c.get('personality', '')}"
-            for c in characters
+        tone: str
+    ) -> RenderedPrompt:
+        """API執筆用のプロンプトを組み立てる"""
+        return PROMPTS.render(
+            "novel",
+            story=self._build_story_context(setting, plot, characters),
+            length=length,
+            length_guide=LENGTH_GUIDE.get(length, ''),
+            style=style,
+            tone=tone
         )
 
-        length_guide = {
-            "短編": "2000-3000文字程度",
-            "中編": "5000-8000文字程度",
-            "長編": "10000文字以上"
-        }
+    def route(self, model: str, default: str = DEFAULT_WRITING_MODEL) -> ModelRoute:
+        """モデル名（MODEL_ROUTES のキー）から呼び出し先を決める
 
-        prompt = f"""
-以下の要素に基づいて、小説を執筆してください：
+        知らない名前は default として扱い、API のモデル名が空ならプロバイダーの既定のモデルを使う。
+        """
+        route = MODEL_ROUTES.get(model) or MODEL_ROUTES[default]
+        if not route.model:
+            provider = self.providers.get(route.provider)
+            route = replace(route, model=provider.default_model if provider else route.provider)
+        return route
 
-【設定】
-{setting}
+    def provider_available(self, provider: str) -> bool:
+        """プロバイダーが呼び出せる状態か（API キーなどが設定されているか）"""
+        client = self.providers.get(provider)
+        return client is not None and client.available()
 
-【プロット】
-{plot}
+    def _write(self, prompt: str, model: str, force_fresh: bool = False) -> str:
+        """モデルに応じて適切なAPIで執筆（キャッシュが有効なら再利用）"""
+        return self._generate_on(self.route(model), prompt, force_fresh)
 
-【登場人物】
-{characters_text}
+    def _stream(self, prompt: str, model: str, force_fresh: bool = False) -> Iterator[str]:
+        """モデルに応じて適切なAPIでストリーミング執筆（キャッシュが有効なら再利用）"""
+        return self._stream_on(self.route(model), prompt, force_fresh)
 
-【執筆指示】
-- 長さ: {length}（{length_guide.get(length, '')}）
-- 文体: {style}
-- 雰囲気・読後感: {tone}
+    def _generate_on(
+        self,
+        route: ModelRoute,
+        prompt: str,
+        force_fresh: bool = False,
+        json_mode: bool = False
+    ) -> str:
+        """route のモデルで生成（キャッシュが有効なら再利用）
+
+        json_mode はプロバイダーが対応している場合だけ使う。
+        """
+        self._check_limits(route, prompt)
+        json_mode = json_mode and self._capabilities(route).json_mode
+        return self._cached(
+            route.model,
+            prompt,
+            self._params(route, json_mode),
+            force_fresh,
+            lambda: self._request(route, prompt, json_mode)
+        )
 
-物語を魅力的に描写し、読者を引き込む小説を書いてください。
-"""
+    def _stream_on(
+        self,
+        route: ModelRoute,
+        prompt: str,
+        force_fresh: bool = False,
+        json_mode: bool = False
+    ) -> Iterator[str]:
+        """route のモデルでストリーミング生成（キャッシュが有効なら再利用）
+
+        ストリーミングに対応しないプロバイダーでは、全文を1つの断片として返す。
+        """
+        self._check_limits(route, prompt)
+        json_mode = json_mode and self._capabilities(route).json_mode
+        return self._cached_stream(
+            route.model,
+            prompt,
+            self._params(route, json_mode),
+            force_fresh,
+            lambda: self._open_stream(route, prompt, json_mode)
+        )
+
+    def _request(self, route: ModelRoute, prompt: str, json_mode: bool = False) -> str:
+        """プロバイダーを再試行・レート制限付きで呼び出す"""
+        self._require_key(route.provider)
+        provider = self.providers[route.provider]
+        return self.executor.execute(
+            route.provider,
+            lambda: provider.generate(route.model, prompt, self._max_tokens(route), json_mode)
+        )
+
+    def _open_stream(self, route: ModelRoute, prompt: str, json_mode: bool = False) -> Iterator[str]:
+        """プロバイダーのストリームを再試行・レート制限付きで開く"""
+        self._require_key(route.provider)
+        provider = self.providers[route.provider]
+        if not provider.capabilities.streaming:
+            def whole() -> Iterator[str]:
+                yield self._request(route, prompt, json_mode)
+
+            return whole()
+        return self.executor.stream(
+            route.provider,
+            lambda: provider.stream(route.model, prompt, self._max_tokens(route), json_mode)
+        )
 
-        # モデル名の変換と最大トークン数の設定
-        model_map = {
-            "haiku3.5": "claude-3-5-haiku-20241022",
-            "sonnet4.5": "claude-sonnet-4-20250514"
-        }
-
-        # モデルごとの最大トークン数
-        max_tokens_map = {
-            "haiku3.5": 8192,
-            "sonnet4.5": 8192
-        }
-
-        try:
-            response = self.anthropic.messages.create(
-                model=model_map.get(model, "claude-3-5-haiku-20241022"),
-                max_tokens=max_tokens_map.get(model, 8192),
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
+    def _check_limits(self, route: ModelRoute, prompt: str) -> None:
+        """入力と出力の上限がモデルのコンテキストに収まらなければ、送信せずに AIClientError を送出"""
+        estimate = estimate_call(route.model, prompt, 0, route.max_tokens, self._model_spec(route))
+        if not estimate.fits_context:
+            raise AIClientError(
+                "prompt_too_large",
+                provider=route.provider,
+                detail=f"推定{estimate.input_tokens:,}トークン"
+                       f"（入力の上限 {estimate.context_window - estimate.max_output_tokens:,}トークン）"
             )
-            return response.content[0].text
-        except Exception as e:
-            return f"エラー: {str(e)}"
+
+    def _cached_stream(
+        self,
+        model_name: str,
+        prompt: str,
+        params: dict,
+        force_fresh: bool,
+        open_stream: Callable[[], Iterator[str]]
+    ) -> Iterator[str]:
+        """キャッシュ付きのストリーム
+
+        キャッシュにあれば全文を1つの断片として返し、
+        最後まで受信できた結果だけをキャッシュに保存する。
+        """
+        key = ResponseCache.make_key(model_name, prompt, params) if self.cache else None
+
+        if key and not force_fresh:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.metrics.record_cache_hit(model_name)
+                yield cached
+                return
+
+        parts = []
+        for chunk in self.metrics.stream(model_name, open_stream()):
+            parts.append(chunk)
+            yield chunk
+
+        if key:
+            self.cache.put(key, "".join(parts), model_name)
+
+    def _cached(
+        self,
+        model_name: str,
+        prompt: str,
+        params: dict,
+        force_fresh: bool,
+        generate: Callable[[], str]
+    ) -> str:
+        """キャッシュを確認し、なければ generate で生成して保存
+
+        force_fresh の場合はキャッシュを読まずに生成し、結果で上書きする。
+        """
+        key = ResponseCache.make_key(model_name, prompt, params) if self.cache else None
+        if key and not force_fresh:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.metrics.record_cache_hit(model_name)
+                return cached
+
+        with self.metrics.call(model_name) as call:
+            text = generate()
+            call.output_chars = len(text)
+
+        if key:
+            self.cache.put(key, text, model_name)
+        return text
+
+    def _capabilities(self, route: ModelRoute) -> Capabilities:
+        provider = self.providers.get(route.provider)
+        return provider.capabilities if provider else Capabilities()
+
+    def _max_tokens(self, route: ModelRoute) -> Optional[int]:
+        """プロバイダーに渡す出力の上限（プロバイダーの上限を超えないようにする）"""
+        if route.max_tokens is None:
+            return None
+        return min(route.max_tokens, self._capabilities(route).max_output_tokens)
+
+    def _params(self, route: ModelRoute, json_mode: bool) -> dict:
+        """キャッシュキーに使う生成パラメータ"""
+        params = {}
+        if route.max_tokens is not None:
+            params["max_tokens"] = route.max_tokens
+        if json_mode:
+            params["json_mode"] = True
+        return params
+
+    def _model_spec(self, route: ModelRoute) -> ModelSpec:
+        """モデルの上限と料金（登録されていないローカルのモデルなどは、プロバイダーの上限で料金なし）"""
+        if route.model in MODEL_SPECS:
+            return model_spec(route.model)
+        capabilities = self._capabilities(route)
+        return ModelSpec(route.provider, capabilities.context_window, capabilities.max_output_tokens, 0.0, 0.0)
+
+    def _require_key(self, provider: str) -> None:
+        """API キーなどが設定されていなければ AIClientError を送出"""
+        if not self.provider_available(provider):
+            client = self.providers.get(provider)
+            detail = f"{client.requirement} を設定してください" if client and client.requirement else ""
+            raise AIClientError("missing_api_key", provider=provider, detail=detail)
+
+
+def _character_objects(objects: list[dict]) -> Iterator[dict]:
+    """抽出したJSONオブジェクトからキャラクターの候補を取り出す（包んでいるオブジェクトは開く）"""
+    for obj in objects:
+        if "name" in obj:
+            yield obj
+            continue
+        for value in obj.values():
+            if isinstance(value, list):
+                yield from (item for item in value if isinstance(item, dict))
@@ -0,0 +1,91 @@
+"""
+非同期AIクライアント
+同じステップの生成を複数同時に実行し、バリエーションをまとめて作成する
+"""
+import asyncio
+import os
+import threading
+from typing import Any, Optional
+
+from .ai_client import DEFAULT_WRITING_MODEL, AIClient
+
+
+# プロバイダーごとの同時実行数の既定値
+DEFAULT_CONCURRENCY = {
+    "gemini": 4,
+    "anthropic": 2,
+    "local": 2
+}
+
+# 下書き用のモデル（AIClient.draft）を使うメソッド（執筆系はモデルで決まる）
+DRAFT_METHODS = {
+    "generate_idea_fragments",
+    "expand_ideas",
+    "generate_setting",
+    "generate_plot",
+    "generate_characters",
+    "generate_chapter_beats"
+}
+
+
+class AsyncAIClient:
+    """AIClient を asyncio から並列に呼び出すクライアント
+
+    各呼び出しはスレッドで実行し、プロバイダーごとの同時実行数を制限する。
+    制限はイベントループをまたいで共有されるため、
+    複数のセッションから同時に使っても上限を超えない。
+    """
+
+    def __init__(self, client: AIClient, concurrency: Optional[dict[str, int]] = None):
+        self.client = client
+        limits = dict(DEFAULT_CONCURRENCY)
+        for provider in limits:
+            env_value = os.getenv(f"AI_CONCURRENCY_{provider.upper()}")
+            if env_value:
+                limits[provider] = int(env_value)
+        limits.update(concurrency or {})
+
+        self.concurrency = limits
+        self._semaphores = {
+            provider: threading.BoundedSemaphore(max(1, limit))
+            for provider, limit in limits.items()
+        }
+
+    async def call(self, method_name: str, *args, **kwargs) -> Any:
+        """AIClient のメソッドを非同期に実行"""
+        if method_name in DRAFT_METHODS:
+            provider = self.client.draft.provider
+        else:
+            provider = self.client.route(kwargs.get("model", DEFAULT_WRITING_MODEL)).provider
+        method = getattr(self.client, method_name)
+        return await asyncio.to_thread(self._call_limited, provider, method, args, kwargs)
+
+    async def generate_variants(
+        self,
+        method_name: str,
+        n: int,
+        *args,
+        return_exceptions: bool = False,
+        **kwargs
+    ) -> list:
+        """同じ引数で n 個のバリエーションを同時に生成
+
+        キャッシュで同じ結果が返らないよう、n が2以上なら force_fresh で生成する。
+        return_exceptions の場合、失敗した分は例外オブジェクトとして結果に含める。
+        """
+        if n > 1:
+            kwargs["force_fresh"] = True
+        tasks = [self.call(method_name, *args, **kwargs) for _ in range(n)]
+        return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+
+    def run_variants(self, method_name: str, n: int, *args, **kwargs) -> list:
+        """generate_variants を同期的に実行（Streamlit のスクリプトから使う）"""
+        return asyncio.run(self.generate_variants(method_name, n, *args, **kwargs))
+
+    def _call_limited(self, provider: str, method, args: tuple, kwargs: dict) -> Any:
+        """プロバイダーの同時実行数の範囲内で呼び出す"""
+        semaphore = self._semaphores.get(provider)
+        if semaphore is None:
+            return method(*args, **kwargs)
+        with semaphore:
+            return method(*args, **kwargs)
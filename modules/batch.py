@@ -0,0 +1,364 @@
+"""
+バッチ生成
+種となるアイデアの一覧から、画面を使わずに多数のプロジェクトの本文まで生成する
+
+    python -m modules.batch seeds.txt --workers 8
+    python -m modules.batch seeds.txt --provider fake --projects-dir /tmp/batch   # ネットワークに接続せずに動作確認
+    python -m modules.batch seeds.txt --model local --draft-model local          # ローカルの OpenAI 互換サーバーで生成
+
+種のファイルは1行が1プロジェクトで、アイデアの断片を「/」で区切って書く（空行と # で始まる行は無視）。
+プロジェクトは画面と同じ AIClient とストレージで、膨らませる → 設定 → プロット → 登場人物 → 本文 の順に進め、
+ステップごとに保存する。同じ種のファイルと接頭辞でもう一度実行すると、完了したステップは飛ばして途中から再開する。
+"""
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from .ai_client import DEFAULT_WRITING_MODEL, MODEL_ROUTES, AIClient
+from .async_client import AsyncAIClient
+from .data_models import Character, IdeaFragment, NovelProject, Plot, Setting, WritingConfig
+from .storage import BaseProjectStorage, ProjectStorage, create_storage
+
+STEPS = ["膨らませる", "設定", "プロット", "登場人物", "本文"]
+
+
+@dataclass
+class BatchItem:
+    """バッチで生成する1つのプロジェクト"""
+    name: str
+    ideas: List[str]
+
+
+@dataclass
+class BatchResult:
+    """1つのプロジェクトの結果"""
+    name: str
+    status: str  # "done", "skipped"（生成済み）, "failed"
+    steps: List[str] = field(default_factory=list)  # 今回実行したステップ
+    chars: int = 0
+    elapsed: float = 0.0
+    error: str = ""
+    error_kind: str = ""
+
+
+@dataclass
+class BatchReport:
+    """バッチ全体の集計"""
+    results: List[BatchResult]
+    elapsed: float
+    step_timings: Dict[str, List[float]]
+
+    def count(self, status: str) -> int:
+        return sum(1 for r in self.results if r.status == status)
+
+    @property
+    def generated_chars(self) -> int:
+        return sum(r.chars for r in self.results if r.status == "done")
+
+    @property
+    def failures(self) -> Dict[str, int]:
+        """失敗の種類ごとの件数"""
+        failures: Dict[str, int] = {}
+        for r in self.results:
+            if r.status == "failed":
+                failures[r.error_kind] = failures.get(r.error_kind, 0) + 1
+        return failures
+
+    def to_dict(self) -> Dict:
+        elapsed = self.elapsed or 1e-9
+        return {
+            "projects": len(self.results),
+            "done": self.count("done"),
+            "skipped": self.count("skipped"),
+            "failed": self.count("failed"),
+            "elapsed_seconds": round(self.elapsed, 3),
+            "projects_per_minute": round(self.count("done") / elapsed * 60, 2),
+            "chars_per_second": round(self.generated_chars / elapsed, 1),
+            "failures": self.failures,
+            "steps": {
+                step: {
+                    "calls": len(timings),
+                    "median_seconds": round(percentile(timings, 0.5), 3) if timings else None,
+                    "p95_seconds": round(percentile(timings, 0.95), 3) if timings else None
+                }
+                for step, timings in self.step_timings.items()
+            },
+            "results": [asdict(r) for r in self.results]
+        }
+
+    def format(self) -> str:
+        """端末に表示する要約"""
+        data = self.to_dict()
+        lines = [
+            f"完了 {data['done']} / 生成済み {data['skipped']} / 失敗 {data['failed']}（全{data['projects']}件）"
+            f"  所要時間 {self.elapsed:.1f}秒",
+            f"スループット: {data['projects_per_minute']:.2f} プロジェクト/分, {data['chars_per_second']:,.0f} 本文文字/秒"
+        ]
+        for step, stats in data["steps"].items():
+            if stats["calls"]:
+                lines.append(f"  {step}: {stats['calls']}回, 中央値 {stats['median_seconds']:.2f}秒, 95% {stats['p95_seconds']:.2f}秒")
+        if self.failures:
+            lines.append("失敗の内訳: " + "、".join(f"{kind} {count}" for kind, count in sorted(self.failures.items())))
+            for r in self.results:
+                if r.status == "failed":
+                    lines.append(f"  {r.name}: {r.error}")
+        return "\n".join(lines)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """q 分位点（最近順位法）"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(q * len(ordered) + 0.5) - 1))]
+
+
+def read_seeds(path: str, prefix: str = "バッチ") -> List[BatchItem]:
+    """種のファイルを読み込む（行番号からプロジェクト名を決めるため、再実行しても同じ名前になる）
+
+    断片のない行（「/」だけの行など）は ValueError にする。
+    """
+    items = []
+    lines = Path(path).read_text(encoding="utf-8").splitlines()
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        ideas = [idea.strip() for idea in line.split("/") if idea.strip()]
+        if not ideas:
+            raise ValueError(f"{number}行目にアイデアの断片がありません: {line}")
+        items.append(BatchItem(f"{prefix}{number:04d}", ideas))
+    return items
+
+
+class BatchRunner:
+    """複数のプロジェクトを並列に本文まで生成する
+
+    workers は同時に進めるプロジェクトの数。API の呼び出しは AsyncAIClient を通すため、
+    プロバイダーごとの同時実行数（concurrency、AI_CONCURRENCY_*）の上限も守られる。
+    """
+
+    def __init__(
+        self,
+        ai_client: AIClient,
+        storage: BaseProjectStorage,
+        workers: int = 4,
+        concurrency: Optional[Dict[str, int]] = None,
+        writing_config: Optional[WritingConfig] = None,
+        character_count: int = 3
+    ):
+        self.ai_client = ai_client
+        self.storage = storage
+        self.workers = max(1, workers)
+        self.async_client = AsyncAIClient(ai_client, concurrency)
+        self.writing_config = writing_config or WritingConfig("短編", "文学的", "明るい", DEFAULT_WRITING_MODEL)
+        self.character_count = character_count
+
+    def run(
+        self,
+        items: List[BatchItem],
+        on_result: Optional[Callable[[BatchResult], None]] = None
+    ) -> BatchReport:
+        """すべてのプロジェクトを生成して集計を返す"""
+        return asyncio.run(self._run_all(items, on_result))
+
+    async def _run_all(self, items: List[BatchItem], on_result) -> BatchReport:
+        # API の呼び出しと保存はスレッドで行うため、スレッド数を同時に進めるプロジェクト数に合わせる
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=self.workers))
+        semaphore = asyncio.Semaphore(self.workers)
+        step_timings: Dict[str, List[float]] = {step: [] for step in STEPS}
+
+        async def run_one(item: BatchItem) -> BatchResult:
+            async with semaphore:
+                result = await self._run_project(item, step_timings)
+            if on_result:
+                on_result(result)
+            return result
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(run_one(item) for item in items))
+        return BatchReport(list(results), time.perf_counter() - start, step_timings)
+
+    async def _run_project(self, item: BatchItem, step_timings: Dict[str, List[float]]) -> BatchResult:
+        start = time.perf_counter()
+        result = BatchResult(item.name, "done")
+        try:
+            project = await asyncio.to_thread(self.storage.load_project, item.name)
+            if project is None:
+                project = NovelProject(
+                    project_name=item.name,
+                    idea_fragments=[IdeaFragment(idea, selected=True) for idea in item.ideas]
+                )
+            if project.novel_text:
+                result.status = "skipped"
+                result.chars = len(project.novel_text)
+                return result
+
+            for step, done, run in self._steps():
+                if done(project):
+                    continue
+                step_start = time.perf_counter()
+                await run(project)
+                await asyncio.to_thread(self.storage.save_project, project)
+                step_timings[step].append(time.perf_counter() - step_start)
+                result.steps.append(step)
+            result.chars = len(project.novel_text)
+        except Exception as e:
+            result.status = "failed"
+            result.error = str(e)
+            result.error_kind = getattr(e, "kind", type(e).__name__)
+        finally:
+            result.elapsed = time.perf_counter() - start
+        return result
+
+    def _steps(self) -> list:
+        """（ステップ名, 完了の判定, 実行）の一覧"""
+        return [
+            ("膨らませる", lambda p: bool(p.expanded_ideas), self._expand),
+            ("設定", lambda p: bool(p.settings), self._setting),
+            ("プロット", lambda p: bool(p.plots), self._plot),
+            ("登場人物", lambda p: bool(p.characters), self._characters),
+            ("本文", lambda p: bool(p.novel_text), self._novel)
+        ]
+
+    async def _expand(self, project: NovelProject) -> None:
+        selected = [f.text for f in project.idea_fragments if f.selected]
+        project.expanded_ideas.append(await self.async_client.call("expand_ideas", selected))
+
+    async def _setting(self, project: NovelProject) -> None:
+        project.settings.append(Setting(await self.async_client.call("generate_setting", project.expanded_ideas[-1])))
+        project.selected_setting_index = 0
+
+    async def _plot(self, project: NovelProject) -> None:
+        setting = project.settings[project.selected_setting_index or 0].text
+        project.plots.append(Plot(await self.async_client.call("generate_plot", setting)))
+        project.selected_plot_index = 0
+
+    async def _characters(self, project: NovelProject) -> None:
+        characters = await self.async_client.call(
+            "generate_characters",
+            project.settings[project.selected_setting_index or 0].text,
+            project.plots[project.selected_plot_index or 0].text,
+            self.character_count
+        )
+        project.characters = [Character(**c) for c in characters]
+
+    async def _novel(self, project: NovelProject) -> None:
+        config = project.writing_config or self.writing_config
+        project.writing_config = config
+        project.novel_text = await self.async_client.call(
+            "write_novel",
+            setting=project.settings[project.selected_setting_index or 0].text,
+            plot=project.plots[project.selected_plot_index or 0].text,
+            characters=[c.to_dict() for c in project.characters],
+            length=config.length,
+            style=config.style,
+            tone=config.tone,
+            model=config.ai_model
+        )
+        project.record_revision("novel_text", label="AI執筆")
+
+
+def fake_client(seed: int = 0, latency: float = 0.05) -> AIClient:
+    """偽プロバイダーで応答する AIClient（ネットワークに接続しない動作確認用）"""
+    from .metrics import MetricsRegistry
+    from .providers import FakeProvider
+    from .retry import RequestExecutor, RetryPolicy
+
+    return AIClient(
+        cache=None,
+        executor=RequestExecutor(policy=RetryPolicy(max_attempts=4, base_delay=0.1, max_delay=5.0)),
+        metrics=MetricsRegistry(),
+        providers={
+            name: FakeProvider(name=name, seed=seed + i, latency=latency)
+            for i, name in enumerate(["gemini", "anthropic", "local"])
+        }
+    )
+
+
+def parse_concurrency(values: List[str]) -> Dict[str, int]:
+    """["gemini=4", "local=2"] を {"gemini": 4, "local": 2} に変換（1以上の整数でなければ ArgumentTypeError）"""
+    concurrency = {}
+    for value in values:
+        provider, _, limit = value.partition("=")
+        if not provider.strip() or not limit.isdigit() or int(limit) < 1:
+            raise argparse.ArgumentTypeError(f"同時実行数は プロバイダー=数 の形で指定してください: {value}")
+        concurrency[provider.strip()] = int(limit)
+    return concurrency
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="種のアイデアの一覧から、多数のプロジェクトの本文までをまとめて生成")
+    parser.add_argument("seeds", help="種のファイル（1行1プロジェクト、アイデアの断片を / で区切る）")
+    parser.add_argument("--prefix", default="バッチ", help="プロジェクト名の接頭辞（後ろに行番号が付く）")
+    parser.add_argument("--workers", type=int, default=4, help="同時に進めるプロジェクトの数")
+    parser.add_argument(
+        "--concurrency", action="append", default=[], metavar="PROVIDER=N",
+        help="プロバイダーごとの同時実行数（例: --concurrency gemini=4 --concurrency local=2）"
+    )
+    parser.add_argument("--model", default=DEFAULT_WRITING_MODEL, choices=sorted(MODEL_ROUTES), help="本文の執筆に使うモデル")
+    parser.add_argument("--draft-model", choices=sorted(MODEL_ROUTES), help="本文以外の生成に使うモデル（省略時は AI_DRAFT_MODEL）")
+    parser.add_argument("--length", default="短編", choices=["短編", "中編"], help="本文の分量")
+    parser.add_argument("--style", default="文学的", help="文体")
+    parser.add_argument("--tone", default="明るい", help="雰囲気")
+    parser.add_argument("--characters", type=int, default=3, help="登場人物の人数")
+    parser.add_argument("--provider", choices=["env", "fake"], default="env", help="env: .env の設定で API を呼ぶ、fake: 偽プロバイダー")
+    parser.add_argument("--fake-latency", type=float, default=0.05, help="偽プロバイダーの応答までの秒数")
+    parser.add_argument("--projects-dir", help="保存先のフォルダ（省略時は AI_NOVELIST_STORAGE の設定）")
+    parser.add_argument("--report", help="集計を JSON で書き出すファイル")
+    args = parser.parse_args(argv)
+
+    try:
+        items = read_seeds(args.seeds, args.prefix)
+        concurrency = parse_concurrency(args.concurrency)
+    except (OSError, ValueError, argparse.ArgumentTypeError) as e:
+        parser.error(str(e))
+
+    if args.provider == "fake":
+        ai_client = fake_client(latency=args.fake_latency)
+    else:
+        from dotenv import load_dotenv
+        load_dotenv()
+        ai_client = AIClient(draft_model=args.draft_model)
+    storage = ProjectStorage(args.projects_dir) if args.projects_dir else create_storage()
+
+    runner = BatchRunner(
+        ai_client,
+        storage,
+        workers=args.workers,
+        concurrency=concurrency,
+        writing_config=WritingConfig(args.length, args.style, args.tone, args.model),
+        character_count=args.characters
+    )
+    print(f"{len(items)}件のプロジェクトを生成します（同時 {args.workers}件、同時実行数 {runner.async_client.concurrency}）")
+
+    finished = 0
+
+    def progress(result: BatchResult) -> None:
+        nonlocal finished
+        finished += 1
+        if result.status == "failed":
+            detail = f"失敗（{result.error_kind}）: {result.error}"
+        elif result.status == "skipped":
+            detail = "生成済み"
+        else:
+            detail = f"{result.chars:,}文字"
+        print(f"[{finished}/{len(items)}] {result.name}: {detail}（{result.elapsed:.1f}秒）")
+
+    report = runner.run(items, on_result=progress)
+    storage.flush()
+    print()
+    print(report.format())
+
+    if args.report:
+        Path(args.report).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.report).write_text(json.dumps(report.to_dict(), ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"集計を保存しました: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+生成結果のキャッシュ
+モデル・プロンプト・生成パラメータが同じ呼び出しの結果をディスクに保存して再利用する
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024  # 50MB
+DEFAULT_MAX_AGE_SECONDS = 7 * 24 * 60 * 60  # 7日
+
+
+class ResponseCache:
+    """内容アドレス方式の生成結果キャッシュ
+
+    キーは (モデル, プロンプトのハッシュ, 生成パラメータ) から作る。
+    エントリは保存した時刻から max_age_seconds を過ぎると破棄し、合計サイズが max_bytes を
+    超えたら最後に使われた時刻（ファイルの更新時刻）が古いものから削除する。
+    """
+
+    def __init__(
+        self,
+        base_dir: str = "data/cache",
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS
+    ):
+        self.base_dir = Path(base_dir)
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        # 合計サイズ（初回の保存時に数え、以降は保存・削除のたびに増減させる）
+        self._total_bytes: Optional[int] = None
+
+    @classmethod
+    def from_env(cls) -> Optional['ResponseCache']:
+        """環境変数の設定からキャッシュを作成（無効な場合は None）"""
+        if os.getenv("AI_CACHE_ENABLED", "").lower() not in ("1", "true", "yes"):
+            return None
+
+        return cls(
+            base_dir=os.getenv("AI_CACHE_DIR", "data/cache"),
+            max_bytes=int(float(os.getenv("AI_CACHE_MAX_MB", "50")) * 1024 * 1024),
+            max_age_seconds=float(os.getenv("AI_CACHE_MAX_AGE_DAYS", "7")) * 24 * 60 * 60
+        )
+
+    @staticmethod
+    def make_key(model: str, prompt: str, params: Optional[dict] = None) -> str:
+        """キャッシュキーを作成"""
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        material = json.dumps(
+            {"model": model, "prompt": prompt_hash, "params": params or {}},
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """キャッシュされた結果を取得（なければ None）"""
+        file_path = self._get_entry_path(key)
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            created_at = entry["created_at"]
+            text = entry["text"]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            print(f"キャッシュ読み込みエラー: {e}")
+            with self._lock:
+                self._remove(file_path)
+            return None
+
+        # 期限は保存した時刻から数える（よく使われるエントリも期限が来たら作り直す）
+        if time.time() - created_at > self.max_age_seconds:
+            with self._lock:
+                self._remove(file_path)
+            return None
+
+        # 最終利用時刻を更新（サイズ超過時の削除順に使う）
+        try:
+            os.utime(file_path)
+        except OSError:
+            pass
+        return text
+
+    def put(self, key: str, text: str, model: str = "") -> None:
+        """結果をキャッシュに保存"""
+        entry = json.dumps(
+            {"model": model, "created_at": time.time(), "text": text},
+            ensure_ascii=False
+        ).encode('utf-8')
+        file_path = self._get_entry_path(key)
+
+        with self._lock:
+            try:
+                replaced = file_path.stat().st_size
+            except FileNotFoundError:
+                replaced = 0
+            try:
+                fd, tmp_path = tempfile.mkstemp(dir=self.base_dir, suffix=".tmp")
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(entry)
+                os.replace(tmp_path, file_path)
+            except OSError as e:
+                print(f"キャッシュ保存エラー: {e}")
+                return
+
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._scan())
+            else:
+                self._total_bytes += len(entry) - replaced
+            # フォルダ全体を調べるのは上限を超えたときだけ
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def clear(self) -> None:
+        """キャッシュをすべて削除"""
+        with self._lock:
+            for file_path in self.base_dir.glob("*.json"):
+                self._remove(file_path)
+            self._total_bytes = 0
+
+    def _evict(self) -> None:
+        """最後に使われた時刻が古いものから、合計サイズが上限に収まるまで削除（ロックを取得して呼ぶこと）
+
+        最後に使われてから max_age_seconds を過ぎたものは保存からも過ぎているため、あわせて削除する。
+        合計サイズは他のプロセスが書き込んだ分も含めて数え直す。
+        """
+        now = time.time()
+        entries = sorted(self._scan())
+        self._total_bytes = sum(size for _, size, _ in entries)
+        for used_at, _, file_path in entries:
+            if self._total_bytes <= self.max_bytes and now - used_at <= self.max_age_seconds:
+                break
+            self._remove(file_path)
+
+    def _scan(self) -> list:
+        """(最終利用時刻, サイズ, パス) の一覧"""
+        entries = []
+        for file_path in self.base_dir.glob("*.json"):
+            try:
+                stat = file_path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, file_path))
+        return entries
+
+    def _get_entry_path(self, key: str) -> Path:
+        """エントリのファイルパスを取得"""
+        return self.base_dir / f"{key}.json"
+
+    def _remove(self, file_path: Path) -> None:
+        """エントリを削除し、合計サイズから引く（ロックを取得して呼ぶこと）"""
+        try:
+            size = file_path.stat().st_size
+            file_path.unlink()
+        except FileNotFoundError:
+            return
+        if self._total_bytes is not None:
+            self._total_bytes -= size
@@ -0,0 +1,116 @@
+"""
+続きの執筆
+執筆済みの本文の後ろに続きを書き足す。本文全体は送らず、あらすじと直前の本文末尾だけを渡す
+"""
+import hashlib
+from typing import Callable, Optional
+
+from .ai_client import CONTINUATION_TAIL_CHARS, AIClient
+from .data_models import NovelProject, NovelSummary
+from .storage import BaseProjectStorage
+from .streaming import stream_into_project
+
+
+# 本文と続きの間の区切り
+PARAGRAPH_SEPARATOR = "\n\n"
+
+
+def _hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def summary_is_current(summary: Optional[NovelSummary], text: str) -> bool:
+    """あらすじが本文の先頭部分と食い違っていないか（本文が書き換えられていたら False）"""
+    return (
+        summary is not None
+        and summary.covered_chars <= len(text)
+        and summary.covered_hash == _hash_text(text[:summary.covered_chars])
+    )
+
+
+class ContinuationWriter:
+    """本文の続きを執筆し、あらすじを更新しながらプロジェクトに保存する
+
+    あらすじは前回から増えた本文だけを織り込んで更新するため、
+    続きを何度書いても1回あたりの入力の大きさはほぼ変わらない。
+    """
+
+    def __init__(self, ai_client: AIClient, storage: BaseProjectStorage):
+        self.ai_client = ai_client
+        self.storage = storage
+
+    def update_summary(self, project: NovelProject) -> str:
+        """直前の本文末尾より前の部分のあらすじを返す（必要な分だけ要約して保存）"""
+        text = project.novel_text.rstrip()
+        end = max(0, len(text) - CONTINUATION_TAIL_CHARS)
+        current = project.novel_summary
+
+        if summary_is_current(current, text) and current.covered_chars <= end:
+            if current.covered_chars == end:
+                return current.text
+            summary = self.ai_client.summarize_story(current.text, text[current.covered_chars:end])
+        elif end:
+            # 本文が書き換えられていたら作り直す
+            summary = self.ai_client.summarize_story("", text[:end])
+        else:
+            summary = ""
+
+        project.novel_summary = NovelSummary(text=summary, covered_chars=end, covered_hash=_hash_text(text[:end]))
+        self.storage.save_project(project)
+        return summary
+
+    def continue_novel(
+        self,
+        project: NovelProject,
+        direction: str = "",
+        on_update: Optional[Callable[[str], None]] = None,
+        force_fresh: bool = False
+    ) -> str:
+        """続きを執筆して本文に追加し、追加した部分を返す
+
+        ストリームの途中で失敗した場合は streaming.StreamInterrupted を送出する。
+        受信済みの続きは本文に保存されている。
+        """
+        if any(chapter.text for chapter in project.chapters):
+            raise ValueError("章ごとに執筆した本文には続きを追加できません")
+
+        setting = project.settings[project.selected_setting_index].text
+        plot = project.plots[project.selected_plot_index].text
+        characters = [
+            {
+                "name": char.name,
+                "role": char.role,
+                "personality": char.personality,
+                "background": char.background
+            }
+            for char in project.characters
+        ]
+        config = project.writing_config
+
+        summary = self.update_summary(project)
+        base = project.novel_text.rstrip()
+        project.record_revision("novel_text", label="続きの執筆前")
+
+        chunks = self.ai_client.continue_novel_stream(
+            setting=setting,
+            plot=plot,
+            characters=characters,
+            style=config.style,
+            tone=config.tone,
+            summary=summary,
+            previous_tail=base[-CONTINUATION_TAIL_CHARS:],
+            direction=direction,
+            model=config.ai_model,
+            force_fresh=force_fresh
+        )
+        text = stream_into_project(
+            chunks,
+            project,
+            self.storage,
+            on_update=on_update,
+            base=base + PARAGRAPH_SEPARATOR
+        )
+
+        project.record_revision("novel_text", label="続きを執筆")
+        self.storage.save_project(project)
+        return text[len(base) + len(PARAGRAPH_SEPARATOR):]
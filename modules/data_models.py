@@ -2,35 +2,146 @@
 データモデル定義
 小説プロジェクトの各ステップのデータ構造を定義
 """
-from dataclasses import dataclass, field, asdict
-from typing import List, Optional, Dict
-from datetime import datetime
+from dataclasses import dataclass, field, fields
+import copy
+from typing import Any, Callable, List, Optional, Dict
+from datetime import datetime, timedelta, timezone
 import json
+import sys
+import time
+import uuid
 
+from .revisions import Revision, record_revision, reconstruct, diff_revisions
+from .serialization import fields_to_data, to_data
 
-@dataclass
+
+# アイデア・設定・プロット・登場人物は1つのプロジェクトに数千件たまることがあり、
+# 多くのセッションで同時に保持するため、__slots__ を使ってインスタンスを小さくする。
+# 保存する JSON の形は以前と同じ（to_dict / from_dict で変換する）。
+
+def _new_id() -> str:
+    return uuid.uuid4().hex
+
+
+@dataclass(slots=True)
 class IdeaFragment:
     """アイデアの断片"""
     text: str
     selected: bool = False
     category: Optional[str] = None
 
+    def __post_init__(self):
+        # 同じ分類名は1つの文字列を共有する
+        if self.category is not None:
+            self.category = sys.intern(self.category)
 
-@dataclass
+    def to_dict(self) -> Dict:
+        """辞書形式に変換"""
+        return {"text": self.text, "selected": self.selected, "category": self.category}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'IdeaFragment':
+        """辞書からインスタンスを作成"""
+        return cls(data["text"], data.get("selected", False), data.get("category"))
+
+
+@dataclass(slots=True, init=False)
 class Setting:
-    """設定（ステップ2）"""
+    """設定（ステップ2）
+
+    作成日時は UNIX 時刻と UTC からのずれ（秒。タイムゾーンのない日時なら None）で持ち、
+    created_at で ISO 形式の文字列として返す。
+    id は版の履歴のキーに使う（作成日時は続けて作ると重なることがあるため）。
+
+    2番目の引数は以前と同じく作成日時の文字列（created_at）で、timestamp・id はキーワードで指定する。
+    """
     text: str
-    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    timestamp: float
+    id: str
+    utc_offset: Optional[float]
 
+    def __init__(
+        self,
+        text: str,
+        created_at: Optional[str] = None,
+        *,
+        timestamp: Optional[float] = None,
+        id: Optional[str] = None,
+        utc_offset: Optional[float] = None
+    ):
+        self.text = text
+        self.timestamp, self.utc_offset = _creation_time(created_at, timestamp, utc_offset)
+        self.id = id or _new_id()
 
-@dataclass
+    @property
+    def created_at(self) -> str:
+        """作成日時（ISO形式）"""
+        return _isoformat(self.timestamp, self.utc_offset)
+
+    def to_dict(self) -> Dict:
+        """辞書形式に変換"""
+        return {"text": self.text, "created_at": self.created_at, "id": self.id}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Setting':
+        """辞書からインスタンスを作成"""
+        return cls(
+            data["text"],
+            data.get("created_at"),
+            timestamp=data.get("timestamp"),
+            id=data.get("id") or _legacy_id(data)
+        )
+
+
+@dataclass(slots=True, init=False)
 class Plot:
-    """プロット（ステップ3）"""
+    """プロット（ステップ3）
+
+    作成日時は UNIX 時刻と UTC からのずれ（秒。タイムゾーンのない日時なら None）で持ち、
+    created_at で ISO 形式の文字列として返す。
+    id は版の履歴のキーに使う（作成日時は続けて作ると重なることがあるため）。
+
+    2番目の引数は以前と同じく作成日時の文字列（created_at）で、timestamp・id はキーワードで指定する。
+    """
     text: str
-    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    timestamp: float
+    id: str
+    utc_offset: Optional[float]
 
+    def __init__(
+        self,
+        text: str,
+        created_at: Optional[str] = None,
+        *,
+        timestamp: Optional[float] = None,
+        id: Optional[str] = None,
+        utc_offset: Optional[float] = None
+    ):
+        self.text = text
+        self.timestamp, self.utc_offset = _creation_time(created_at, timestamp, utc_offset)
+        self.id = id or _new_id()
 
-@dataclass
+    @property
+    def created_at(self) -> str:
+        """作成日時（ISO形式）"""
+        return _isoformat(self.timestamp, self.utc_offset)
+
+    def to_dict(self) -> Dict:
+        """辞書形式に変換"""
+        return {"text": self.text, "created_at": self.created_at, "id": self.id}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Plot':
+        """辞書からインスタンスを作成"""
+        return cls(
+            data["text"],
+            data.get("created_at"),
+            timestamp=data.get("timestamp"),
+            id=data.get("id") or _legacy_id(data)
+        )
+
+
+@dataclass(slots=True)
 class Character:
     """登場人物（ステップ4）"""
     name: str
@@ -38,6 +149,101 @@ class Character:
     background: Optional[str] = None
     role: Optional[str] = None
 
+    def __post_init__(self):
+        # 「主人公」「脇役」などの役割は1つの文字列を共有する
+        if self.role is not None:
+            self.role = sys.intern(self.role)
+
+    def to_dict(self) -> Dict:
+        """辞書形式に変換"""
+        return {
+            "name": self.name,
+            "personality": self.personality,
+            "background": self.background,
+            "role": self.role,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Character':
+        """辞書からインスタンスを作成"""
+        return cls(data["name"], data["personality"], data.get("background"), data.get("role"))
+
+
+def _isoformat(timestamp: float, utc_offset: Optional[float] = None) -> str:
+    """UNIX 時刻を ISO 形式にする（utc_offset が None ならタイムゾーンのないローカル時刻）"""
+    if utc_offset is None:
+        return datetime.fromtimestamp(timestamp).isoformat()
+    return datetime.fromtimestamp(timestamp, timezone(timedelta(seconds=utc_offset))).isoformat()
+
+
+def _creation_time(
+    created_at: Optional[str],
+    timestamp: Optional[float],
+    utc_offset: Optional[float]
+) -> tuple[float, Optional[float]]:
+    """作成日時の指定を (UNIX 時刻, UTC からのずれ) にする
+
+    ISO 形式の created_at があればそれを優先し、タイムゾーンのずれも残す。
+    どちらもなければ現在時刻にする。
+    """
+    if created_at is not None:
+        value = datetime.fromisoformat(created_at)
+        offset = value.utcoffset()
+        return value.timestamp(), offset.total_seconds() if offset is not None else None
+    return (time.time() if timestamp is None else timestamp), utc_offset
+
+
+def _legacy_id(data: Dict) -> str:
+    """id を保存していなかった頃のデータの id（以前の履歴のキーと同じ作成日時にする）"""
+    if "created_at" in data:
+        return data["created_at"]
+    return _isoformat(data.get("timestamp", time.time()))
+
+
+def backfill_ids(items: List[Dict]) -> List[Dict]:
+    """id のない設定・プロットに id を付ける
+
+    以前の履歴のキーを引き継ぐため作成日時を id にする。作成日時が重なる場合は、
+    以前と同じく最初の1件が履歴を引き継ぎ、2件目以降には番号を付けて区別する。
+    """
+    if all(item.get("id") for item in items):
+        return items
+    used = {item["id"] for item in items if item.get("id")}
+    result = []
+    for item in items:
+        if not item.get("id"):
+            base = item_id = _legacy_id(item)
+            n = 1
+            while item_id in used:
+                n += 1
+                item_id = f"{base}#{n}"
+            used.add(item_id)
+            item = {**item, "id": item_id}
+        result.append(item)
+    return result
+
+
+@dataclass
+class Chapter:
+    """章（長編を章ごとに執筆する場合）"""
+    title: str
+    beat: str  # この章で起きること
+    text: str = ""
+    summary: str = ""  # この章までのあらすじ
+
+
+@dataclass
+class NovelSummary:
+    """続きの執筆に使う、本文の先頭からのあらすじ"""
+    text: str
+    covered_chars: int  # あらすじに織り込んだ本文の文字数（先頭から）
+    covered_hash: str  # 織り込んだ部分のハッシュ（本文が書き換えられたかの判定に使う）
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'NovelSummary':
+        """辞書からインスタンスを作成（知らない項目は無視する）"""
+        return _from_known_fields(cls, data)
+
 
 @dataclass
 class WritingConfig:
@@ -45,12 +251,185 @@ class WritingConfig:
     length: str  # "短編", "中編", "長編"
     style: str  # "文学的", "ライトノベル風", "エッセイ風" など
     tone: str  # "明るい", "暗い", "ミステリアス" など
-    ai_model: str = "haiku3.5"  # "haiku3.5", "sonnet4.5", "gemini2.5pro"
+    ai_model: str = "haiku3.5"  # "haiku3.5", "sonnet4.5", "gemini2.5pro", "local"
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'WritingConfig':
+        """辞書からインスタンスを作成（知らない項目は無視する）"""
+        return _from_known_fields(cls, data)
+
+
+# プロジェクトの中で個別に保存・遅延読み込みできる部分
+SECTION_NAMES = (
+    "idea_fragments",
+    "expanded_ideas",
+    "settings",
+    "plots",
+    "characters",
+    "chapters",
+    "novel_text",
+    "revisions",
+)
+
+# データクラスのリストとして保存する部分
+SECTION_TYPES = {
+    "idea_fragments": IdeaFragment,
+    "settings": Setting,
+    "plots": Plot,
+    "characters": Character,
+    "chapters": Chapter,
+}
+
+
+def section_to_data(name: str, value: Any) -> Any:
+    """部分データを JSON に変換できる形にする"""
+    return to_data(value)
+
+
+def section_from_data(name: str, data: Any) -> Any:
+    """JSON から読み込んだ部分データを復元する"""
+    cls = SECTION_TYPES.get(name)
+    if cls is Setting or cls is Plot:
+        data = backfill_ids(data)
+    if cls is Chapter:
+        # 章は件数が少ないため、通常のデータクラスのまま
+        return [_from_known_fields(cls, item) for item in data]
+    if cls:
+        return [cls.from_dict(item) for item in data]
+    if name == "revisions":
+        return {key: [_from_known_fields(Revision, item) for item in items] for key, items in data.items()}
+    return data
+
+
+def _from_known_fields(cls, data: Dict):
+    """知らない項目を除いてデータクラスを作成（新しいバージョンで保存したデータを読めるようにする）"""
+    names = {f.name for f in fields(cls)}
+    return cls(**{key: value for key, value in data.items() if key in names})
+
+
+def setting_revision_key(setting: Setting) -> str:
+    """設定の版の履歴のキー"""
+    return f"setting:{setting.id}"
+
+
+def plot_revision_key(plot: Plot) -> str:
+    """プロットの版の履歴のキー"""
+    return f"plot:{plot.id}"
+
+
+# 保存データの形式のバージョン
+#   1: 最初の形式（schema_version なし）
+#   2: chapters を追加
+#   3: revisions を追加（ここから schema_version を保存する）
+#   4: novel_summary を追加
+#   5: 設定・プロットに id を追加（版の履歴のキーを作成日時から id に変更）
+SCHEMA_VERSION = 5
+
+
+def schema_version_of(data: Dict) -> int:
+    """保存データの形式のバージョン（書かれていなければ項目から判断する）"""
+    if "schema_version" in data:
+        return data["schema_version"]
+    if "novel_summary" in data:
+        return 4
+    if "revisions" in data:
+        return 3
+    if "chapters" in data:
+        return 2
+    return 1
+
+
+def _upgrade_to_2(data: Dict) -> Dict:
+    data.setdefault("chapters", [])
+    return data
+
+
+def _upgrade_to_3(data: Dict) -> Dict:
+    data.setdefault("revisions", {})
+    return data
+
+
+def _upgrade_to_4(data: Dict) -> Dict:
+    data.setdefault("novel_summary", None)
+    return data
+
+
+def _upgrade_to_5(data: Dict) -> Dict:
+    for name in ("settings", "plots"):
+        if data.get(name):
+            data[name] = backfill_ids(data[name])
+    return data
+
+
+def _downgrade_to_4(data: Dict) -> Dict:
+    # 履歴のキーを作成日時に戻す
+    revisions = dict(data.get("revisions") or {})
+    for kind, name in (("setting", "settings"), ("plot", "plots")):
+        items = []
+        for item in data.get(name) or []:
+            item = dict(item)
+            item_id = item.pop("id", None)
+            history = revisions.pop(f"{kind}:{item_id}", None)
+            if history is not None:
+                revisions.setdefault(f"{kind}:{item['created_at']}", history)
+            items.append(item)
+        data[name] = items
+    data["revisions"] = revisions
+    return data
+
+
+def _downgrade_to_3(data: Dict) -> Dict:
+    data.pop("novel_summary", None)
+    return data
+
+
+def _downgrade_to_2(data: Dict) -> Dict:
+    data.pop("revisions", None)
+    data.pop("schema_version", None)
+    return data
+
+
+def _downgrade_to_1(data: Dict) -> Dict:
+    data.pop("chapters", None)
+    return data
+
+
+# バージョン n から n + 1 / n から n - 1 への変換
+_UPGRADES = {1: _upgrade_to_2, 2: _upgrade_to_3, 3: _upgrade_to_4, 4: _upgrade_to_5}
+_DOWNGRADES = {5: _downgrade_to_4, 4: _downgrade_to_3, 3: _downgrade_to_2, 2: _downgrade_to_1}
+
+
+def migrate_data(data: Dict, target_version: int = SCHEMA_VERSION) -> Dict:
+    """保存データを target_version の形式に変換した新しい辞書を返す
+
+    古いバージョンへも戻せる。このアプリより新しいバージョンのデータは、
+    変換方法が分からないためそのまま返す（知らない項目は from_dict で extra に残る）。
+    """
+    data = dict(data)
+    version = schema_version_of(data)
+    while version < target_version:
+        data = _UPGRADES[version](data)
+        version += 1
+    while version > target_version and version in _DOWNGRADES:
+        data = _DOWNGRADES[version](data)
+        version -= 1
+    if version >= 3:
+        data["schema_version"] = version
+    return data
+
+
+_LAZY_FIELDS = frozenset(SECTION_NAMES)
 
 
 @dataclass
 class NovelProject:
-    """小説プロジェクト全体"""
+    """小説プロジェクト全体
+
+    SECTION_NAMES のフィールドは set_lazy_field で遅延読み込みにでき、
+    初めてアクセスしたときに読み込まれる。
+    from_dict で作成した場合も、これらのフィールドは初めてアクセスしたときに
+    データクラスに変換する。
+    """
     project_name: str
     created_at: str = field(default_factory=lambda: datetime.now().isoformat())
     updated_at: str = field(default_factory=lambda: datetime.now().isoformat())
@@ -65,35 +444,163 @@ class NovelProject:
     characters: List[Character] = field(default_factory=list)
     writing_config: Optional[WritingConfig] = None
     novel_text: str = ""
+    chapters: List[Chapter] = field(default_factory=list)
+    novel_summary: Optional[NovelSummary] = None  # 続きの執筆用のあらすじ
 
-    def to_dict(self) -> Dict:
-        """辞書形式に変換"""
-        return asdict(self)
+    # 編集の履歴（キーは "novel_text"、"setting:<id>"、"plot:<id>"）
+    revisions: Dict[str, List[Revision]] = field(default_factory=dict)
+
+    # 保存データにあった、このバージョンでは知らない項目（保存するときにそのまま書き戻す）
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    def edit_text(self, key: str, text: str, label: Optional[str] = None) -> None:
+        """本文・設定・プロットのテキストを書き換え、版の履歴に記録する
+
+        初めて編集するときは、編集前のテキストも最初の版として記録する。
+        """
+        if not self.revisions.get(key):
+            self.record_revision(key, self._get_revision_text(key), "編集前")
+        self._set_revision_text(key, text)
+        self.record_revision(key, text, label)
+
+    def record_revision(self, key: str, text: Optional[str] = None, label: Optional[str] = None) -> bool:
+        """現在のテキスト（または text）を版として記録（前の版と同じなら記録しない）"""
+        if text is None:
+            text = self._get_revision_text(key)
+        return record_revision(self.revisions.setdefault(key, []), text, label)
+
+    def list_revisions(self, key: str) -> List[Revision]:
+        """版の一覧（古い順）"""
+        return list(self.revisions.get(key, []))
+
+    def get_revision(self, key: str, index: int) -> str:
+        """index 番目の版のテキスト"""
+        return reconstruct(self.revisions.get(key, []), index)
+
+    def restore_revision(self, key: str, index: int) -> str:
+        """index 番目の版に戻す（戻したこと自体も新しい版として記録する）"""
+        text = self.get_revision(key, index)
+        self._set_revision_text(key, text)
+        self.record_revision(key, text, f"版{index % len(self.revisions[key]) + 1}から復元")
+        return text
+
+    def diff_revisions(self, key: str, old_index: int, new_index: int) -> str:
+        """2つの版の差分（unified diff 形式）"""
+        return diff_revisions(self.revisions.get(key, []), old_index, new_index)
+
+    def _revision_target(self, key: str):
+        """履歴のキーに対応する設定・プロット（本文なら None）"""
+        if key == "novel_text":
+            return None
+        kind, _, item_id = key.partition(":")
+        items = {"setting": self.settings, "plot": self.plots}.get(kind, [])
+        for item in items:
+            if item.id == item_id:
+                return item
+        raise KeyError(f"履歴の対象が見つかりません: {key}")
+
+    def _get_revision_text(self, key: str) -> str:
+        target = self._revision_target(key)
+        return self.novel_text if target is None else target.text
+
+    def _set_revision_text(self, key: str, text: str) -> None:
+        target = self._revision_target(key)
+        if target is None:
+            self.novel_text = text
+        else:
+            target.text = text
+
+    def set_lazy_field(self, name: str, loader: Callable[[], Any]) -> None:
+        """フィールドを初回アクセス時に loader で読み込むよう設定"""
+        self.__dict__.setdefault('_lazy_loaders', {})[name] = loader
+
+    def is_loaded(self, name: str) -> bool:
+        """フィールドが読み込み済みか（遅延読み込みでなければ常に True）"""
+        return name not in self.__dict__.get('_lazy_loaders', {})
+
+    def is_hydrated(self, name: str) -> bool:
+        """フィールドがデータクラスに変換済みか（遅延読み込み・from_dict の変換待ちでないか）"""
+        return self.is_loaded(name) and name not in self.__dict__.get('_raw_sections', {})
+
+    def __getattribute__(self, name):
+        if name in _LAZY_FIELDS:
+            instance_dict = object.__getattribute__(self, '__dict__')
+            loaders = instance_dict.get('_lazy_loaders')
+            if loaders and name in loaders:
+                instance_dict[name] = loaders.pop(name)()
+            else:
+                raw_sections = instance_dict.get('_raw_sections')
+                if raw_sections and name in raw_sections:
+                    instance_dict[name] = section_from_data(name, raw_sections.pop(name))
+        return object.__getattribute__(self, name)
+
+    def __setattr__(self, name, value):
+        if name in _LAZY_FIELDS:
+            # 読み込み前に上書きされた場合は読み込みを取り消す
+            self.__dict__.get('_lazy_loaders', {}).pop(name, None)
+            self.__dict__.get('_raw_sections', {}).pop(name, None)
+        object.__setattr__(self, name, value)
+
+    def snapshot(self) -> 'NovelProject':
+        """現在の内容の複製（別のスレッドで保存しても、その後の編集が混ざらない）
+
+        読み込み済みの部分は JSON に変換できる形で複製し、初めてアクセスしたときに復元する。
+        まだ読み込んでいない部分は読み込み方だけを引き継ぐ。
+        """
+        instance_dict = self.__dict__
+        loaders = instance_dict.get('_lazy_loaders', {})
+        raw_sections = instance_dict.get('_raw_sections', {})
+
+        values = {
+            f.name: copy.deepcopy(instance_dict[f.name]) for f in fields(self) if f.name not in _LAZY_FIELDS
+        }
+        copied = NovelProject(**values)
+        copied_raw = copied.__dict__['_raw_sections'] = {}
+        for name in SECTION_NAMES:
+            if name in loaders:
+                copied.set_lazy_field(name, loaders[name])
+            elif name in raw_sections:
+                copied_raw[name] = copy.deepcopy(raw_sections[name])
+            else:
+                copied_raw[name] = to_data(instance_dict[name])
+        return copied
+
+    def to_dict(self, schema_version: int = SCHEMA_VERSION) -> Dict:
+        """辞書形式に変換
+
+        schema_version に古いバージョンを指定すると、そのバージョンのアプリで読める形にする
+        （知らない項目があると読めないため、extra の項目も含めない）。
+        """
+        data = fields_to_data(self)
+        extra = data.pop('extra')
+        data['schema_version'] = SCHEMA_VERSION
+        if schema_version < SCHEMA_VERSION:
+            return migrate_data(data, schema_version)
+        return {**extra, **migrate_data(data)}
 
     @classmethod
     def from_dict(cls, data: Dict) -> 'NovelProject':
-        """辞書からインスタンスを作成"""
-        # ネストされたデータクラスを復元
-        if 'idea_fragments' in data:
-            data['idea_fragments'] = [
-                IdeaFragment(**item) for item in data['idea_fragments']
-            ]
-        if 'settings' in data:
-            data['settings'] = [
-                Setting(**item) for item in data['settings']
-            ]
-        if 'plots' in data:
-            data['plots'] = [
-                Plot(**item) for item in data['plots']
-            ]
-        if 'characters' in data:
-            data['characters'] = [
-                Character(**item) for item in data['characters']
-            ]
-        if 'writing_config' in data and data['writing_config']:
-            data['writing_config'] = WritingConfig(**data['writing_config'])
-
-        return cls(**data)
+        """辞書からインスタンスを作成
+
+        古いバージョンのデータは現在の形式に変換し、知らない項目は extra に残す。
+        アイデアや設定などの部分は、初めてアクセスしたときにデータクラスに変換する。
+        """
+        data = migrate_data(data)
+        data.pop('schema_version', None)
+
+        names = {f.name for f in fields(cls)} - {'extra'}
+        values = {key: value for key, value in data.items() if key in names and key not in _LAZY_FIELDS}
+        if values.get('writing_config'):
+            values['writing_config'] = WritingConfig.from_dict(values['writing_config'])
+        if values.get('novel_summary'):
+            values['novel_summary'] = NovelSummary.from_dict(values['novel_summary'])
+        values['extra'] = {key: value for key, value in data.items() if key not in names}
+
+        project = cls(**values)
+        project.__dict__['_raw_sections'] = {
+            name: data[name] for name in SECTION_NAMES if name in data
+        }
+        return project
 
     def to_json(self) -> str:
         """JSON文字列に変換"""
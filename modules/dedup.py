@@ -0,0 +1,88 @@
+"""
+テキストの重複判定
+正規化した文字バイグラムの類似度で、ほぼ同じアイデアを検出する
+"""
+import unicodedata
+from collections import Counter
+from typing import Iterable
+
+
+# これ以上の類似度（Jaccard係数）なら重複とみなす
+DEFAULT_SIMILARITY_THRESHOLD = 0.5
+
+
+def normalize_text(text: str) -> str:
+    """表記ゆれを吸収した比較用の文字列を作成
+
+    全角・半角を統一し、空白・句読点・記号を取り除く。
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    return "".join(
+        c for c in text
+        if not unicodedata.category(c).startswith(("P", "S", "Z", "C"))
+    )
+
+
+def char_bigrams(text: str) -> set[str]:
+    """文字バイグラムの集合（1文字の場合はその文字）"""
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class FragmentIndex:
+    """近似重複を判定するための索引
+
+    バイグラムの転置索引で候補を絞り込むため、
+    登録済みの件数が増えても全件と比較しない。
+    """
+
+    def __init__(
+        self,
+        texts: Iterable[str] = (),
+        threshold: float = DEFAULT_SIMILARITY_THRESHOLD
+    ):
+        self.threshold = threshold
+        self._grams: list[set[str]] = []
+        self._postings: dict[str, list[int]] = {}
+        self._exact: set[str] = set()
+        for text in texts:
+            self.add(text)
+
+    def __len__(self) -> int:
+        return len(self._grams)
+
+    def is_duplicate(self, text: str) -> bool:
+        """登録済みのテキストとほぼ同じか"""
+        normalized = normalize_text(text)
+        if normalized in self._exact:
+            return True
+
+        grams = char_bigrams(normalized)
+        if not grams:
+            return True
+
+        shared = Counter()
+        for gram in grams:
+            for doc_id in self._postings.get(gram, ()):
+                shared[doc_id] += 1
+
+        for doc_id, count in shared.items():
+            union = len(grams) + len(self._grams[doc_id]) - count
+            if count / union >= self.threshold:
+                return True
+        return False
+
+    def add(self, text: str) -> bool:
+        """重複でなければ登録する（登録したら True）"""
+        if self.is_duplicate(text):
+            return False
+
+        normalized = normalize_text(text)
+        grams = char_bigrams(normalized)
+        doc_id = len(self._grams)
+        self._grams.append(grams)
+        self._exact.add(normalized)
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(doc_id)
+        return True
@@ -0,0 +1,499 @@
+"""
+バックグラウンドジョブ
+プロット・登場人物・本文の生成をスレッドプールで実行し、完了したらプロジェクトに保存する
+
+ジョブは SQLite のテーブルに記録するため、ページを移動しても Streamlit のスクリプトが
+再実行されても状態を確認できる。実行中のジョブには実行しているプロセス（owner）と
+最後に生存を確認した時刻（heartbeat_at）を記録する。サーバーを再起動した場合、待機中のジョブは
+実行し直し、実行中のまま生存の確認が途絶えたジョブは失敗として記録する。
+同じデータベースを使う別のプロセスが実行中のジョブには手を付けない。
+
+結果は完了した時点でプロジェクトを読み直し、そのジョブの部分だけを書き換えて保存する。
+ジョブの実行中に画面で編集した内容は上書きしない。
+"""
+import json
+import os
+import sqlite3
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, MutableMapping, Optional, Sequence
+
+from .ai_client import AIClient
+from .data_models import Character, NovelProject, Plot
+from .retry import AIClientError
+from .storage import BaseProjectStorage
+
+
+# ジョブの種類と表示名
+JOB_LABELS = {
+    "plot": "プロット",
+    "characters": "登場人物",
+    "novel": "本文",
+}
+
+# 状態（queued → running → done / failed / cancelled）
+ACTIVE_STATUSES = ("queued", "running")
+STATUS_LABELS = {
+    "queued": "待機中",
+    "running": "実行中",
+    "done": "完了",
+    "failed": "失敗",
+    "cancelled": "取り消し",
+}
+
+# 本文のジョブで途中経過を記録する間隔（文字数・秒数のどちらかを超えたら記録）
+PROGRESS_CHARS = 500
+PROGRESS_SECONDS = 2.0
+
+# 実行中のジョブの生存を記録する間隔と、記録が途絶えたら中断とみなすまでの秒数
+HEARTBEAT_SECONDS = 10.0
+HEARTBEAT_TIMEOUT = 60.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT NOT NULL DEFAULT '',
+    error TEXT NOT NULL DEFAULT '',
+    partial TEXT NOT NULL DEFAULT '',
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    owner TEXT NOT NULL DEFAULT '',
+    heartbeat_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_project ON jobs (project, created_at);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+"""
+
+# 後から追加した jobs テーブルの列（古いデータベースには ALTER TABLE で追加する）
+ADDED_COLUMNS = {
+    "owner": "TEXT NOT NULL DEFAULT ''",
+    "heartbeat_at": "REAL",
+}
+
+_COLUMNS = (
+    "id, project, kind, params, status, result, error, partial, created_at, started_at, finished_at, "
+    "owner, heartbeat_at"
+)
+
+
+class JobCancelled(Exception):
+    """取り消されたジョブの実行を打ち切る"""
+
+
+@dataclass
+class Job:
+    """1件のジョブ"""
+    id: int
+    project: str
+    kind: str
+    params: Dict[str, Any]
+    status: str
+    result: str = ""  # 完了時の結果の要約（「3人」「2,345文字」など）
+    error: str = ""
+    partial: str = ""  # 本文のジョブの途中経過
+    created_at: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    owner: str = ""  # 実行しているプロセス
+    heartbeat_at: Optional[float] = None  # 実行中であることを最後に記録した時刻
+
+    @property
+    def label(self) -> str:
+        return JOB_LABELS.get(self.kind, self.kind)
+
+    @property
+    def status_label(self) -> str:
+        return STATUS_LABELS.get(self.status, self.status)
+
+    @property
+    def active(self) -> bool:
+        return self.status in ACTIVE_STATUSES
+
+    @property
+    def elapsed(self) -> Optional[float]:
+        """実行時間（秒）"""
+        if self.started_at is None:
+            return None
+        return (self.finished_at or time.time()) - self.started_at
+
+    @classmethod
+    def from_row(cls, row: Sequence) -> 'Job':
+        values = list(row)
+        values[3] = json.loads(values[3])
+        return cls(*values)
+
+
+class JobRunner:
+    """AIClient の生成をバックグラウンドで実行し、結果をプロジェクトに保存する
+
+    プロセス全体で1つを共有する（Streamlit では st.cache_resource で作る）。
+    プロバイダーごとの再試行・レート制限は AIClient の RequestExecutor がそのまま受け持つ。
+    """
+
+    def __init__(
+        self,
+        ai_client: AIClient,
+        storage: BaseProjectStorage,
+        db_path: str = "data/jobs.db",
+        max_workers: int = 4
+    ):
+        self.ai_client = ai_client
+        self.storage = storage
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # 接続はスレッドごとに作る（sqlite3 の接続はスレッド間で共有できない）
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="job")
+        self._cancelled: set = set()
+        self._cancel_lock = threading.Lock()
+        # プロジェクトごとの読み直し〜保存を直列にする
+        self._project_locks: Dict[str, threading.Lock] = {}
+        self._project_locks_lock = threading.Lock()
+        # このランナーを表す名前（ジョブの owner に記録する）
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stopped = threading.Event()
+
+        self._migrate_schema()
+        self._recover()
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+        self._heartbeat_thread.start()
+
+    @classmethod
+    def from_env(cls, ai_client: AIClient, storage: BaseProjectStorage) -> 'JobRunner':
+        """環境変数の設定から作成"""
+        return cls(
+            ai_client,
+            storage,
+            db_path=os.getenv("AI_JOBS_DB_PATH", "data/jobs.db"),
+            max_workers=int(os.getenv("AI_JOBS_MAX_WORKERS", "4"))
+        )
+
+    def submit(self, project_name: str, kind: str, params: Dict[str, Any]) -> int:
+        """ジョブを登録して実行を予約し、ジョブIDを返す"""
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"不明なジョブの種類: {kind}")
+        with self._connection() as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (project, kind, params, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                (project_name, kind, json.dumps(params, ensure_ascii=False), time.time())
+            )
+        job_id = cursor.lastrowid
+        self._pool.submit(self._run, job_id)
+        return job_id
+
+    def get(self, job_id: int) -> Optional[Job]:
+        """ジョブを取得"""
+        row = self._connection().execute(f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job.from_row(row) if row else None
+
+    def list_jobs(
+        self,
+        project_name: Optional[str] = None,
+        kinds: Optional[Sequence[str]] = None,
+        limit: int = 20
+    ) -> List[Job]:
+        """新しい順にジョブを取得"""
+        query = f"SELECT {_COLUMNS} FROM jobs"
+        conditions, args = [], []
+        if project_name is not None:
+            conditions.append("project = ?")
+            args.append(project_name)
+        if kinds:
+            conditions.append(f"kind IN ({', '.join('?' for _ in kinds)})")
+            args.extend(kinds)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY id DESC LIMIT ?"
+        args.append(limit)
+        return [Job.from_row(row) for row in self._connection().execute(query, args)]
+
+    def last_finished_at(self, project_name: str) -> float:
+        """プロジェクトのジョブが最後に終わった時刻（なければ 0）"""
+        row = self._connection().execute(
+            "SELECT MAX(finished_at) FROM jobs WHERE project = ?", (project_name,)
+        ).fetchone()
+        return row[0] or 0.0
+
+    def cancel(self, job_id: int) -> bool:
+        """ジョブを取り消す
+
+        待機中のジョブは実行せず、実行中の本文のジョブは次の途中経過の記録で打ち切る。
+        実行中のそれ以外のジョブは、結果を保存せずに破棄する。
+        """
+        with self._cancel_lock:
+            self._cancelled.add(job_id)
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            )
+        return self._status(job_id) in ("cancelled", "running")
+
+    def shutdown(self, wait: bool = True) -> None:
+        """スレッドプールを止める（待機中のジョブは次回の起動時に実行する）"""
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+        self._stopped.set()
+
+    def _run(self, job_id: int) -> None:
+        """ジョブを1件実行（ワーカースレッド）"""
+        # 待機中の場合だけ実行中にする（複数のプロセスが同じジョブを実行しないようにする）
+        now = time.time()
+        with self._connection() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, owner = ?, heartbeat_at = ? "
+                "WHERE id = ? AND status = 'queued'",
+                (now, self.owner, now, job_id)
+            )
+        if cursor.rowcount == 0:
+            # 取り消し済みか、別のプロセスが実行を始めた
+            with self._cancel_lock:
+                self._cancelled.discard(job_id)
+            return
+
+        job = self.get(job_id)
+        try:
+            result = JOB_HANDLERS[job.kind](self, job)
+        except JobCancelled:
+            self._finish(job_id, "cancelled")
+        except AIClientError as e:
+            self._finish(job_id, "failed", error=e.user_message())
+        except Exception as e:
+            print(f"ジョブ実行エラー: {e}")
+            self._finish(job_id, "failed", error=str(e))
+        else:
+            self._finish(job_id, "done", result=result)
+        finally:
+            with self._cancel_lock:
+                self._cancelled.discard(job_id)
+
+    def _finish(self, job_id: int, status: str, result: str = "", error: str = "") -> None:
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, result, error, time.time(), job_id)
+            )
+
+    def _status(self, job_id: int) -> Optional[str]:
+        row = self._connection().execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def is_cancelled(self, job_id: int) -> bool:
+        with self._cancel_lock:
+            return job_id in self._cancelled
+
+    def record_progress(self, job_id: int, partial: str) -> None:
+        """本文のジョブの途中経過を記録（取り消されていれば JobCancelled を送出）"""
+        if self.is_cancelled(job_id):
+            raise JobCancelled()
+        with self._connection() as conn:
+            conn.execute("UPDATE jobs SET partial = ? WHERE id = ?", (partial, job_id))
+
+    def update_project(
+        self,
+        job: Job,
+        apply: Callable[[NovelProject], None],
+        keep_if_cancelled: bool = False
+    ) -> None:
+        """保存されているプロジェクトを読み直し、apply で書き換えて保存する
+
+        ジョブが取り消されていれば、keep_if_cancelled でない限り保存せずに JobCancelled を送出する。
+        """
+        with self._project_lock(job.project):
+            if self.is_cancelled(job.id) and not keep_if_cancelled:
+                raise JobCancelled()
+            project = self.storage.load_project(job.project)
+            if project is None:
+                raise RuntimeError(f"プロジェクトが見つかりません: {job.project}")
+            apply(project)
+            if not self.storage.save_project(project):
+                raise RuntimeError(f"プロジェクトを保存できませんでした: {job.project}")
+
+    def _project_lock(self, project_name: str) -> threading.Lock:
+        with self._project_locks_lock:
+            return self._project_locks.setdefault(project_name, threading.Lock())
+
+    def _migrate_schema(self) -> None:
+        """テーブルを作成し、以前のデータベースには足りない列を追加する"""
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for column, definition in ADDED_COLUMNS.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+
+    def _recover(self) -> None:
+        """前回のプロセスで終わらなかったジョブを処理する
+
+        生存の確認が HEARTBEAT_TIMEOUT 秒以上途絶えた実行中のジョブは失敗として記録する。
+        待機中のジョブは実行を予約する（実際に実行するのは _run で実行中にできたプロセスだけ）。
+        """
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? "
+                "WHERE status = 'running' AND COALESCE(heartbeat_at, started_at, 0) < ?",
+                ("サーバーの再起動で中断されました", now, now - HEARTBEAT_TIMEOUT)
+            )
+            queued = [row[0] for row in conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY id")]
+        for job_id in queued:
+            self._pool.submit(self._run, job_id)
+
+    def _heartbeat_loop(self) -> None:
+        """このランナーが実行中のジョブの生存を定期的に記録する（専用のスレッド）"""
+        while not self._stopped.wait(HEARTBEAT_SECONDS):
+            try:
+                with self._connection() as conn:
+                    conn.execute(
+                        "UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND status = 'running'",
+                        (time.time(), self.owner)
+                    )
+            except sqlite3.Error as e:
+                print(f"ジョブの生存記録エラー: {e}")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+
+def sync_session_project(
+    state: MutableMapping,
+    runner: JobRunner,
+    storage: BaseProjectStorage
+) -> Optional[NovelProject]:
+    """ジョブの完了後に、セッションが持つプロジェクトを保存先から読み直す
+
+    state は Streamlit の session_state（current_project を持つ）。
+    完了したジョブの結果を含まない古いプロジェクトを画面から保存して、
+    結果を上書きしてしまうのを防ぐため、各ページの最初に呼ぶ。
+    """
+    project = state.get('current_project')
+    if project is None:
+        return None
+
+    synced = state.setdefault('jobs_synced_at', {})
+    finished_at = runner.last_finished_at(project.project_name)
+    if finished_at > synced.get(project.project_name, 0.0):
+        project = storage.load_project(project.project_name) or project
+        state['current_project'] = project
+        synced[project.project_name] = finished_at
+    return project
+
+
+# ---- ジョブの種類ごとの処理（結果の要約を返す） ----
+
+def _run_plot(runner: JobRunner, job: Job) -> str:
+    params = job.params
+    text = runner.ai_client.generate_plot(params["setting"], force_fresh=params.get("force_fresh", False))
+    runner.update_project(job, lambda project: project.plots.append(Plot(text=text)))
+    return f"{len(text):,}文字"
+
+
+def _run_characters(runner: JobRunner, job: Job) -> str:
+    params = job.params
+    characters = [
+        Character(**data)
+        for data in runner.ai_client.generate_characters(
+            params["setting"],
+            params["plot"],
+            params.get("count", 3),
+            force_fresh=params.get("force_fresh", False)
+        )
+    ]
+    runner.update_project(job, lambda project: project.characters.extend(characters))
+    return f"{len(characters)}人"
+
+
+def _run_novel(runner: JobRunner, job: Job) -> str:
+    """本文をストリームで受け取り、途中経過をジョブとプロジェクトに記録する
+
+    途中経過はプロジェクトを読み直して本文だけを書き換える形で保存するので、
+    実行中に画面で編集した他の部分は上書きしない。
+    失敗・取り消しの場合も、受け取った分はプロジェクトに保存してから終える。
+    """
+    params = job.params
+    chunks = runner.ai_client.write_novel_stream(
+        setting=params["setting"],
+        plot=params["plot"],
+        characters=params["characters"],
+        length=params["length"],
+        style=params["style"],
+        tone=params["tone"],
+        model=params["model"],
+        force_fresh=params.get("force_fresh", False)
+    )
+
+    parts: List[str] = []
+    received = 0
+    recorded = 0
+    recorded_at = time.monotonic()
+    # 書き直す前の本文を履歴に残したか（最初の保存で1回だけ残す）
+    revised = False
+
+    def save(text: str, completed: bool) -> None:
+        nonlocal revised
+
+        def apply(project: NovelProject) -> None:
+            if not revised and project.novel_text and not project.novel_text.startswith("[生成プロンプト]"):
+                project.record_revision("novel_text", label="再執筆前")
+            project.novel_text = text
+            if completed:
+                project.record_revision("novel_text", label="AI執筆")
+
+        runner.update_project(job, apply, keep_if_cancelled=True)
+        revised = True
+
+    def finish(completed: bool) -> str:
+        """ストリームの接続を閉じ、受け取った分をプロジェクトに保存する"""
+        chunks.close()
+        text = "".join(parts)
+        if text:
+            save(text, completed)
+        return text
+
+    try:
+        for chunk in chunks:
+            parts.append(chunk)
+            received += len(chunk)
+            if received - recorded >= PROGRESS_CHARS or time.monotonic() - recorded_at >= PROGRESS_SECONDS:
+                # 結合した結果を次の記録に使い回す
+                text = "".join(parts)
+                parts[:] = [text]
+                runner.record_progress(job.id, text)
+                recorded, recorded_at = received, time.monotonic()
+                try:
+                    save(text, completed=False)
+                except Exception as e:
+                    # 途中経過の保存に失敗しても生成は続け、最後にまとめて保存し直す
+                    print(f"途中経過の保存エラー: {e}")
+    except BaseException:
+        # 失敗・取り消しの場合も受け取った分は残す。
+        # 後片付けの失敗で元の例外（ジョブに記録する失敗の理由）が置き換わらないようにする
+        try:
+            finish(completed=False)
+        except Exception as e:
+            print(f"途中経過の保存エラー: {e}")
+        raise
+
+    text = finish(completed=True)
+    return f"{len(text):,}文字"
+
+
+JOB_HANDLERS: Dict[str, Callable[[JobRunner, Job], str]] = {
+    "plot": _run_plot,
+    "characters": _run_characters,
+    "novel": _run_novel,
+}
@@ -0,0 +1,157 @@
+"""
+ストリーミングJSONの抽出
+AIの出力から、完成したJSONオブジェクトを閉じた時点で順に取り出す
+"""
+import json
+import re
+from dataclasses import MISSING, fields
+from typing import Optional
+
+
+# 最上位のオブジェクトが配列を包んでいるだけの形（{"characters": [ で始まる）
+_WRAPPER_PREFIX = re.compile(r'\{\s*"[^"\\]*"\s*:\s*$')
+
+
+class JSONObjectExtractor:
+    """テキストの断片を受け取り、完成した最上位のJSONオブジェクトを取り出す
+
+    コードフェンスや前後の説明文、配列の括弧は読み飛ばす。
+    出力が途中で途切れても、それまでに閉じたオブジェクトはすべて回収できる。
+
+    JSON モードの出力のように {"characters": [{...}, {...}]} と配列を包んでいる場合は、
+    配列の要素のオブジェクトを閉じた時点で1つずつ返す（包んでいるオブジェクト自体は返さない）。
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._start: Optional[int] = None  # 最上位のオブジェクトの開始位置
+        self._stack: list[str] = []  # 開いている括弧
+        self._wrapper = False  # 最上位のオブジェクトが配列を包んでいる形か
+        self._item_start: Optional[int] = None  # 包まれた配列の要素の開始位置
+        self._items_end: Optional[int] = None  # 最後に返した要素の終わり（返していなければ None）
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> list[dict]:
+        """断片を追加し、新たに閉じたオブジェクトを返す"""
+        self._buffer += chunk
+        return self._scan()
+
+    def finish(self) -> list[dict]:
+        """入力の終わりを通知し、残りから取り出せるオブジェクトを返す
+
+        閉じていない「{」が説明文中の記号だった場合に備え、
+        その次の文字から読み直す。包んでいるオブジェクトの途中で途切れた場合は、
+        最後に返した要素の後から読み直す。
+        """
+        objects = []
+        while self._start is not None:
+            restart = self._items_end if self._items_end is not None else self._start + 1
+            self._reset_object()
+            self._pos = restart
+            objects.extend(self._scan())
+        return objects
+
+    def _scan(self) -> list[dict]:
+        objects = []
+        buffer = self._buffer
+        while self._pos < len(buffer):
+            c = buffer[self._pos]
+
+            if self._start is None:
+                if c == '{':
+                    self._start = self._pos
+                    self._stack = ['{']
+                self._pos += 1
+                continue
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif c == '\\':
+                    self._escaped = True
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+            elif c in '{[':
+                if c == '[' and self._stack == ['{'] and self._items_end is None:
+                    self._wrapper = bool(_WRAPPER_PREFIX.match(buffer[self._start:self._pos]))
+                elif c == '{' and self._wrapper and self._stack == ['{', '[']:
+                    self._item_start = self._pos
+                self._stack.append(c)
+            elif c in '}]':
+                self._stack.pop()
+                if self._item_start is not None and self._stack == ['{', '[']:
+                    item = _loads_lenient(buffer[self._item_start:self._pos + 1])
+                    self._item_start = None
+                    if isinstance(item, dict):
+                        objects.append(item)
+                        self._items_end = self._pos + 1
+                elif not self._stack:
+                    start = self._start
+                    emitted_items = self._items_end is not None
+                    obj = None if emitted_items else _loads_lenient(buffer[start:self._pos + 1])
+                    self._reset_object()
+                    if isinstance(obj, dict):
+                        objects.append(obj)
+                    elif not emitted_items:
+                        # オブジェクトとして解釈できなければ「{」の次から読み直す
+                        self._pos = start
+            self._pos += 1
+
+        # 処理済みの部分を捨ててバッファを小さく保つ
+        keep_from = self._start if self._start is not None else self._pos
+        if keep_from > 0:
+            self._buffer = self._buffer[keep_from:]
+            self._pos -= keep_from
+            if self._start is not None:
+                self._start -= keep_from
+            if self._item_start is not None:
+                self._item_start -= keep_from
+            if self._items_end is not None:
+                self._items_end -= keep_from
+        return objects
+
+    def _reset_object(self) -> None:
+        self._start = None
+        self._stack = []
+        self._wrapper = False
+        self._item_start = None
+        self._items_end = None
+        self._in_string = False
+        self._escaped = False
+
+
+def _loads_lenient(text: str):
+    """JSONとして読み込む（末尾のカンマなど、よくある崩れは補正する）"""
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    try:
+        return json.loads(re.sub(r',\s*([}\]])', r'\1', text))
+    except ValueError:
+        return None
+
+
+def validate_fields(obj: dict, cls) -> Optional[dict]:
+    """dataclass のフィールドに合わせて値を検証・整形
+
+    必須フィールド（既定値のないもの）が欠けていれば None を返す。
+    未知のキーは捨て、値は文字列に揃える。
+    """
+    result = {}
+    for f in fields(cls):
+        value = obj.get(f.name)
+        if isinstance(value, (list, dict)):
+            value = json.dumps(value, ensure_ascii=False)
+        elif value is not None:
+            value = str(value).strip()
+
+        required = f.default is MISSING and f.default_factory is MISSING
+        if required and not value:
+            return None
+        result[f.name] = value if value else None
+    return result
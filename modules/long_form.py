@@ -0,0 +1,141 @@
+"""
+長編の章ごと執筆
+プロットを章に分け、あらすじを引き継ぎながら1章ずつ執筆する
+"""
+import re
+from typing import Callable, List, Optional
+
+from .ai_client import AIClient
+from .data_models import Chapter, NovelProject
+from .storage import BaseProjectStorage
+
+
+# 次の章に渡す直前の本文の文字数
+PREVIOUS_TAIL_CHARS = 800
+
+
+def split_plot_into_beats(plot: str, chapter_count: int) -> List[dict]:
+    """プロットの段落を章数に合わせて均等に割り振る（AIを使わない簡易版）"""
+    paragraphs = [p.strip() for p in re.split(r'\n\s*\n|\n(?=\s*\d+[\.．])', plot) if p.strip()]
+    if not paragraphs:
+        paragraphs = [plot.strip()]
+
+    beats = []
+    for i in range(chapter_count):
+        start = i * len(paragraphs) // chapter_count
+        end = max(start + 1, (i + 1) * len(paragraphs) // chapter_count)
+        beat = "\n".join(paragraphs[start:end]) if start < len(paragraphs) else paragraphs[-1]
+        beats.append({"title": f"第{i + 1}章", "beat": beat})
+    return beats
+
+
+def stitch_chapters(chapters: List[Chapter]) -> str:
+    """執筆済みの章を1つの本文にまとめる"""
+    return "\n\n".join(
+        f"## {chapter.title}\n\n{chapter.text.strip()}"
+        for chapter in chapters
+        if chapter.text
+    )
+
+
+class LongFormWriter:
+    """長編を章ごとに執筆し、章が終わるたびにプロジェクトを保存する"""
+
+    def __init__(self, ai_client: AIClient, storage: BaseProjectStorage):
+        self.ai_client = ai_client
+        self.storage = storage
+
+    def plan_chapters(
+        self,
+        project: NovelProject,
+        chapter_count: int,
+        force_fresh: bool = False
+    ) -> List[Chapter]:
+        """選択中のプロットから章立てを作成して保存"""
+        setting = project.settings[project.selected_setting_index].text
+        plot = project.plots[project.selected_plot_index].text
+
+        try:
+            beats = self.ai_client.generate_chapter_beats(
+                setting, plot, chapter_count, force_fresh=force_fresh
+            )
+        except Exception as e:
+            print(f"章立て生成エラー: {e}")
+            beats = []
+
+        if len(beats) < chapter_count:
+            beats = split_plot_into_beats(plot, chapter_count)
+
+        project.chapters = [
+            Chapter(title=beat["title"], beat=beat["beat"])
+            for beat in beats
+        ]
+        self.storage.save_project(project)
+        return project.chapters
+
+    def write(
+        self,
+        project: NovelProject,
+        on_chapter_start: Optional[Callable[[int, Chapter], None]] = None,
+        on_chapter_done: Optional[Callable[[int, Chapter], None]] = None,
+        force_fresh: bool = False
+    ) -> str:
+        """未執筆の章を順に執筆し、本文をまとめて返す
+
+        執筆済みの章は飛ばすため、途中で失敗しても再実行すれば続きから再開できる。
+        失敗した章の例外はそのまま送出する。
+        """
+        setting = project.settings[project.selected_setting_index].text
+        plot = project.plots[project.selected_plot_index].text
+        characters = [
+            {
+                "name": char.name,
+                "role": char.role,
+                "personality": char.personality,
+                "background": char.background
+            }
+            for char in project.characters
+        ]
+        config = project.writing_config
+        chapter_count = len(project.chapters)
+
+        summary = ""
+        previous_text = ""
+        for i, chapter in enumerate(project.chapters):
+            if not chapter.text:
+                if on_chapter_start:
+                    on_chapter_start(i, chapter)
+
+                chapter.text = self.ai_client.write_chapter(
+                    setting=setting,
+                    plot=plot,
+                    characters=characters,
+                    style=config.style,
+                    tone=config.tone,
+                    chapter_index=i,
+                    chapter_count=chapter_count,
+                    title=chapter.title,
+                    beat=chapter.beat,
+                    summary=summary,
+                    previous_tail=previous_text[-PREVIOUS_TAIL_CHARS:],
+                    model=config.ai_model,
+                    force_fresh=force_fresh
+                )
+                chapter.summary = ""
+                project.novel_text = stitch_chapters(project.chapters)
+                self.storage.save_project(project)
+
+            # あらすじは最終章以外で次の章に引き継ぐ
+            if not chapter.summary and i + 1 < chapter_count:
+                chapter.summary = self.ai_client.summarize_story(summary, chapter.text)
+                self.storage.save_project(project)
+
+            summary = chapter.summary
+            previous_text = chapter.text
+
+            if on_chapter_done:
+                on_chapter_done(i, chapter)
+
+        project.novel_text = stitch_chapters(project.chapters)
+        self.storage.save_project(project)
+        return project.novel_text
@@ -0,0 +1,431 @@
+"""
+API呼び出しの計測
+AIClient のメソッド・モデルごとに、応答時間・最初の断片までの時間・トークン数・失敗数を集計する
+
+集計はプロセス内に保持し、1回ごとの記録を JSONL に追記できる（AI_METRICS_LOG）。
+Prometheus のテキスト形式にも書き出せる。
+"""
+import contextvars
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+# 応答時間のヒストグラムの区切り（秒）
+LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+
+# 計測中のメソッド名と呼び出し
+_current_method: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("ai_method", default=None)
+_active_call: contextvars.ContextVar[Optional['CallRecord']] = contextvars.ContextVar("ai_call", default=None)
+
+
+class Histogram:
+    """区切りごとの件数を数えるヒストグラム（Prometheus の histogram と同じ形）"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最後は上限なし
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """値を1つ記録"""
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """分位数の推定値（区切りの中で線形に補間する）"""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        lower = 0.0
+        for i, bound in enumerate(self.buckets):
+            if cumulative + self.counts[i] >= rank:
+                within = (rank - cumulative) / self.counts[i] if self.counts[i] else 0
+                return lower + (bound - lower) * within
+            cumulative += self.counts[i]
+            lower = bound
+        # 上限なしの区切りに入る場合は最後の区切りの値を返す
+        return self.buckets[-1]
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+
+@dataclass
+class CallStats:
+    """メソッドとモデルの組ごとの集計"""
+    calls: int = 0
+    cache_hits: int = 0
+    errors: Dict[str, int] = field(default_factory=dict)
+    latency: Histogram = field(default_factory=Histogram)
+    ttft: Histogram = field(default_factory=Histogram)
+    input_tokens: int = 0
+    output_tokens: int = 0
+    # プロバイダー側のプロンプトキャッシュから読んだ・書き込んだ入力トークン数（input_tokens には含まない）
+    cache_read_tokens: int = 0
+    cache_write_tokens: int = 0
+    output_chars: int = 0
+    # トークン数が分かった呼び出しの応答時間の合計（1秒あたりのトークン数の計算に使う）
+    usage_seconds: float = 0.0
+
+    @property
+    def failures(self) -> int:
+        return sum(self.errors.values())
+
+    @property
+    def failure_rate(self) -> float:
+        total = self.calls + self.failures
+        return self.failures / total if total else 0.0
+
+    @property
+    def output_tokens_per_second(self) -> Optional[float]:
+        return self.output_tokens / self.usage_seconds if self.usage_seconds else None
+
+    @property
+    def chars_per_second(self) -> Optional[float]:
+        return self.output_chars / self.latency.sum if self.latency.sum else None
+
+    @property
+    def prompt_cache_rate(self) -> Optional[float]:
+        """入力トークンのうちプロンプトキャッシュから読んだ割合"""
+        if not (self.cache_read_tokens or self.cache_write_tokens):
+            return None
+        return self.cache_read_tokens / (self.input_tokens + self.cache_read_tokens + self.cache_write_tokens)
+
+
+@dataclass
+class CallRecord:
+    """1回の呼び出しの計測"""
+    method: str
+    model: str
+    started: float = field(default_factory=time.perf_counter)
+    first_chunk: Optional[float] = None
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    cache_read_tokens: Optional[int] = None
+    cache_write_tokens: Optional[int] = None
+    output_chars: int = 0
+
+    def add_chunk(self, chunk: str) -> None:
+        if self.first_chunk is None:
+            self.first_chunk = time.perf_counter()
+        self.output_chars += len(chunk)
+
+
+def instrumented(func: Callable) -> Callable:
+    """AIClient のメソッドの呼び出しを、そのメソッド名で計測するデコレーター
+
+    ほかの計測対象のメソッドから呼ばれた場合は、外側のメソッド名で計測する。
+    ストリーム（イテレーター）を返すメソッドは、読み進めるたびにメソッド名を設定する。
+    """
+    method = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _current_method.get() is not None:
+            return func(*args, **kwargs)
+        token = _current_method.set(method)
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            _current_method.reset(token)
+        if isinstance(result, Iterator):
+            return _iterate_as(method, result)
+        return result
+
+    return wrapper
+
+
+def _iterate_as(method: str, iterator: Iterator) -> Iterator:
+    try:
+        while True:
+            token = _current_method.set(method)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                _current_method.reset(token)
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close:
+            close()
+
+
+def record_usage(
+    input_tokens: Optional[int],
+    output_tokens: Optional[int],
+    cache_read_tokens: Optional[int] = None,
+    cache_write_tokens: Optional[int] = None
+) -> None:
+    """実行中の呼び出しに、API が返したトークン数を記録
+
+    cache_read_tokens / cache_write_tokens はプロンプトキャッシュから読んだ・書き込んだ入力トークン数。
+    """
+    record = _active_call.get()
+    if record is None:
+        return
+    if input_tokens is not None:
+        record.input_tokens = (record.input_tokens or 0) + input_tokens
+    if output_tokens is not None:
+        record.output_tokens = (record.output_tokens or 0) + output_tokens
+    if cache_read_tokens is not None:
+        record.cache_read_tokens = (record.cache_read_tokens or 0) + cache_read_tokens
+    if cache_write_tokens is not None:
+        record.cache_write_tokens = (record.cache_write_tokens or 0) + cache_write_tokens
+
+
+class MetricsRegistry:
+    """呼び出しの計測結果を集計する（スレッドセーフ）"""
+
+    def __init__(self, log_path: Optional[str] = None):
+        self.log_path = Path(log_path) if log_path else None
+        self.started_at = datetime.now().isoformat()
+        self._stats: Dict[Tuple[str, str], CallStats] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'MetricsRegistry':
+        """環境変数の設定から作成（AI_METRICS_LOG が空なら JSONL に書き出さない）"""
+        return cls(log_path=os.getenv("AI_METRICS_LOG") or None)
+
+    @classmethod
+    def from_log(cls, log_path: str) -> 'MetricsRegistry':
+        """JSONL の記録を読み込んで集計し直す（書き出しはしない）"""
+        registry = cls()
+        path = Path(log_path)
+        if not path.exists():
+            return registry
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                registry._apply(event)
+        return registry
+
+    @contextmanager
+    def call(self, model: str):
+        """1回の呼び出しを計測するコンテキストマネージャー（CallRecord を返す）"""
+        record = CallRecord(method=_current_method.get() or "other", model=model)
+        token = _active_call.set(record)
+        try:
+            yield record
+        except Exception as e:
+            self._finish(record, e)
+            raise
+        else:
+            self._finish(record)
+        finally:
+            _active_call.reset(token)
+
+    def stream(self, model: str, chunks: Iterator[str]) -> Iterator[str]:
+        """ストリームの呼び出しを計測（最初の断片までの時間も記録する）
+
+        途中で読むのをやめた場合は、それまでの分を成功として記録する。
+        """
+        record = CallRecord(method=_current_method.get() or "other", model=model)
+        chunks = iter(chunks)
+        try:
+            while True:
+                token = _active_call.set(record)
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    break
+                finally:
+                    _active_call.reset(token)
+                record.add_chunk(chunk)
+                yield chunk
+        except GeneratorExit:
+            self._finish(record)
+            close = getattr(chunks, "close", None)
+            if close:
+                close()
+            raise
+        except Exception as e:
+            self._finish(record, e)
+            raise
+        else:
+            self._finish(record)
+
+    def record_cache_hit(self, model: str) -> None:
+        """キャッシュから返した呼び出しを記録（応答時間には含めない）"""
+        self._apply({
+            "method": _current_method.get() or "other",
+            "model": model,
+            "cached": True
+        }, log=True)
+
+    def snapshot(self) -> Dict[Tuple[str, str], CallStats]:
+        """(メソッド, モデル) ごとの集計の一覧"""
+        with self._lock:
+            return dict(self._stats)
+
+    def by_model(self) -> Dict[str, CallStats]:
+        """モデルごとに合計した集計"""
+        merged: Dict[str, CallStats] = {}
+        with self._lock:
+            for (_, model), stats in self._stats.items():
+                total = merged.setdefault(model, CallStats())
+                total.calls += stats.calls
+                total.cache_hits += stats.cache_hits
+                for kind, count in stats.errors.items():
+                    total.errors[kind] = total.errors.get(kind, 0) + count
+                for target, source in ((total.latency, stats.latency), (total.ttft, stats.ttft)):
+                    target.counts = [a + b for a, b in zip(target.counts, source.counts)]
+                    target.sum += source.sum
+                    target.count += source.count
+                total.input_tokens += stats.input_tokens
+                total.output_tokens += stats.output_tokens
+                total.cache_read_tokens += stats.cache_read_tokens
+                total.cache_write_tokens += stats.cache_write_tokens
+                total.output_chars += stats.output_chars
+                total.usage_seconds += stats.usage_seconds
+        return merged
+
+    def reset(self) -> None:
+        """集計を消去（JSONL の記録は残す）"""
+        with self._lock:
+            self._stats.clear()
+            self.started_at = datetime.now().isoformat()
+
+    def to_prometheus(self) -> str:
+        """Prometheus のテキスト形式に変換"""
+        lines: List[str] = []
+
+        def header(name: str, kind: str, help_text: str) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        stats = sorted(self.snapshot().items())
+
+        header("ai_client_calls_total", "counter", "Completed API calls")
+        for (method, model), s in stats:
+            lines.append(f'ai_client_calls_total{_labels(method, model)} {s.calls}')
+
+        header("ai_client_cache_hits_total", "counter", "Calls answered from the response cache")
+        for (method, model), s in stats:
+            lines.append(f'ai_client_cache_hits_total{_labels(method, model)} {s.cache_hits}')
+
+        header("ai_client_errors_total", "counter", "Failed API calls by error kind")
+        for (method, model), s in stats:
+            for kind, count in sorted(s.errors.items()):
+                lines.append(f'ai_client_errors_total{_labels(method, model, kind=kind)} {count}')
+
+        header("ai_client_tokens_total", "counter", "Tokens reported by the API")
+        for (method, model), s in stats:
+            lines.append(f'ai_client_tokens_total{_labels(method, model, direction="input")} {s.input_tokens}')
+            lines.append(f'ai_client_tokens_total{_labels(method, model, direction="output")} {s.output_tokens}')
+            if s.cache_read_tokens or s.cache_write_tokens:
+                lines.append(f'ai_client_tokens_total{_labels(method, model, direction="cache_read")} {s.cache_read_tokens}')
+                lines.append(f'ai_client_tokens_total{_labels(method, model, direction="cache_write")} {s.cache_write_tokens}')
+
+        for name, attr, help_text in (
+            ("ai_client_latency_seconds", "latency", "API call latency"),
+            ("ai_client_time_to_first_token_seconds", "ttft", "Time until the first streamed chunk"),
+        ):
+            header(name, "histogram", help_text)
+            for (method, model), s in stats:
+                histogram = getattr(s, attr)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(method, model, le=f"{bound:g}")} {cumulative}')
+                lines.append(f'{name}_bucket{_labels(method, model, le="+Inf")} {histogram.count}')
+                lines.append(f'{name}_sum{_labels(method, model)} {histogram.sum:.6f}')
+                lines.append(f'{name}_count{_labels(method, model)} {histogram.count}')
+
+        return "\n".join(lines) + "\n"
+
+    def export_prometheus(self, path: str) -> Path:
+        """Prometheus のテキスト形式でファイルに書き出す（node_exporter の textfile などで読める）"""
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=target.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(self.to_prometheus())
+            os.replace(tmp_path, target)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+        return target
+
+    def _finish(self, record: CallRecord, error: Optional[Exception] = None) -> None:
+        now = time.perf_counter()
+        event = {
+            "method": record.method,
+            "model": record.model,
+            "latency": round(now - record.started, 4),
+            "ttft": round(record.first_chunk - record.started, 4) if record.first_chunk else None,
+            "input_tokens": record.input_tokens,
+            "output_tokens": record.output_tokens,
+            "output_chars": record.output_chars,
+        }
+        if record.cache_read_tokens is not None or record.cache_write_tokens is not None:
+            event["cache_read_tokens"] = record.cache_read_tokens or 0
+            event["cache_write_tokens"] = record.cache_write_tokens or 0
+        if error is not None:
+            event["error"] = getattr(error, "kind", type(error).__name__)
+        self._apply(event, log=True)
+
+    def _apply(self, event: Dict, log: bool = False) -> None:
+        """1回分の記録を集計に加える（log なら JSONL にも追記する）"""
+        with self._lock:
+            stats = self._stats.setdefault((event["method"], event["model"]), CallStats())
+            if event.get("cached"):
+                stats.cache_hits += 1
+            elif event.get("error"):
+                stats.errors[event["error"]] = stats.errors.get(event["error"], 0) + 1
+            else:
+                stats.calls += 1
+                stats.latency.observe(event["latency"])
+                if event.get("ttft") is not None:
+                    stats.ttft.observe(event["ttft"])
+                stats.output_chars += event.get("output_chars") or 0
+                if event.get("output_tokens") is not None:
+                    stats.input_tokens += event.get("input_tokens") or 0
+                    stats.output_tokens += event["output_tokens"]
+                    stats.cache_read_tokens += event.get("cache_read_tokens") or 0
+                    stats.cache_write_tokens += event.get("cache_write_tokens") or 0
+                    stats.usage_seconds += event["latency"]
+
+            if log and self.log_path:
+                try:
+                    self.log_path.parent.mkdir(parents=True, exist_ok=True)
+                    with open(self.log_path, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(
+                            {"time": datetime.now().isoformat(), **event}, ensure_ascii=False
+                        ) + "\n")
+                except OSError as e:
+                    print(f"計測ログ書き込みエラー: {e}")
+
+
+def _labels(method: str, model: str, **extra: str) -> str:
+    labels = {"method": method, "model": model, **extra}
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,427 @@
+"""
+プロンプトのテンプレート
+AIClient が送るプロンプトをテンプレートとして一か所にまとめ、読み込み時に検証する
+
+各テンプレートは前半（prefix）と後半（suffix）に分かれている。
+前半は同じ種類の呼び出しで繰り返し使われる部分（決まった指示文や、章をまたいで共通の設定・プロット・登場人物）、
+後半は呼び出しごとに変わる部分で、応答のキャッシュやプロバイダー側のプロンプトキャッシュは前半の一致を利用できる。
+"""
+import string
+import threading
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional
+
+# 分量の目安
+LENGTH_GUIDE = {
+    "短編": "2000-3000文字程度",
+    "中編": "5000-8000文字程度",
+    "長編": "10000文字以上"
+}
+
+# チャットAI用プロンプトの冒頭に付けるプラットフォーム別の推奨事項
+PLATFORM_NOTES = {
+    "claude": "# Claude用プロンプト\n\n長文生成に優れています。必要に応じて「続きを書いて」と指示してください。",
+    "chatgpt": "# ChatGPT用プロンプト\n\n長文の場合は複数回に分けて生成を依頼してください。",
+    "gemini": "# Gemini用プロンプト\n\n長文生成が可能です。プロンプトをそのまま貼り付けて使用してください。"
+}
+
+
+class RenderedPrompt(str):
+    """組み立てたプロンプト（そのまま str として送信・キャッシュキーに使える）
+
+    prefix / suffix でテンプレートの前半と後半を取り出せる。
+    """
+
+    def __new__(cls, prefix: str, suffix: str = "", template: str = ""):
+        prompt = super().__new__(cls, prefix + suffix)
+        prompt.prefix_chars = len(prefix)
+        prompt.template = template
+        return prompt
+
+    @property
+    def prefix(self) -> str:
+        return self[:self.prefix_chars]
+
+    @property
+    def suffix(self) -> str:
+        return self[self.prefix_chars:]
+
+
+@dataclass
+class PromptStats:
+    """テンプレートごとのプロンプトの大きさ（文字数）"""
+    renders: int = 0
+    prefix_chars: int = 0
+    suffix_chars: int = 0
+
+    @property
+    def mean_chars(self) -> float:
+        return (self.prefix_chars + self.suffix_chars) / self.renders if self.renders else 0.0
+
+    @property
+    def prefix_share(self) -> float:
+        """全体のうち前半が占める割合"""
+        total = self.prefix_chars + self.suffix_chars
+        return self.prefix_chars / total if total else 0.0
+
+
+class PromptTemplate:
+    """検証済みのテンプレート
+
+    プレースホルダーは {名前} の形だけを受け付ける（書式指定や属性の参照はできない）。
+    """
+
+    def __init__(self, name: str, prefix: str, suffix: str = ""):
+        self.name = name
+        self.prefix = prefix
+        self.suffix = suffix
+        prefix_fields = _placeholders(name, prefix)
+        self.fields: FrozenSet[str] = frozenset(prefix_fields | _placeholders(name, suffix))
+        # 波括弧を含まない部分は format_map を通さずにそのまま使う
+        self._prefix_static = "{" not in prefix and "}" not in prefix
+        self._suffix_static = "{" not in suffix and "}" not in suffix
+
+    def render(self, **values) -> RenderedPrompt:
+        try:
+            prefix = self.prefix if self._prefix_static else self.prefix.format_map(values)
+            suffix = self.suffix if self._suffix_static else self.suffix.format_map(values)
+        except KeyError:
+            missing = ", ".join(sorted(self.fields - values.keys()))
+            raise ValueError(f"プロンプト {self.name} の値が足りません: {missing}") from None
+        return RenderedPrompt(prefix, suffix, self.name)
+
+
+class PromptRegistry:
+    """名前でテンプレートを登録・取り出し、組み立てたプロンプトの大きさを集計する"""
+
+    def __init__(self):
+        self._templates: Dict[str, PromptTemplate] = {}
+        self._stats: Dict[str, PromptStats] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, prefix: str, suffix: str = "") -> PromptTemplate:
+        """テンプレートを検証して登録（名前の重複やプレースホルダーの誤りは ValueError）"""
+        if name in self._templates:
+            raise ValueError(f"プロンプト {name} はすでに登録されています")
+        template = PromptTemplate(name, prefix, suffix)
+        self._templates[name] = template
+        return template
+
+    def get(self, name: str) -> PromptTemplate:
+        return self._templates[name]
+
+    def names(self) -> List[str]:
+        return sorted(self._templates)
+
+    def render(self, name: str, **values) -> RenderedPrompt:
+        """テンプレートに値を埋め込む"""
+        prompt = self._templates[name].render(**values)
+        with self._lock:
+            stats = self._stats.setdefault(name, PromptStats())
+            stats.renders += 1
+            stats.prefix_chars += prompt.prefix_chars
+            stats.suffix_chars += len(prompt) - prompt.prefix_chars
+        return prompt
+
+    def stats(self) -> Dict[str, PromptStats]:
+        """テンプレートごとの大きさの集計（起動後）"""
+        with self._lock:
+            return {name: PromptStats(s.renders, s.prefix_chars, s.suffix_chars) for name, s in self._stats.items()}
+
+
+def format_characters(characters: List[dict], detailed: bool = False) -> str:
+    """登場人物の一覧（detailed なら役割と背景も含める）"""
+    if detailed:
+        return "\n".join(
+            f"- **{c.get('name', '名前なし')}** ({c.get('role', '役割不明')})\n"
+            f"  - 性格: {c.get('personality', '')}\n"
+            f"  - 背景: {c.get('background', '不明')}"
+            for c in characters
+        )
+    return "\n".join(
+        f"- {c.get('name', '名前なし')}: {c.get('personality', '')}"
+        for c in characters
+    )
+
+
+def bullet_list(items: List[str], limit: Optional[int] = None) -> str:
+    """「- 項目」の行の一覧（limit なら末尾の limit 件だけ）"""
+    if limit is not None:
+        items = items[-limit:]
+    return "\n".join(f"- {item}" for item in items)
+
+
+def _placeholders(name: str, text: str) -> set:
+    """テンプレートのプレースホルダーの名前を取り出して検証する"""
+    fields = set()
+    for _, field_name, format_spec, conversion in string.Formatter().parse(text):
+        if field_name is None:
+            continue
+        if not field_name.isidentifier() or format_spec or conversion:
+            raise ValueError(f"プロンプト {name} のプレースホルダーが不正です: {{{field_name}}}")
+        fields.add(field_name)
+    return fields
+
+
+PROMPTS = PromptRegistry()
+
+PROMPTS.register(
+    "idea_fragments",
+    """
+小説のアイデアとなる魅力的なフレーズや断片を{count}個生成してください。
+以下のカテゴリーからバランスよく選んでください：
+
+- 設定（舞台、世界観）
+- キャラクター要素（人物の特徴、職業、性格）
+- 出来事（事件、遭遇、発見）
+- テーマ（愛、冒険、成長、裏切り、など）
+- 物（アイテム、遺物、武器、書物）
+- 雰囲気（ミステリアス、ノスタルジック、緊張感）
+
+各フレーズは1-2行程度で、創造力を刺激する具体的で印象的なものにしてください。
+番号付きリストで出力してください。
+""",
+    "{excluded}"
+)
+
+PROMPTS.register(
+    "idea_fragments_excluded",
+    """
+以下はすでに提示済みです。これらと似たものは避け、新しい切り口のものを出してください：
+{fragments}
+"""
+)
+
+PROMPTS.register(
+    "expand_ideas",
+    """
+以下のアイデアの断片を組み合わせて、小説の核となる魅力的なコンセプトを3-4段落で説明してください：
+
+""",
+    """{fragments}
+
+これらの要素を自然に組み合わせ、独創的で面白い物語の方向性を提示してください。
+"""
+)
+
+PROMPTS.register(
+    "setting",
+    """
+以下のアイデアに基づいて、小説の基本設定を2-3文で簡潔に書いてください：
+
+""",
+    """{idea}
+
+設定には以下を含めてください：
+- 主人公の基本情報
+- 物語の始まりとなる状況や出来事
+- 舞台となる世界や時代（必要に応じて）
+"""
+)
+
+PROMPTS.register(
+    "plot",
+    """
+以下の設定に基づいて、小説のプロットを作成してください：
+
+""",
+    """{setting}
+
+プロットには以下の要素を含めてください：
+1. 発端（物語の始まり）
+2. 展開（事件や困難の発生）
+3. クライマックス（最大の山場）
+4. 結末（物語の締めくくり）
+
+各要素を2-3文で説明してください。
+"""
+)
+
+PROMPTS.register(
+    "characters",
+    """
+以下の設定とプロットに基づいて、主要な登場人物を{count}人作成してください：
+
+【設定】
+{setting}
+
+【プロット】
+{plot}
+
+""",
+    """各キャラクターについて以下の情報をJSON形式で出力してください：
+- name: 名前
+- role: 役割（主人公、ライバル、メンター、など）
+- personality: 性格（2-3文）
+- background: 背景（簡単な経歴や動機）
+
+JSON配列形式で出力してください。
+{existing}"""
+)
+
+PROMPTS.register(
+    "characters_existing",
+    """
+次の人物はすでに作成済みです。これら以外の人物を{count}人だけ出力してください：
+{names}
+"""
+)
+
+PROMPTS.register(
+    "chat_novel",
+    """{platform_note}
+
+あなたはプロの小説家です。以下の設定に基づいて、魅力的な小説を執筆してください。
+
+## 📖 基本設定
+
+{setting}
+
+## 📋 プロット（物語の流れ）
+
+{plot}
+
+## 👥 登場人物
+
+{characters}
+
+""",
+    """## ✍️ 執筆指示（必ず守ってください）
+
+### 分量
+{length}（目安: {length_guide}）
+
+### 文体
+{style}で書いてください。
+
+### 雰囲気・読後感
+{tone}雰囲気の作品にしてください。
+
+## 📝 執筆のポイント
+
+1. **心理描写**: 登場人物の内面を丁寧に描写してください
+2. **情景描写**: 五感を使った描写で読者を物語の世界に引き込んでください
+3. **プロット遵守**: 上記のプロットに沿いつつも、自然な展開を心がけてください
+4. **文体の統一**: 指定された文体「{style}」を最後まで維持してください
+5. **雰囲気の維持**: 「{tone}」という読後感を意識して執筆してください
+6. **完成度**: 途中で終わらせず、起承転結のある完結した作品にしてください
+
+---
+
+それでは、上記の設定に基づいて小説を執筆してください。
+"""
+)
+
+# 本文・章・続きの執筆で共通の前半（Claude ではプロンプトキャッシュの対象になる）
+PROMPTS.register(
+    "story",
+    """
+あなたはプロの小説家です。以下の設定・プロット・登場人物に基づいて小説を執筆します。
+
+【設定】
+{setting}
+
+【プロット】
+{plot}
+
+【登場人物】
+{characters}
+
+"""
+)
+
+PROMPTS.register(
+    "novel",
+    "{story}",
+    """上記の要素に基づいて、小説を執筆してください。
+
+【執筆指示】
+- 長さ: {length}（{length_guide}）
+- 文体: {style}
+- 雰囲気・読後感: {tone}
+
+物語を魅力的に描写し、読者を引き込む小説を書いてください。
+"""
+)
+
+PROMPTS.register(
+    "chapter_beats",
+    """
+以下の設定とプロットに基づいて、長編小説の章立てを{chapter_count}章で作成してください：
+
+【設定】
+{setting}
+
+【プロット】
+{plot}
+
+""",
+    """各章について「番号. 章題｜その章で起きること（2-3文）」の形式で1行ずつ出力してください。
+例: 1. 出会い｜主人公が謎の老人と出会い、古い鍵を託される。
+物語の発端から結末までを{chapter_count}章に過不足なく割り振ってください。
+"""
+)
+
+PROMPTS.register(
+    "chapter",
+    "{story}",
+    """上記の要素に基づいて、長編小説（全{chapter_count}章）の第{chapter_number}章を執筆してください。
+
+【これまでのあらすじ】
+{summary}
+
+【直前の本文（末尾）】
+{previous_tail}
+
+【この章の内容】
+第{chapter_number}章「{title}」: {beat}
+
+【執筆指示】
+- 長さ: この章だけで{length_guide}
+- 文体: {style}
+- 雰囲気・読後感: {tone}
+- 章題や見出しは書かず、本文のみを出力してください
+- 直前の本文から矛盾なく続けてください
+
+{ending}
+"""
+)
+
+PROMPTS.register(
+    "continuation",
+    "{story}",
+    """上記の要素に基づいて執筆中の小説の続きを書いてください。
+
+【これまでのあらすじ】
+{summary}
+
+【直前の本文（末尾）】
+{previous_tail}
+
+【続きの方向性】
+{direction}
+
+【執筆指示】
+- 長さ: 続きとして{length_guide}
+- 文体: {style}
+- 雰囲気・読後感: {tone}
+- 直前の本文から矛盾なく、新しい段落から書き始めてください
+- 前置きや見出し、これまでの内容の繰り返しは書かず、続きの本文のみを出力してください
+"""
+)
+
+PROMPTS.register(
+    "summary",
+    """
+以下の「これまでのあらすじ」と「新しく書かれた本文」をまとめて、
+物語全体のあらすじを{max_chars}文字以内で書いてください。
+登場人物の現在の状況、未解決の伏線、直近の出来事を優先して残してください。
+
+""",
+    """【これまでのあらすじ】
+{previous_summary}
+
+【新しく書かれた本文】
+{new_text}
+"""
+)
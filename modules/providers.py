@@ -0,0 +1,627 @@
+"""
+AI プロバイダー
+AIClient から API の呼び出し部分を切り離し、Gemini・Claude・ローカルの OpenAI 互換サーバー・
+オフライン用の偽プロバイダーを差し替えられるようにする
+
+AIClient はプロンプトの組み立て・キャッシュ・再試行・計測を受け持ち、
+プロバイダーは「モデル名とプロンプトを受け取ってテキストを返す」ことだけを受け持つ。
+各プロバイダーは対応する機能（ストリーミング・出力の上限・JSON モード）を capabilities で示す。
+"""
+import json
+import os
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+from .metrics import record_usage
+from .tokens import estimate_tokens
+
+
+@dataclass(frozen=True)
+class Capabilities:
+    """プロバイダーが対応する機能"""
+    streaming: bool = True
+    max_output_tokens: int = 8192
+    context_window: int = 32_000  # トークン数の上限表（tokens.MODEL_SPECS）にないモデルで使う
+    json_mode: bool = False  # 出力を JSON に制約できるか
+
+
+class Provider(ABC):
+    """プロバイダーの基底クラス
+
+    name は再試行・レート制限・エラー表示に使うプロバイダー名。
+    requirement は available() が False のときに設定を促す環境変数名。
+    SDK の例外はそのまま送出してよい（RequestExecutor が AIClientError に変換する）。
+    """
+
+    name = ""
+    requirement = ""
+    default_model = ""  # モデル名を指定しない呼び出しで使うモデル
+    capabilities = Capabilities()
+
+    @abstractmethod
+    def available(self) -> bool:
+        """呼び出せる状態か（API キーなどが設定されているか）"""
+
+    @abstractmethod
+    def generate(
+        self,
+        model: str,
+        prompt: str,
+        max_tokens: Optional[int] = None,
+        json_mode: bool = False
+    ) -> str:
+        """生成したテキスト全体を返す"""
+
+    @abstractmethod
+    def stream(
+        self,
+        model: str,
+        prompt: str,
+        max_tokens: Optional[int] = None,
+        json_mode: bool = False
+    ) -> Iterator[str]:
+        """生成したテキストを断片ごとに返す"""
+
+
+class GeminiProvider(Provider):
+    """Gemini API（SDK は初回の呼び出し時に読み込む）"""
+
+    name = "gemini"
+    requirement = "GOOGLE_API_KEY"
+    capabilities = Capabilities(streaming=True, max_output_tokens=8192, context_window=1_048_576, json_mode=True)
+
+    def __init__(self, api_key: Optional[str]):
+        self.api_key = api_key
+        self._models: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        return bool(self.api_key)
+
+    def model(self, model_name: str):
+        """Gemini のモデル（初回アクセス時に初期化）"""
+        model = self._models.get(model_name)
+        if model is None:
+            with self._lock:
+                model = self._models.get(model_name)
+                if model is None:
+                    import google.generativeai as genai
+
+                    genai.configure(api_key=self.api_key)
+                    model = self._models[model_name] = genai.GenerativeModel(model_name)
+        return model
+
+    def generate(
+        self,
+        model: str,
+        prompt: str,
+        max_tokens: Optional[int] = None,
+        json_mode: bool = False
+    ) -> str:
+        response = self.model(model).generate_content(
+            prompt, generation_config=_gemini_config(max_tokens, json_mode)
+        )
+        _record_gemini_usage(response)
+        return response.text
+
+    def stream(
+        self,
+        model: str,
+        prompt: str,
+        max_tokens: Optional[int] = None,
+        json_mode: bool = False
+    ) -> Iterator[str]:
+        last = None
+        response = self.model(model).generate_content(
+            prompt, stream=True, generation_config=_gemini_config(max_tokens, json_mode)
+        )
+        for chunk in response:
+            last = chunk
+            if chunk.text:
+                yield chunk.text
+        # トークン数は最後に受け取った断片に入っている
+        if last is not None:
+            _record_gemini_usage(last)
+
+
+class AnthropicProvider(Provider):
+    """Anthropic API（SDK は初回の呼び出し時に読み込む）"""
+
+    name = "anthropic"
+    requirement = "ANTHROPIC_API_KEY"
+    capabilities = Capabilities(streaming=True, max_output_tokens=64_000, context_window=200_000)
+    default_max_tokens = 8192
+
+    # プロンプトキャッシュの対象になる最小のトークン数（これより短いブロックはキャッシュされない）
+    cache_min_tokens = 1024
+    cache_min_tokens_by_model = {"claude-3-5-haiku": 2048, "claude-3-haiku": 2048}
+
+    def __init__(self, api_key: Optional[str], prompt_cache: bool = True):
+        self.api_key = api_key
+        self.prompt_cache = prompt_cache
+        self._client = None
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        return bool(self.api_key)
+
+    @property
+    def client(self):
+        """Anthropic クライアント（初回アクセス時に初期化）
+
+        HTTP の接続プールはクライアントが保持するため、
+        共有された AIClient を通じてセッション間で再利用される。
+        """
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from anthropic import Anthropic
+
+                    # 再試行は RequestExecutor で行うため SDK 側の再試行は無効にする
+                    self._client = Anthropic(api_key=self.api_key, max_retries=0)
+        return self._client
+
+    def generate(
+        self,
+        model: str,
+        prompt: str,
+        max_tokens: Optional[int] = None,
+        json_mode: bool = False
+    ) -> str:
+        response = self.client.messages.create(**self._message_params(model, prompt, max_tokens))
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            _record_anthropic_usage(usage)
+        return response.content[0].text
+
+    def stream(
+        self,
+        model: str,
+        prompt: str,
+        max_tokens: Optional[int] = None,
+        json_mode: bool = False
+    ) -> Iterator[str]:
+        with self.client.messages.stream(**self._message_params(model, prompt, max_tokens)) as stream:
+            yield from stream.text_stream
+            _record_anthropic_usage(stream.get_final_message().usage)
+
+    def _message_params(self, model: str, prompt: str, max_tokens: Optional[int]) -> Dict:
+        """messages.create / messages.stream の引数
+
+        テンプレートから組み立てたプロンプト（prompts.RenderedPrompt）の前半が十分に長ければ、
+        前半を system ブロックに分けてプロンプトキャッシュの対象にする。
+        本文・章・続きの執筆は前半（設定・プロット・登場人物）が共通のため、2回目以降はキャッシュから読まれる。
+        """
+        params = {"model": model, "max_tokens": max_tokens or self.default_max_tokens}
+        prefix = getattr(prompt, "prefix", "")
+        if self.prompt_cache and prefix and estimate_tokens(prefix, self.name) >= self._cache_min_tokens(model):
+            params["system"] = [{"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}}]
+            prompt = prompt.suffix
+        params["messages"] = [{"role": "user", "content": str(prompt)}]
+        return params
+
+    def _cache_min_tokens(self, model: str) -> int:
+        for prefix, tokens in self.cache_min_tokens_by_model.items():
+            if model.startswith(prefix):
+                return tokens
+        return self.cache_min_tokens
+
+
+class ProviderHTTPError(Exception):
+    """OpenAI 互換サーバーのエラー応答（classify_error は status_code と retry_after を読む）"""
+
+    def __init__(self, status_code: int, message: str, retry_after: Optional[str] = None):
+        self.status_code = status_code
+        self.retry_after = retry_after
+        super().__init__(f"HTTP {status_code}: {message}")
+
+
+class OpenAICompatibleProvider(Provider):
+    """OpenAI 互換の Chat Completions API（llama.cpp server・vLLM・Ollama など）
+
+    標準ライブラリの urllib だけで呼び出すため、追加のパッケージは不要。
+    base_url は「/chat/completions」の手前まで（例: http://localhost:8080/v1）。
+    """
+
+    name = "local"
+    requirement = "AI_LOCAL_BASE_URL"
+
+    def __init__(
+        self,
+        base_url: Optional[str],
+        model: str = "",
+        api_key: Optional[str] = None,
+        context_window: int = 8192,
+        max_output_tokens: int = 4096,
+        json_mode: bool = True,
+        timeout: float = 300.0
+    ):
+        self.base_url = (base_url or "").rstrip("/")
+        self.default_model = model or "local-model"
+        self.api_key = api_key
+        self.timeout = timeout
+        self.capabilities = Capabilities(
+            streaming=True,
+            max_output_tokens=max_output_tokens,
+            context_window=context_window,
+            json_mode=json_mode
+        )
+
+    @classmethod
+    def from_env(cls) -> 'OpenAICompatibleProvider':
+        """環境変数の設定から作成"""
+        return cls(
+            base_url=os.getenv("AI_LOCAL_BASE_URL"),
+            model=os.getenv("AI_LOCAL_MODEL", ""),
+            api_key=os.getenv("AI_LOCAL_API_KEY") or None,
+            context_window=int(os.getenv("AI_LOCAL_CONTEXT_WINDOW", "8192")),
+            max_output_tokens=int(os.getenv("AI_LOCAL_MAX_OUTPUT_TOKENS", "4096")),
+            json_mode=os.getenv("AI_LOCAL_JSON_MODE", "true").lower() in ("1", "true", "yes", "on"),
+            timeout=float(os.getenv("AI_LOCAL_TIMEOUT", "300"))
+        )
+
+    def available(self) -> bool:
+        return bool(self.base_url)
+
+    def generate(
+        self,
+        model: str,
+        prompt: str,
+        max_tokens: Optional[int] = None,
+        json_mode: bool = False
+    ) -> str:
+        with self._post(self._payload(model, prompt, max_tokens, json_mode, stream=False)) as response:
+            data = json.load(response)
+        usage = data.get("usage") or {}
+        _record_openai_usage(usage)
+        # choices がない応答は KeyError / IndexError として invalid_response になる
+        return data["choices"][0]["message"]["content"] or ""
+
+    def stream(
+        self,
+        model: str,
+        prompt: str,
+        max_tokens: Optional[int] = None,
+        json_mode: bool = False
+    ) -> Iterator[str]:
+        usage = {}
+        with self._post(self._payload(model, prompt, max_tokens, json_mode, stream=True)) as response:
+            # Server-Sent Events: 「data: {...}」の行が続き、「data: [DONE]」で終わる
+            for raw_line in response:
+                line = raw_line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                event = json.loads(payload)
+                usage = event.get("usage") or usage
+                for choice in event.get("choices") or []:
+                    text = (choice.get("delta") or {}).get("content")
+                    if text:
+                        yield text
+        _record_openai_usage(usage)
+
+    def _payload(
+        self,
+        model: str,
+        prompt: str,
+        max_tokens: Optional[int],
+        json_mode: bool,
+        stream: bool
+    ) -> Dict:
+        payload = {
+            "model": model or self.default_model,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "max_tokens": min(max_tokens or self.capabilities.max_output_tokens, self.capabilities.max_output_tokens),
+            "stream": stream,
+        }
+        if stream:
+            # 最後のイベントでトークン数を受け取る（対応していないサーバーは無視する）
+            payload["stream_options"] = {"include_usage": True}
+        if json_mode and self.capabilities.json_mode:
+            payload["response_format"] = {"type": "json_object"}
+        return payload
+
+    def _post(self, payload: Dict):
+        """/chat/completions に POST し、応答を返す（HTTP エラーは ProviderHTTPError に変換する）"""
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        request = urllib.request.Request(
+            f"{self.base_url}/chat/completions",
+            data=json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+            headers=headers,
+            method="POST"
+        )
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            body = e.read().decode("utf-8", errors="replace")[:500]
+            raise ProviderHTTPError(e.code, body, e.headers.get("retry-after")) from e
+        except urllib.error.URLError as e:
+            # 接続できない・タイムアウトは再試行の対象として扱えるよう標準の例外にする
+            if isinstance(e.reason, TimeoutError):
+                raise TimeoutError(str(e.reason)) from e
+            raise ConnectionError(str(e.reason)) from e
+
+
+def default_providers() -> Dict[str, Provider]:
+    """環境変数の設定を使うプロバイダー（キーは AIClient の MODEL_ROUTES で使う名前）"""
+    return {
+        "gemini": GeminiProvider(os.getenv("GOOGLE_API_KEY")),
+        "anthropic": AnthropicProvider(
+            os.getenv("ANTHROPIC_API_KEY"),
+            prompt_cache=os.getenv("AI_ANTHROPIC_PROMPT_CACHE", "true").lower() in ("1", "true", "yes", "on")
+        ),
+        "local": OpenAICompatibleProvider.from_env(),
+    }
+
+
+def _gemini_config(max_tokens: Optional[int], json_mode: bool) -> Optional[Dict]:
+    config = {}
+    if max_tokens:
+        config["max_output_tokens"] = max_tokens
+    if json_mode:
+        config["response_mime_type"] = "application/json"
+    return config or None
+
+
+def _record_anthropic_usage(usage) -> None:
+    # キャッシュから読んだ・書き込んだトークンは input_tokens とは別に返される
+    record_usage(
+        usage.input_tokens,
+        usage.output_tokens,
+        getattr(usage, "cache_read_input_tokens", None),
+        getattr(usage, "cache_creation_input_tokens", None)
+    )
+
+
+def _record_openai_usage(usage: Dict) -> None:
+    # vLLM などは前半が一致したプロンプトを再利用し、その分を prompt_tokens_details.cached_tokens で返す
+    # （prompt_tokens には含まれるため、input_tokens からは除く）
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+    prompt_tokens = usage.get("prompt_tokens")
+    if cached and prompt_tokens is not None:
+        record_usage(prompt_tokens - cached, usage.get("completion_tokens"), cached)
+    else:
+        record_usage(prompt_tokens, usage.get("completion_tokens"))
+
+
+def _record_gemini_usage(response) -> None:
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        record_usage(
+            getattr(usage, "prompt_token_count", None),
+            getattr(usage, "candidates_token_count", None)
+        )
+
+
+# ---- オフライン用の偽プロバイダー ----
+
+class FakeRateLimitError(Exception):
+    """偽プロバイダーのレート制限（classify_error は status_code と retry_after を読む）"""
+
+    status_code = 429
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"rate limit exceeded, retry after {retry_after:.2f}s")
+
+
+_SENTENCES = (
+    "潮の匂いが路地の奥まで流れ込んでいた。",
+    "彼女は古い鍵を握りしめ、しばらく黙っていた。",
+    "遠くで汽笛が鳴り、町はゆっくりと目を覚ます。",
+    "誰も知らない約束が、まだ果たされずに残っている。",
+    "灯台の光が一度だけ揺れた。",
+    "少年は地図の余白に小さな印を書き足した。",
+    "雨上がりの石畳に、見覚えのない足跡が続いていた。",
+    "その手紙には差出人の名前がなかった。",
+    "風が止むと、時計塔の針の音だけが聞こえた。",
+    "二人は互いの嘘に気づかないふりをした。",
+)
+_NAMES = ("朝倉", "白石", "久遠", "三峰", "柊", "榊", "水無瀬", "鳴海", "真白", "千景", "湊", "透", "灯", "遥")
+_ROLES = ("主人公", "ライバル", "メンター", "ヒロイン", "敵役", "脇役")
+
+# プロンプトの種類の判定（AIClient のプロンプトの文言に合わせる）
+_CHARACTERS = re.compile(r"登場人物を(\d+)人")
+_CHAPTERS = re.compile(r"章立てを(\d+)章")
+_FRAGMENTS = re.compile(r"断片を(\d+)個")
+_SUMMARY = re.compile(r"あらすじを(\d+)文字以内")
+_LENGTH_RANGE = re.compile(r"(\d+)-(\d+)文字")
+_LENGTH_MIN = re.compile(r"(\d+)文字以上")
+
+
+class FakeProvider(Provider):
+    """ネットワークに接続しない偽プロバイダー（ベンチマーク・動作確認用）
+
+    プロンプトの種類（アイデアの断片・登場人物の JSON・章立て・本文など）に合わせた
+    それらしい形の日本語を返す。応答は seed・呼び出し回数・モデル名・プロンプトから決まるため、
+    同じ順序で呼び出せば毎回同じ結果になる。
+
+    - latency: 最初の断片（generate では応答全体）までの秒数
+    - chars_per_second: 生成速度（ストリームの断片の間隔と generate の所要時間に使う）
+    - chunk_chars: ストリームの1断片の文字数
+    - requests_per_minute: 直近1分間の呼び出し数の上限（0 なら制限なし）。
+      超えると status_code=429 の例外を retry_after 付きで送出する
+    - malformed_rate: 応答が途中で途切れる確率（番号付きリストや JSON が壊れる）
+    - streaming: False にするとストリーミングに対応しないプロバイダーとして振る舞う
+    - errors: 次の呼び出しから順に送出する例外（None の呼び出しは成功する。再試行のテスト用）
+    - interrupt_after_chunks: ストリームをこの断片数の後で切断する（0 なら切断しない）
+    """
+
+    def __init__(
+        self,
+        name: str = "fake",
+        seed: int = 0,
+        latency: float = 0.05,
+        chars_per_second: float = 2000.0,
+        chunk_chars: int = 40,
+        requests_per_minute: float = 0,
+        malformed_rate: float = 0.0,
+        streaming: bool = True,
+        errors: Iterable[Optional[Exception]] = (),
+        interrupt_after_chunks: int = 0,
+        sleep: Callable[[float], None] = time.sleep,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.capabilities = Capabilities(streaming=streaming, context_window=1_048_576)
+        self.seed = seed
+        self.latency = latency
+        self.chars_per_second = chars_per_second
+        self.chunk_chars = max(1, chunk_chars)
+        self.requests_per_minute = requests_per_minute
+        self.malformed_rate = malformed_rate
+        self.errors = deque(errors)
+        self.interrupt_after_chunks = interrupt_after_chunks
+        self.sleep = sleep
+        self.clock = clock
+        self.calls = 0
+        self._window: deque = deque()
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        return True
+
+    def generate(
+        self,
+        model: str,
+        prompt: str,
+        max_tokens: Optional[int] = None,
+        json_mode: bool = False
+    ) -> str:
+        text = self._respond(model, prompt)
+        self._wait(self.latency + len(text) / self.chars_per_second)
+        record_usage(estimate_tokens(prompt, self.name), estimate_tokens(text, self.name))
+        return text
+
+    def stream(
+        self,
+        model: str,
+        prompt: str,
+        max_tokens: Optional[int] = None,
+        json_mode: bool = False
+    ) -> Iterator[str]:
+        text = self._respond(model, prompt)
+        self._wait(self.latency)
+        for i, start in enumerate(range(0, len(text), self.chunk_chars)):
+            if self.interrupt_after_chunks and i >= self.interrupt_after_chunks:
+                raise ConnectionResetError("stream interrupted")
+            chunk = text[start:start + self.chunk_chars]
+            self._wait(len(chunk) / self.chars_per_second)
+            yield chunk
+        record_usage(estimate_tokens(prompt, self.name), estimate_tokens(text, self.name))
+
+    def _wait(self, seconds: float) -> None:
+        if seconds > 0:
+            self.sleep(seconds)
+
+    def _respond(self, model: str, prompt: str) -> str:
+        """レート制限を確認し、応答のテキストを作る"""
+        with self._lock:
+            error = self.errors.popleft() if self.errors else None
+            if error is not None:
+                self.calls += 1
+                raise error
+            self._check_rate_limit()
+            self.calls += 1
+            rng = random.Random(f"{self.seed}:{self.calls}:{model}:{prompt}")
+
+        text = self._compose(rng, prompt)
+        if rng.random() < self.malformed_rate:
+            # 出力の上限や接続の切断で途中までしか届かなかった応答
+            text = text[:rng.randrange(len(text) // 2 + 1)]
+        return text
+
+    def _check_rate_limit(self) -> None:
+        """直近1分間の呼び出し数が上限に達していれば例外を送出（ロックを取得して呼ぶこと）"""
+        if self.requests_per_minute <= 0:
+            return
+        now = self.clock()
+        while self._window and now - self._window[0] >= 60:
+            self._window.popleft()
+        if len(self._window) >= self.requests_per_minute:
+            raise FakeRateLimitError(retry_after=60 - (now - self._window[0]))
+        self._window.append(now)
+
+    def _compose(self, rng: random.Random, prompt: str) -> str:
+        """プロンプトの種類に合わせた形の応答"""
+        match = _CHARACTERS.search(prompt)
+        if match:
+            characters = [
+                {
+                    "name": f"{rng.choice(_NAMES)}{rng.choice(_NAMES)}{i + 1}",
+                    "role": rng.choice(_ROLES),
+                    "personality": _prose(rng, 60),
+                    "background": _prose(rng, 80),
+                }
+                for i in range(int(match.group(1)))
+            ]
+            return "```json\n" + json.dumps(characters, ensure_ascii=False, indent=2) + "\n```"
+
+        match = _CHAPTERS.search(prompt)
+        if match:
+            return "\n".join(
+                f"{i + 1}. {rng.choice(_NAMES)}の章｜{_prose(rng, 60)}" for i in range(int(match.group(1)))
+            )
+
+        match = _FRAGMENTS.search(prompt)
+        if match:
+            return "\n".join(f"{i + 1}. {_prose(rng, 30)}" for i in range(int(match.group(1))))
+
+        match = _SUMMARY.search(prompt)
+        if match:
+            return _prose(rng, int(match.group(1)) * 4 // 5)
+
+        if "プロットを作成" in prompt:
+            return "\n".join(
+                f"{i + 1}. {label}: {_prose(rng, 100)}"
+                for i, label in enumerate(("発端", "展開", "クライマックス", "結末"))
+            )
+        if "基本設定" in prompt:
+            return _prose(rng, 150)
+        if "コンセプト" in prompt:
+            return "\n\n".join(_prose(rng, 200) for _ in range(3))
+
+        # 本文（指定された分量の上限に合わせる）
+        match = _LENGTH_RANGE.search(prompt)
+        if match:
+            chars = int(match.group(2))
+        else:
+            match = _LENGTH_MIN.search(prompt)
+            chars = int(match.group(1)) if match else 1000
+        return _paragraphs(rng, chars)
+
+
+def _prose(rng: random.Random, chars: int) -> str:
+    """chars 文字前後の文章"""
+    parts = []
+    total = 0
+    while total < chars:
+        sentence = rng.choice(_SENTENCES)
+        parts.append(sentence)
+        total += len(sentence)
+    return "".join(parts)
+
+
+def _paragraphs(rng: random.Random, chars: int) -> str:
+    """chars 文字前後の、段落に分かれた本文"""
+    paragraphs = []
+    total = 0
+    while total < chars:
+        paragraph = _prose(rng, rng.randrange(100, 300))
+        paragraphs.append(paragraph)
+        total += len(paragraph)
+    return "\n\n".join(paragraphs)
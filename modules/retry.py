@@ -0,0 +1,277 @@
+"""
+API呼び出しの再試行・レート制限
+一時的な失敗を指数バックオフで再試行し、失敗は構造化されたエラーとして返す
+"""
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Callable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+# 再試行する HTTP ステータス（529 は Anthropic の過負荷）
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# エラー種別ごとの表示メッセージ
+ERROR_MESSAGES = {
+    "missing_api_key": "APIキーが設定されていません",
+    "rate_limit": "APIのレート制限に達しました。しばらく待ってから再度お試しください",
+    "timeout": "APIの応答がタイムアウトしました",
+    "connection": "APIに接続できませんでした",
+    "server": "APIサーバーでエラーが発生しました",
+    "auth": "APIキーが無効か、権限がありません",
+    "invalid_request": "APIへのリクエストが不正です",
+    "invalid_response": "APIの応答を解釈できませんでした",
+    "prompt_too_large": "入力が長すぎるため、モデルの上限を超えます",
+    "unknown": "APIの呼び出しに失敗しました"
+}
+
+# プロバイダーごとの既定のレート制限（1分あたりのリクエスト数）
+DEFAULT_REQUESTS_PER_MINUTE = {
+    "gemini": 60,
+    "anthropic": 50
+}
+
+
+class AIClientError(Exception):
+    """AI API 呼び出しの失敗
+
+    kind はエラー種別（ERROR_MESSAGES のキー）。生成結果の代わりに
+    エラー文字列を返すのではなく、この例外を送出して呼び出し側で扱う。
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        provider: str = "",
+        detail: str = "",
+        status_code: Optional[int] = None,
+        retry_after: Optional[float] = None,
+        attempts: int = 1
+    ):
+        self.kind = kind
+        self.provider = provider
+        self.detail = detail
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.attempts = attempts
+        super().__init__(self.user_message())
+
+    @property
+    def retryable(self) -> bool:
+        """再試行で回復する可能性があるか"""
+        return self.kind in ("rate_limit", "timeout", "connection", "server")
+
+    def user_message(self) -> str:
+        """画面に表示するメッセージ"""
+        message = ERROR_MESSAGES.get(self.kind, ERROR_MESSAGES["unknown"])
+        if self.provider:
+            message = f"{message}（{self.provider}）"
+        if self.detail:
+            message = f"{message}: {self.detail}"
+        return message
+
+
+@dataclass
+class RetryPolicy:
+    """再試行の方針（指数バックオフ + フルジッター）
+
+    Retry-After が指定された場合は短く切り詰めずにその秒数だけ待つ。
+    max_delay より長い待ち時間を求められた場合は、待たずにすぐ失敗とする。
+    1回の呼び出しで待つ時間の合計は max_total_delay までとする。
+    """
+    max_attempts: int = 4
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+    max_total_delay: float = 60.0
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> Optional[float]:
+        """attempt 回目の失敗後に待つ秒数（Retry-After が max_delay を超える場合は None）"""
+        if retry_after is not None:
+            retry_after = max(retry_after, 0.0)
+            return retry_after if retry_after <= self.max_delay else None
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+
+class TokenBucket:
+    """トークンバケット方式のレート制限（スレッドセーフ）"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate  # 1秒あたりに補充されるトークン数
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, sleep: Callable[[float], None] = time.sleep) -> None:
+        """トークンを1つ取得（なければ補充されるまで待つ）"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            sleep(wait)
+
+
+class RequestExecutor:
+    """API呼び出しを再試行・レート制限付きで実行する"""
+
+    def __init__(
+        self,
+        policy: Optional[RetryPolicy] = None,
+        rate_limits: Optional[dict[str, TokenBucket]] = None,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        self.policy = policy or RetryPolicy()
+        self.rate_limits = rate_limits or {}
+        self.sleep = sleep
+
+    @classmethod
+    def from_env(cls) -> 'RequestExecutor':
+        """環境変数の設定から作成"""
+        policy = RetryPolicy(max_attempts=int(os.getenv("AI_RETRY_MAX_ATTEMPTS", "4")))
+        rate_limits = {}
+        for provider, default_rpm in DEFAULT_REQUESTS_PER_MINUTE.items():
+            rpm = float(os.getenv(f"AI_RATE_LIMIT_{provider.upper()}", str(default_rpm)))
+            if rpm > 0:
+                rate_limits[provider] = TokenBucket(rate=rpm / 60, capacity=max(1.0, rpm / 10))
+        return cls(policy=policy, rate_limits=rate_limits)
+
+    def execute(self, provider: str, request: Callable[[], T]) -> T:
+        """request を実行し、一時的な失敗は再試行する
+
+        最終的に失敗した場合は AIClientError を送出する。
+        """
+        attempt = 0
+        waited = 0.0
+        while True:
+            attempt += 1
+            self._acquire(provider)
+            try:
+                return request()
+            except Exception as e:
+                error = classify_error(provider, e, attempt)
+                delay = self._retry_delay(error, attempt, waited)
+                if delay is None:
+                    raise error from e
+                self.sleep(delay)
+                waited += delay
+
+    def stream(self, provider: str, open_stream: Callable[[], Iterator[str]]) -> Iterator[str]:
+        """ストリームを実行し、最初の断片を受け取るまでの失敗は再試行する
+
+        受信開始後の失敗は、送信済みの断片と重複しないよう再試行せずに送出する。
+        """
+        attempt = 0
+        waited = 0.0
+        while True:
+            attempt += 1
+            self._acquire(provider)
+            started = False
+            try:
+                for chunk in open_stream():
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                error = classify_error(provider, e, attempt)
+                delay = None if started else self._retry_delay(error, attempt, waited)
+                if delay is None:
+                    raise error from e
+                self.sleep(delay)
+                waited += delay
+
+    def _retry_delay(self, error: AIClientError, attempt: int, waited: float) -> Optional[float]:
+        """再試行の前に待つ秒数（再試行しない場合は None）
+
+        Retry-After が max_delay を超える場合や、待ち時間の合計が max_total_delay を
+        超える場合は、今は回復しないものとして再試行しない。
+        """
+        if not error.retryable or attempt >= self.policy.max_attempts:
+            return None
+        delay = self.policy.delay(attempt, error.retry_after)
+        if delay is None or waited + delay > self.policy.max_total_delay:
+            return None
+        return delay
+
+    def _acquire(self, provider: str) -> None:
+        bucket = self.rate_limits.get(provider)
+        if bucket:
+            bucket.acquire(self.sleep)
+
+
+def classify_error(provider: str, error: Exception, attempts: int = 1) -> AIClientError:
+    """SDK の例外を AIClientError に変換
+
+    SDK に依存しないよう、ステータスコードや例外名から判定する。
+    """
+    if isinstance(error, AIClientError):
+        error.attempts = attempts
+        return error
+
+    status_code = getattr(error, "status_code", None)
+    if not isinstance(status_code, int):
+        # google.api_core の例外は code に HTTP ステータスを持つ
+        status_code = getattr(error, "code", None)
+        if not isinstance(status_code, int):
+            status_code = None
+
+    name = type(error).__name__
+    if status_code == 429 or name in ("RateLimitError", "ResourceExhausted", "TooManyRequests"):
+        kind = "rate_limit"
+    elif isinstance(error, TimeoutError) or "Timeout" in name or name == "DeadlineExceeded" or status_code in (408, 504):
+        kind = "timeout"
+    elif isinstance(error, ConnectionError) or name in ("APIConnectionError", "ConnectError"):
+        kind = "connection"
+    elif status_code in (401, 403) or name in ("AuthenticationError", "PermissionDeniedError", "PermissionDenied", "Unauthenticated"):
+        kind = "auth"
+    elif status_code in RETRYABLE_STATUS_CODES or (status_code or 0) >= 500 or name in ("InternalServerError", "ServiceUnavailable", "OverloadedError"):
+        kind = "server"
+    elif status_code and 400 <= status_code < 500:
+        kind = "invalid_request"
+    elif isinstance(error, (ValueError, KeyError, IndexError)):
+        # 安全フィルタでブロックされた応答など
+        kind = "invalid_response"
+    else:
+        kind = "unknown"
+
+    return AIClientError(
+        kind,
+        provider=provider,
+        detail=str(error),
+        status_code=status_code,
+        retry_after=_parse_retry_after(error),
+        attempts=attempts
+    )
+
+
+def _parse_retry_after(error: Exception) -> Optional[float]:
+    """例外から Retry-After（秒）を取り出す"""
+    value = getattr(error, "retry_after", None)
+    if value is None:
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None)
+        if headers is not None:
+            try:
+                value = headers.get("retry-after")
+            except Exception:
+                value = None
+    if value is None:
+        return None
+
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(str(value)).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
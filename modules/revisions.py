@@ -0,0 +1,136 @@
+"""
+版の履歴
+本文や設定・プロットを編集したときの版を、差分として圧縮して記録する
+"""
+import base64
+import difflib
+import json
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional
+
+
+# 全文の版どうしの最大の間隔（版の復元で当てはめる差分はこれ未満に収まる）
+SNAPSHOT_INTERVAL = 20
+
+SNAPSHOT = "snapshot"
+DELTA = "delta"
+
+# 差分の命令（直前の版の行をコピー / 新しいテキストを挿入）
+_COPY = 0
+_INSERT = 1
+
+
+@dataclass
+class Revision:
+    """1つの版（snapshot は全文、delta は直前の版からの差分を圧縮したもの）"""
+    kind: str
+    data: str  # zlib で圧縮して base64 にした内容
+    length: int  # この版の文字数
+    label: Optional[str] = None
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+
+
+def record_revision(revisions: List[Revision], text: str, label: Optional[str] = None) -> bool:
+    """新しい版を追加（直前の版と同じなら追加せず False を返す）"""
+    if not revisions:
+        revisions.append(_snapshot(text, label))
+        return True
+
+    previous = reconstruct(revisions, len(revisions) - 1)
+    if previous == text:
+        return False
+
+    start = _last_snapshot(revisions, len(revisions) - 1)
+    if len(revisions) - start >= SNAPSHOT_INTERVAL:
+        revisions.append(_snapshot(text, label))
+        return True
+
+    delta = _encode(json.dumps(_make_delta(previous, text), ensure_ascii=False))
+    # 前の全文以降の差分が全文より大きくなったら全文で持つ（復元時に読む量を抑える）
+    chain_size = len(delta) + sum(len(revision.data) for revision in revisions[start + 1:])
+    if chain_size >= len(revisions[start].data):
+        revisions.append(_snapshot(text, label))
+    else:
+        revisions.append(Revision(kind=DELTA, data=delta, length=len(text), label=label))
+    return True
+
+
+def reconstruct(revisions: List[Revision], index: int) -> str:
+    """index 番目の版の全文を復元
+
+    直前の全文の版から差分を順に当てはめるので、
+    当てはめる差分は SNAPSHOT_INTERVAL 個未満で済む。
+    """
+    if not -len(revisions) <= index < len(revisions):
+        raise IndexError(f"版 {index} はありません（{len(revisions)}件）")
+    index %= len(revisions)
+
+    start = _last_snapshot(revisions, index)
+    text = _decode(revisions[start].data)
+    for revision in revisions[start + 1:index + 1]:
+        text = _apply_delta(text, json.loads(_decode(revision.data)))
+    return text
+
+
+def diff_revisions(revisions: List[Revision], old_index: int, new_index: int) -> str:
+    """2つの版の差分（unified diff 形式）"""
+    old_text = reconstruct(revisions, old_index)
+    new_text = reconstruct(revisions, new_index)
+    return "".join(difflib.unified_diff(
+        old_text.splitlines(keepends=True),
+        new_text.splitlines(keepends=True),
+        fromfile=f"版{old_index % len(revisions) + 1}",
+        tofile=f"版{new_index % len(revisions) + 1}"
+    ))
+
+
+def stored_size(revisions: List[Revision]) -> int:
+    """履歴の保存に使っている大きさ（バイト）"""
+    return sum(len(revision.data) for revision in revisions)
+
+
+def _last_snapshot(revisions: List[Revision], index: int) -> int:
+    """index 番目以前で最も新しい全文の版の位置"""
+    while revisions[index].kind != SNAPSHOT:
+        index -= 1
+    return index
+
+
+def _snapshot(text: str, label: Optional[str]) -> Revision:
+    return Revision(kind=SNAPSHOT, data=_encode(text), length=len(text), label=label)
+
+
+def _make_delta(old_text: str, new_text: str) -> list:
+    """行単位の差分（変わらない行は行番号の範囲だけを記録する）"""
+    old_lines = old_text.splitlines(keepends=True)
+    new_lines = new_text.splitlines(keepends=True)
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+
+    delta = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            delta.append([_COPY, i1, i2])
+        elif j2 > j1:
+            delta.append([_INSERT, "".join(new_lines[j1:j2])])
+    return delta
+
+
+def _apply_delta(old_text: str, delta: list) -> str:
+    old_lines = old_text.splitlines(keepends=True)
+    parts = []
+    for op in delta:
+        if op[0] == _COPY:
+            parts.extend(old_lines[op[1]:op[2]])
+        else:
+            parts.append(op[1])
+    return "".join(parts)
+
+
+def _encode(text: str) -> str:
+    return base64.b64encode(zlib.compress(text.encode("utf-8"), 9)).decode("ascii")
+
+
+def _decode(data: str) -> str:
+    return zlib.decompress(base64.b64decode(data)).decode("utf-8")
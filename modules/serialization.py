@@ -0,0 +1,144 @@
+"""
+プロジェクトデータの変換と保存形式
+データクラスを JSON に変換できる形にし、選んだ形式（圧縮など）のバイト列にする
+
+形式は読み込み時にファイルの先頭のバイト列から判定するため、
+形式を切り替えても以前の形式で保存したファイルはそのまま読める。
+"""
+import gzip
+import json
+import os
+from dataclasses import fields, is_dataclass
+from typing import Any, Callable, Dict, Tuple
+
+
+# 保存形式
+#   json:    これまでどおりの整形した JSON（本文はそのままのテキスト）
+#   gzip:    空白を除いた JSON を gzip で圧縮
+#   zstd:    空白を除いた JSON を zstd で圧縮（zstandard パッケージが必要）
+#   msgpack: MessagePack（msgpack パッケージが必要）
+FORMATS = ("json", "gzip", "zstd", "msgpack")
+DEFAULT_FORMAT = "json"
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+# UTF-8 のテキストの先頭には現れないバイトで始め、テキストと区別する
+MSGPACK_MAGIC = b"\xc1NVM"
+
+# 保存のたびに圧縮するため、圧縮率より速度を優先する
+GZIP_LEVEL = 1
+ZSTD_LEVEL = 3
+
+# データクラスごとのフィールド名（毎回 fields() を呼ばないようにする）
+_FIELD_NAMES: Dict[type, Tuple[str, ...]] = {}
+# データクラスごとの変換関数
+_CONVERTERS: Dict[type, Callable[[Any], Any]] = {}
+
+
+def format_from_env() -> str:
+    """環境変数 AI_NOVELIST_STORAGE_FORMAT から保存形式を決める"""
+    storage_format = os.getenv("AI_NOVELIST_STORAGE_FORMAT", DEFAULT_FORMAT).strip().lower()
+    if storage_format not in FORMATS:
+        raise ValueError(f"不明な保存形式です: {storage_format}（{', '.join(FORMATS)} のいずれか）")
+    return storage_format
+
+
+def to_data(value: Any) -> Any:
+    """データクラスを辞書・リストに変換（JSON に変換できる形にする）
+
+    dataclasses.asdict と違い、文字列などの値は複製せずにそのまま使う。
+    to_dict を持つクラスはその結果を使う。
+    """
+    cls = type(value)
+    if cls in (str, int, float, bool) or value is None:
+        return value
+    if cls is list or cls is tuple:
+        return [to_data(item) for item in value]
+    if cls is dict:
+        return {key: to_data(item) for key, item in value.items()}
+
+    converter = _CONVERTERS.get(cls)
+    if converter is None:
+        if not is_dataclass(value):
+            return value
+        converter = _CONVERTERS[cls] = getattr(cls, "to_dict", None) or fields_to_data
+    return converter(value)
+
+
+def fields_to_data(value: Any) -> Dict:
+    """データクラスのフィールドを順に to_data で変換した辞書"""
+    cls = type(value)
+    names = _FIELD_NAMES.get(cls)
+    if names is None:
+        names = _FIELD_NAMES[cls] = tuple(f.name for f in fields(value))
+    return {name: to_data(getattr(value, name)) for name in names}
+
+
+def dumps(data: Any, storage_format: str = DEFAULT_FORMAT, text: bool = False) -> bytes:
+    """データを保存形式のバイト列に変換（text が True ならテキストとして扱う）"""
+    return pack(encode(data, storage_format, text), storage_format)
+
+
+def loads(blob: bytes, text: bool = False) -> Any:
+    """dumps で作ったバイト列を元に戻す（形式は自動で判定する）"""
+    payload, storage_format = unpack(blob)
+    return decode(payload, storage_format, text)
+
+
+def encode(data: Any, storage_format: str = DEFAULT_FORMAT, text: bool = False) -> bytes:
+    """圧縮する前の内容を作成（変更の有無の判定にはこの内容を使う）"""
+    if storage_format == "msgpack":
+        return _msgpack().packb(data, use_bin_type=True)
+    if text:
+        return data.encode("utf-8")
+    if storage_format == "json":
+        return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def decode(payload: bytes, storage_format: str, text: bool = False) -> Any:
+    """encode の逆"""
+    if storage_format == "msgpack":
+        return _msgpack().unpackb(payload, raw=False)
+    if text:
+        return payload.decode("utf-8")
+    return json.loads(payload)
+
+
+def pack(payload: bytes, storage_format: str) -> bytes:
+    """内容を保存形式に合わせて圧縮する"""
+    if storage_format == "gzip":
+        # 同じ内容なら同じバイト列になるよう、時刻は埋め込まない
+        return gzip.compress(payload, compresslevel=GZIP_LEVEL, mtime=0)
+    if storage_format == "zstd":
+        return _zstandard().ZstdCompressor(level=ZSTD_LEVEL).compress(payload)
+    if storage_format == "msgpack":
+        return MSGPACK_MAGIC + payload
+    return payload
+
+
+def unpack(blob: bytes) -> Tuple[bytes, str]:
+    """先頭のバイト列から形式を判定して展開し、(内容, 形式) を返す"""
+    if blob.startswith(GZIP_MAGIC):
+        return gzip.decompress(blob), "gzip"
+    if blob.startswith(ZSTD_MAGIC):
+        return _zstandard().ZstdDecompressor().decompress(blob), "zstd"
+    if blob.startswith(MSGPACK_MAGIC):
+        return blob[len(MSGPACK_MAGIC):], "msgpack"
+    return blob, "json"
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise RuntimeError("zstd 形式には zstandard パッケージが必要です（pip install zstandard）") from e
+    return zstandard
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError as e:
+        raise RuntimeError("msgpack 形式には msgpack パッケージが必要です（pip install msgpack）") from e
+    return msgpack
@@ -0,0 +1,425 @@
+"""
+SQLiteによるプロジェクトの保存
+複数のセッションから同時に保存しても壊れないよう、トランザクションで書き込む
+
+    python -m modules.sqlite_storage --from data/projects --to data/projects.db
+
+で、フォルダ形式（ProjectStorage）のプロジェクトをSQLiteに移行できる。
+"""
+import argparse
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from .data_models import (
+    NovelProject, NovelSummary, WritingConfig, SECTION_NAMES, section_to_data, section_from_data
+)
+from . import serialization
+from .serialization import to_data
+from .storage import (
+    BaseProjectStorage, ProjectInfo, ProjectStorage, DEFAULT_DEBOUNCE_SECONDS
+)
+
+
+# projects テーブルの列に保存する部分（本文はそのまま、それ以外はJSON）
+# それ以外の部分（設定・プロット・登場人物・章）は専用のテーブルに1件1行で保存する
+COLUMN_SECTIONS = ("idea_fragments", "expanded_ideas", "novel_text", "revisions")
+
+# 後から追加した projects テーブルの列（古いデータベースには ALTER TABLE で追加する）
+ADDED_COLUMNS = {
+    "revisions": "TEXT NOT NULL DEFAULT '{}'",
+    "extra": "TEXT NOT NULL DEFAULT '{}'",
+    "novel_summary": "TEXT",
+}
+
+# 後から追加した専用のテーブルの列（id のない行は読み込むときに作成日時から id を付ける）
+ADDED_TABLE_COLUMNS = {
+    "settings": {"id": "TEXT"},
+    "plots": {"id": "TEXT"},
+}
+
+# 専用のテーブルに保存する部分の列（to_dict のキーと同じ）
+TABLE_COLUMNS = {
+    "settings": ("text", "created_at", "id"),
+    "plots": ("text", "created_at", "id"),
+    "characters": ("name", "personality", "background", "role"),
+    "chapters": ("title", "beat", "text", "summary"),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    name TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    selected_setting_index INTEGER,
+    selected_plot_index INTEGER,
+    writing_config TEXT,
+    counts TEXT NOT NULL DEFAULT '{}',
+    idea_fragments TEXT NOT NULL DEFAULT '[]',
+    expanded_ideas TEXT NOT NULL DEFAULT '[]',
+    novel_text TEXT NOT NULL DEFAULT '',
+    revisions TEXT NOT NULL DEFAULT '{}',
+    extra TEXT NOT NULL DEFAULT '{}',
+    novel_summary TEXT
+);
+CREATE INDEX IF NOT EXISTS projects_updated_at ON projects (updated_at);
+
+CREATE TABLE IF NOT EXISTS settings (
+    project TEXT NOT NULL REFERENCES projects (name) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    id TEXT,
+    PRIMARY KEY (project, position)
+);
+
+CREATE TABLE IF NOT EXISTS plots (
+    project TEXT NOT NULL REFERENCES projects (name) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    id TEXT,
+    PRIMARY KEY (project, position)
+);
+
+CREATE TABLE IF NOT EXISTS characters (
+    project TEXT NOT NULL REFERENCES projects (name) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    personality TEXT NOT NULL,
+    background TEXT,
+    role TEXT,
+    PRIMARY KEY (project, position)
+);
+
+CREATE TABLE IF NOT EXISTS chapters (
+    project TEXT NOT NULL REFERENCES projects (name) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    beat TEXT NOT NULL,
+    text TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    PRIMARY KEY (project, position)
+);
+"""
+
+
+class SQLiteProjectStorage(BaseProjectStorage):
+    """プロジェクトをSQLiteに保存（ProjectStorage と同じ使い方）
+
+    WALモードで開くため、書き込み中も他のセッションから読み込める。
+    保存は1回のトランザクションで行い、前回から変わった部分だけを書き直す。
+    設定・プロット・登場人物・章はそれぞれのテーブルに1件1行で保存するので、
+    プロジェクトをまたいだ検索もSQLで行える。
+    """
+
+    def __init__(
+        self,
+        db_path: str = "data/projects.db",
+        debounce_seconds: float = DEFAULT_DEBOUNCE_SECONDS,
+        storage_format: Optional[str] = None
+    ):
+        super().__init__(debounce_seconds)
+        self.db_path = Path(db_path)
+        # 本文などの列に保存するときの形式（json 以外は BLOB として保存する）
+        self.storage_format = storage_format or serialization.format_from_env()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # 接続はスレッドごとに作る（sqlite3 の接続はスレッド間で共有できない）
+        self._local = threading.local()
+
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(projects)")}
+        for column, definition in ADDED_COLUMNS.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE projects ADD COLUMN {column} {definition}")
+        for table, columns in ADDED_TABLE_COLUMNS.items():
+            existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for column, definition in columns.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def load_project(self, project_name: str) -> Optional[NovelProject]:
+        """プロジェクトを読み込み（基本情報だけを読み、各部分は初回アクセス時に読み込む）"""
+        try:
+            with self._lock:
+                # 保存待ちの内容があれば先に書き込む
+                self._flush_one(project_name)
+
+            row = self._connection().execute(
+                "SELECT name, created_at, updated_at, selected_setting_index, selected_plot_index,"
+                " writing_config, counts, extra, novel_summary FROM projects WHERE name = ?",
+                (project_name,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            name, created_at, updated_at, setting_index, plot_index, writing_config, counts, extra, novel_summary = row
+            project = NovelProject(
+                project_name=name,
+                created_at=created_at,
+                updated_at=updated_at,
+                selected_setting_index=setting_index,
+                selected_plot_index=plot_index,
+                writing_config=WritingConfig.from_dict(json.loads(writing_config)) if writing_config else None,
+                novel_summary=NovelSummary.from_dict(json.loads(novel_summary)) if novel_summary else None,
+                extra=json.loads(extra)
+            )
+
+            with self._lock:
+                counts = json.loads(counts)
+                self._saved_counts[name] = counts
+                hashes = {'project': _hash_data([self._project_row(project), counts])}
+                self._saved_hashes[name] = hashes
+
+            for section in SECTION_NAMES:
+                project.set_lazy_field(section, self._section_loader(hashes, name, section))
+            return project
+        except Exception as e:
+            print(f"プロジェクト読み込みエラー: {e}")
+            return None
+
+    def list_project_info(self) -> List[ProjectInfo]:
+        """保存されているプロジェクトの情報一覧を取得（本文などは読まない）"""
+        try:
+            rows = self._connection().execute(
+                "SELECT name, created_at, updated_at, counts, writing_config IS NOT NULL FROM projects"
+            ).fetchall()
+            return [
+                ProjectInfo(
+                    name=name,
+                    created_at=created_at,
+                    updated_at=updated_at,
+                    counts=json.loads(counts),
+                    has_writing_config=bool(has_writing_config)
+                )
+                for name, created_at, updated_at, counts, has_writing_config in rows
+            ]
+        except Exception as e:
+            print(f"プロジェクト一覧取得エラー: {e}")
+            return []
+
+    def delete_project(self, project_name: str) -> bool:
+        """プロジェクトを削除（設定・プロットなどの行もまとめて消える）"""
+        try:
+            with self._lock:
+                self._forget(project_name)
+                with self._transaction() as conn:
+                    cursor = conn.execute("DELETE FROM projects WHERE name = ?", (project_name,))
+                return cursor.rowcount > 0
+        except Exception as e:
+            print(f"プロジェクト削除エラー: {e}")
+            return False
+
+    def project_exists(self, project_name: str) -> bool:
+        """プロジェクトが存在するか確認"""
+        row = self._connection().execute(
+            "SELECT 1 FROM projects WHERE name = ?", (project_name,)
+        ).fetchone()
+        return row is not None
+
+    def close(self) -> None:
+        """このスレッドの接続を閉じる"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _write(self, project: NovelProject) -> bool:
+        """変わった部分だけを1回のトランザクションで書き込む（呼び出し元でロックを取得すること）"""
+        try:
+            name = project.project_name
+            hashes = self._saved_hashes.get(name, {})
+            counts = dict(self._saved_counts.get(name, {}))
+
+            changes = {}
+            for section in SECTION_NAMES:
+                if not project.is_loaded(section):
+                    continue
+                value = getattr(project, section)
+                counts[section] = len(value)
+                data = section_to_data(section, value)
+                data_hash = _hash_data(data)
+                if hashes.get(section) != data_hash:
+                    changes[section] = (data, data_hash)
+
+            project_row = self._project_row(project)
+            project_hash = _hash_data([project_row, counts])
+            if not changes and hashes.get('project') == project_hash:
+                return True
+
+            updated_at = datetime.now().isoformat()
+            with self._transaction() as conn:
+                conn.execute(
+                    "INSERT INTO projects (name, created_at, updated_at, selected_setting_index,"
+                    " selected_plot_index, writing_config, extra, novel_summary, counts)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT (name) DO UPDATE SET updated_at = excluded.updated_at,"
+                    " selected_setting_index = excluded.selected_setting_index,"
+                    " selected_plot_index = excluded.selected_plot_index,"
+                    " writing_config = excluded.writing_config, extra = excluded.extra,"
+                    " novel_summary = excluded.novel_summary, counts = excluded.counts",
+                    (*project_row[:2], updated_at, *project_row[2:], json.dumps(counts))
+                )
+                for section, (data, _) in changes.items():
+                    self._write_section(conn, name, section, data)
+
+            project.updated_at = updated_at
+            hashes = self._saved_hashes.setdefault(name, {})
+            hashes.update({section: data_hash for section, (_, data_hash) in changes.items()})
+            hashes['project'] = project_hash
+            self._saved_counts[name] = counts
+            self._last_write[name] = time.monotonic()
+            return True
+        except Exception as e:
+            print(f"プロジェクト保存エラー: {e}")
+            return False
+
+    def _write_section(self, conn: sqlite3.Connection, project_name: str, section: str, data) -> None:
+        """部分を1つ書き込む（テーブルの部分は入れ替え、列の部分は更新）"""
+        if section in COLUMN_SECTIONS:
+            if self.storage_format != "json":
+                value = serialization.dumps(data, self.storage_format, text=section == "novel_text")
+            elif section == "novel_text":
+                value = data
+            else:
+                value = json.dumps(data, ensure_ascii=False)
+            conn.execute(f"UPDATE projects SET {section} = ? WHERE name = ?", (value, project_name))
+            return
+
+        columns = TABLE_COLUMNS[section]
+        conn.execute(f"DELETE FROM {section} WHERE project = ?", (project_name,))
+        conn.executemany(
+            f"INSERT INTO {section} (project, position, {', '.join(columns)})"
+            f" VALUES (?, ?, {', '.join('?' for _ in columns)})",
+            [
+                (project_name, position, *(item[column] for column in columns))
+                for position, item in enumerate(data)
+            ]
+        )
+
+    def _section_loader(self, hashes: Dict[str, str], project_name: str, section: str) -> Callable:
+        """部分を読み込む関数を作成（読み込んだ内容のハッシュも記録する）"""
+        def load():
+            conn = self._connection()
+            if section in COLUMN_SECTIONS:
+                (value,) = conn.execute(
+                    f"SELECT {section} FROM projects WHERE name = ?", (project_name,)
+                ).fetchone()
+                if isinstance(value, bytes):
+                    data = serialization.loads(value, text=section == "novel_text")
+                else:
+                    data = value if section == "novel_text" else json.loads(value)
+                result = section_from_data(section, data)
+            else:
+                columns = TABLE_COLUMNS[section]
+                rows = conn.execute(
+                    f"SELECT {', '.join(columns)} FROM {section} WHERE project = ? ORDER BY position",
+                    (project_name,)
+                ).fetchall()
+                result = section_from_data(section, [dict(zip(columns, row)) for row in rows])
+                data = to_data(result)
+
+            with self._lock:
+                hashes[section] = _hash_data(data)
+            return result
+        return load
+
+    @staticmethod
+    def _project_row(project: NovelProject) -> tuple:
+        """projects テーブルの基本情報（更新日時を除く）"""
+        return (
+            project.project_name,
+            project.created_at,
+            project.selected_setting_index,
+            project.selected_plot_index,
+            json.dumps(to_data(project.writing_config), ensure_ascii=False) if project.writing_config else None,
+            json.dumps(project.extra, ensure_ascii=False),
+            json.dumps(to_data(project.novel_summary), ensure_ascii=False) if project.novel_summary else None,
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        """このスレッド用の接続を取得"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # トランザクションは _transaction で明示的に開始する
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        return _Transaction(self._connection())
+
+
+class _Transaction:
+    """書き込み用のトランザクション（開始時に書き込みロックを取る）"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def _hash_data(data) -> str:
+    content = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def migrate_from_files(source: ProjectStorage, target: SQLiteProjectStorage, overwrite: bool = False) -> int:
+    """フォルダ形式のプロジェクトをSQLiteに移行し、移行した件数を返す
+
+    overwrite が False の場合、移行先に同名のプロジェクトがあれば飛ばす。
+    """
+    migrated = 0
+    for project_name in source.list_projects():
+        if not overwrite and target.project_exists(project_name):
+            print(f"スキップ（移行済み）: {project_name}")
+            continue
+
+        project = source.load_project(project_name)
+        if project is None:
+            print(f"読み込みに失敗しました: {project_name}")
+            continue
+
+        # 遅延読み込みの部分もすべて読み込んでから保存する
+        project = NovelProject.from_dict(project.to_dict())
+        updated_at = project.updated_at
+        if target.save_project(project):
+            # 移行では更新日時を変えない
+            with target._transaction() as conn:
+                conn.execute(
+                    "UPDATE projects SET updated_at = ? WHERE name = ?", (updated_at, project_name)
+                )
+            migrated += 1
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="フォルダ形式のプロジェクトをSQLiteに移行")
+    parser.add_argument("--from", dest="source", default="data/projects", help="移行元のフォルダ")
+    parser.add_argument("--to", dest="target", default="data/projects.db", help="移行先のデータベース")
+    parser.add_argument("--overwrite", action="store_true", help="移行先にある同名のプロジェクトを上書きする")
+    args = parser.parse_args()
+
+    source = ProjectStorage(args.source)
+    target = SQLiteProjectStorage(args.target)
+    migrated = migrate_from_files(source, target, overwrite=args.overwrite)
+    print(f"{migrated}件のプロジェクトを移行しました: {args.target}")
+
+
+if __name__ == "__main__":
+    main()
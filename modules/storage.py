@@ -2,59 +2,271 @@
 ストレージ管理
 プロジェクトの保存・読み込み機能
 """
+import atexit
+import hashlib
 import os
 import json
+import shutil
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass, field
 from pathlib import Path
-from typing import List, Optional
+from typing import Callable, Dict, List, Optional
 from datetime import datetime
-from .data_models import NovelProject
+from .data_models import (
+    NovelProject, NovelSummary, WritingConfig, SCHEMA_VERSION, SECTION_NAMES, section_to_data, section_from_data
+)
+from . import serialization
 
 
-class ProjectStorage:
-    """プロジェクトの保存・読み込みを管理"""
+# 連続した保存要求をまとめる時間（秒）
+DEFAULT_DEBOUNCE_SECONDS = 2.0
 
-    def __init__(self, base_dir: str = "data/projects"):
-        self.base_dir = Path(base_dir)
-        self.base_dir.mkdir(parents=True, exist_ok=True)
+# プロジェクトフォルダ内のファイル
+MANIFEST_FILE = "manifest.json"
+SECTION_FILES = {
+    name: "novel_text.txt" if name == "novel_text" else f"{name}.json"
+    for name in SECTION_NAMES
+}
+STORAGE_FORMAT_VERSION = 2
+
+# 一覧表示用の索引ファイル（base_dir 直下）
+INDEX_FILE = "index.json"
+INDEX_VERSION = 1
+# 索引への追加・更新・削除を1行ずつ追記するファイル（たまったら索引にまとめる）
+INDEX_LOG_FILE = "index.log"
+INDEX_LOG_COMPACT_LINES = 500
+
+# 1ファイル形式のプロジェクトの中身が壊れているときの例外（JSON・文字コードの誤りは ValueError）
+LEGACY_PARSE_ERRORS = (ValueError, TypeError, KeyError, AttributeError)
+
+# 進捗表示に使うステップ（判定に使う部分, 表示名）
+PROGRESS_STEPS = [
+    ("idea_fragments", "アイデア選択"),
+    ("settings", "設定決定"),
+    ("plots", "プロット作成"),
+    ("characters", "登場人物"),
+    ("writing_config", "執筆設定"),
+    ("novel_text", "本文執筆"),
+]
+
+
+@dataclass
+class ProjectInfo:
+    """一覧表示用のプロジェクト情報（プロジェクト本体を読み込まずに得られるもの）"""
+    name: str
+    created_at: str
+    updated_at: str
+    counts: Dict[str, int] = field(default_factory=dict)  # 部分ごとの件数（本文は文字数）
+    has_writing_config: bool = False
+
+    @property
+    def novel_chars(self) -> int:
+        """本文の文字数"""
+        return self.counts.get("novel_text", 0)
+
+    @property
+    def character_count(self) -> int:
+        """登場人物の人数"""
+        return self.counts.get("characters", 0)
+
+    def is_step_done(self, section: str) -> bool:
+        """ステップが済んでいるか"""
+        if section == "writing_config":
+            return self.has_writing_config
+        return self.counts.get(section, 0) > 0
+
+    @property
+    def completed_steps(self) -> List[str]:
+        """済んだステップの表示名"""
+        return [label for section, label in PROGRESS_STEPS if self.is_step_done(section)]
+
+
+class BaseProjectStorage(ABC):
+    """保存先によらない共通処理（保存要求のまとめ、読み込み済みの件数の管理）
+
+    保存先ごとのクラスは _write と読み込み・一覧・削除を実装する。
+    """
+
+    def __init__(self, debounce_seconds: float = DEFAULT_DEBOUNCE_SECONDS):
+        self.debounce_seconds = debounce_seconds
+
+        # 最後に保存・読み込みした各部分のハッシュ（プロジェクト名ごと）
+        self._saved_hashes: Dict[str, Dict[str, str]] = {}
+        # 最後に保存・読み込みした各部分の件数（プロジェクト名ごと）
+        self._saved_counts: Dict[str, Dict[str, int]] = {}
+        # 保存待ちのプロジェクトと、その保存タイマー
+        self._pending: Dict[str, NovelProject] = {}
+        self._timers: Dict[str, threading.Timer] = {}
+        self._last_write: Dict[str, float] = {}
+        self._lock = threading.RLock()
+
+        atexit.register(self.flush)
 
     def save_project(self, project: NovelProject) -> bool:
-        """プロジェクトを保存"""
-        try:
-            project.updated_at = datetime.now().isoformat()
-            file_path = self._get_project_path(project.project_name)
+        """プロジェクトを保存（保存待ちの要求があれば合わせて確定する）"""
+        with self._lock:
+            self._cancel_pending(project.project_name)
+            return self._write(project)
 
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(project.to_json())
+    def request_save(self, project: NovelProject) -> None:
+        """保存を要求（短時間に続く要求は1回の書き込みにまとめる）
 
-            return True
-        except Exception as e:
-            print(f"プロジェクト保存エラー: {e}")
-            return False
+        前回の書き込みから debounce_seconds 以上経っていればすぐに保存し、
+        そうでなければ待ち時間の終わりに最新の内容で1回だけ保存する。
+        待ち時間の後の保存はタイマーのスレッドで行うため、呼び出した時点の複製を保存する
+        （呼び出し元がその後に編集を続けても、書き込み中の内容と混ざらない）。
+        """
+        name = project.project_name
+        with self._lock:
+            if name in self._timers:
+                self._pending[name] = project.snapshot()
+                return
+
+            wait = self.debounce_seconds - (time.monotonic() - self._last_write.get(name, float("-inf")))
+            if wait <= 0:
+                self._write(project)
+                return
 
+            self._pending[name] = project.snapshot()
+            timer = threading.Timer(wait, self._flush_one, args=(name,))
+            timer.daemon = True
+            self._timers[name] = timer
+            timer.start()
+
+    def flush(self) -> None:
+        """保存待ちのプロジェクトをすべて保存"""
+        with self._lock:
+            for name in list(self._pending):
+                self._flush_one(name)
+
+    @abstractmethod
     def load_project(self, project_name: str) -> Optional[NovelProject]:
         """プロジェクトを読み込み"""
-        try:
-            file_path = self._get_project_path(project_name)
 
-            if not file_path.exists():
-                return None
+    def list_projects(self) -> List[str]:
+        """保存されているプロジェクト一覧を取得"""
+        return sorted(info.name for info in self.list_project_info())
+
+    @abstractmethod
+    def list_project_info(self) -> List[ProjectInfo]:
+        """保存されているプロジェクトの情報一覧を取得"""
+
+    def describe_project(self, project: NovelProject) -> ProjectInfo:
+        """読み込み中のプロジェクトの情報（まだ読み込んでいない部分は保存時の件数を使う）"""
+        with self._lock:
+            counts = dict(self._saved_counts.get(project.project_name, {}))
+        counts.update(_loaded_counts(project))
+        return ProjectInfo(
+            name=project.project_name,
+            created_at=project.created_at,
+            updated_at=project.updated_at,
+            counts=counts,
+            has_writing_config=project.writing_config is not None
+        )
 
-            with open(file_path, 'r', encoding='utf-8') as f:
-                json_str = f.read()
+    @abstractmethod
+    def delete_project(self, project_name: str) -> bool:
+        """プロジェクトを削除"""
 
-            return NovelProject.from_json(json_str)
+    @abstractmethod
+    def project_exists(self, project_name: str) -> bool:
+        """プロジェクトが存在するか確認"""
+
+    @abstractmethod
+    def _write(self, project: NovelProject) -> bool:
+        """変わった部分を書き込む（呼び出し元でロックを取得すること）"""
+
+    def _flush_one(self, project_name: str) -> None:
+        """保存待ちのプロジェクトを1つ保存"""
+        with self._lock:
+            timer = self._timers.pop(project_name, None)
+            if timer:
+                timer.cancel()
+            project = self._pending.pop(project_name, None)
+            if project is not None:
+                self._write(project)
+
+    def _cancel_pending(self, project_name: str) -> None:
+        """保存待ちの要求を取り消す"""
+        timer = self._timers.pop(project_name, None)
+        if timer:
+            timer.cancel()
+        self._pending.pop(project_name, None)
+
+    def _forget(self, project_name: str) -> None:
+        """削除したプロジェクトの保存待ちと記録を消す"""
+        self._cancel_pending(project_name)
+        self._saved_hashes.pop(project_name, None)
+        self._saved_counts.pop(project_name, None)
+
+
+class ProjectStorage(BaseProjectStorage):
+    """プロジェクトの保存・読み込みを管理
+
+    プロジェクトごとにフォルダを作り、基本情報（manifest.json）と
+    本文・設定・プロットなどの部分を別々のファイルに保存する。
+    保存時は前回から変わった部分のファイルだけを書き込み、
+    読み込み時は各部分を初めて使うときまで読み込まない。
+
+    プロジェクト名・更新日時・各部分の件数は索引（index.json）にまとめておき、
+    一覧表示ではプロジェクトのファイルを開かない。
+
+    各部分のファイルは storage_format（省略時は AI_NOVELIST_STORAGE_FORMAT）の形式で書き込む。
+    読み込み時は形式を自動で判定するので、形式を変えても既存のファイルはそのまま読める。
+
+    保存は一時ファイルへの書き込みとリネームで行うため、途中で落ちてもファイルは壊れない。
+    以前の形式（<名前>.json や名前だけのフォルダ）は読み込み時に現在の形式へ移行する。
+    """
+
+    def __init__(
+        self,
+        base_dir: str = "data/projects",
+        debounce_seconds: float = DEFAULT_DEBOUNCE_SECONDS,
+        storage_format: Optional[str] = None
+    ):
+        super().__init__(debounce_seconds)
+        self.base_dir = Path(base_dir)
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        self.storage_format = storage_format or serialization.format_from_env()
+
+        # 索引の内容と、読み込んだときのファイルの状態（索引の更新時刻, 追記ファイルの大きさ）
+        self._index: Dict[str, Dict] = {}
+        self._index_signature: Optional[tuple] = None
+        self._index_log_lines = 0
+        self._index_log_torn = False
+        # フォルダの中身と索引が一致することを最後に確かめたときの状態
+        self._verified_state: Optional[tuple] = None
+
+    def load_project(self, project_name: str) -> Optional[NovelProject]:
+        """プロジェクトを読み込み"""
+        try:
+            with self._lock:
+                # 保存待ちの内容があれば先に書き込む
+                self._flush_one(project_name)
+
+                project_dir = self._resolve_project_dir(project_name)
+                if project_dir:
+                    return self._load_from_dir(project_dir)
+
+                legacy_path = self._get_legacy_path(project_name)
+                if legacy_path.exists():
+                    project = self._migrate_legacy(legacy_path)
+                    if project and project.project_name == project_name:
+                        return project
+            return None
         except Exception as e:
             print(f"プロジェクト読み込みエラー: {e}")
             return None
 
-    def list_projects(self) -> List[str]:
-        """保存されているプロジェクト一覧を取得"""
+    def list_project_info(self) -> List[ProjectInfo]:
+        """保存されているプロジェクトの情報一覧を取得（索引から読み、ファイルは開かない）"""
         try:
-            projects = []
-            for file_path in self.base_dir.glob("*.json"):
-                project_name = file_path.stem
-                projects.append(project_name)
-            return sorted(projects)
+            with self._lock:
+                index = self._current_index()
+                return [_info_from_entry(name, entry) for name, entry in index.items()]
         except Exception as e:
             print(f"プロジェクト一覧取得エラー: {e}")
             return []
@@ -62,26 +274,434 @@ class ProjectStorage:
     def delete_project(self, project_name: str) -> bool:
         """プロジェクトを削除"""
         try:
-            file_path = self._get_project_path(project_name)
+            with self._lock:
+                self._forget(project_name)
 
-            if file_path.exists():
-                file_path.unlink()
-                return True
-            return False
+                deleted = False
+                project_dir = self._resolve_project_dir(project_name)
+                if project_dir:
+                    shutil.rmtree(project_dir)
+                    deleted = True
+
+                legacy_path = self._get_legacy_path(project_name)
+                if legacy_path.exists() and _legacy_project_name(legacy_path) == project_name:
+                    legacy_path.unlink()
+                    deleted = True
+
+                self._update_index(project_name, None)
+                return deleted
         except Exception as e:
             print(f"プロジェクト削除エラー: {e}")
             return False
 
     def project_exists(self, project_name: str) -> bool:
         """プロジェクトが存在するか確認"""
-        file_path = self._get_project_path(project_name)
-        return file_path.exists()
-
-    def _get_project_path(self, project_name: str) -> Path:
-        """プロジェクトファイルのパスを取得"""
-        # ファイル名に使えない文字を置換
-        safe_name = "".join(
-            c if c.isalnum() or c in (' ', '_', '-') else '_'
-            for c in project_name
+        with self._lock:
+            return project_name in self._current_index()
+
+    def _write(self, project: NovelProject) -> bool:
+        """変わった部分だけをアトミックに書き込む（呼び出し元でロックを取得すること）
+
+        まだ読み込まれていない部分は変更されていないので書き込まない。
+        基本情報は最後に書き込み、索引も合わせて更新する。
+        """
+        try:
+            name = project.project_name
+            project_dir = self._get_project_dir(name)
+            project_dir.mkdir(parents=True, exist_ok=True)
+            hashes = self._saved_hashes.setdefault(name, {})
+            counts = self._saved_counts.setdefault(name, {})
+
+            changed = False
+            for section in SECTION_NAMES:
+                if not project.is_loaded(section):
+                    continue
+                value = getattr(project, section)
+                counts[section] = len(value)
+                payload = serialization.encode(
+                    section_to_data(section, value), self.storage_format, text=section == "novel_text"
+                )
+                content_hash = _hash_bytes(payload)
+                file_path = project_dir / SECTION_FILES[section]
+                if hashes.get(section) == content_hash and file_path.exists():
+                    continue
+                _atomic_write_bytes(file_path, serialization.pack(payload, self.storage_format))
+                hashes[section] = content_hash
+                changed = True
+
+            manifest = self._manifest_data(project, counts)
+            manifest_hash = _hash_text(json.dumps(manifest, ensure_ascii=False, sort_keys=True))
+            manifest_path = project_dir / MANIFEST_FILE
+            if changed or hashes.get(MANIFEST_FILE) != manifest_hash or not manifest_path.exists():
+                project.updated_at = datetime.now().isoformat()
+                manifest['updated_at'] = project.updated_at
+                _atomic_write_text(manifest_path, json.dumps(manifest, ensure_ascii=False, indent=2))
+                hashes[MANIFEST_FILE] = manifest_hash
+                self._last_write[name] = time.monotonic()
+                self._update_index(name, _index_entry(project_dir.name, manifest))
+            return True
+        except Exception as e:
+            print(f"プロジェクト保存エラー: {e}")
+            return False
+
+    def _load_from_dir(self, project_dir: Path) -> NovelProject:
+        """基本情報だけを読み込み、各部分は初回アクセス時に読み込むよう設定"""
+        manifest = _read_manifest(project_dir)
+
+        writing_config = manifest.get('writing_config')
+        novel_summary = manifest.get('novel_summary')
+        project = NovelProject(
+            project_name=manifest['project_name'],
+            created_at=manifest.get('created_at') or datetime.now().isoformat(),
+            updated_at=manifest.get('updated_at') or datetime.now().isoformat(),
+            selected_setting_index=manifest.get('selected_setting_index'),
+            selected_plot_index=manifest.get('selected_plot_index'),
+            writing_config=WritingConfig.from_dict(writing_config) if writing_config else None,
+            novel_summary=NovelSummary.from_dict(novel_summary) if novel_summary else None,
+            extra=manifest.get('extra') or {}
         )
-        return self.base_dir / f"{safe_name}.json"
+
+        with self._lock:
+            counts = dict(manifest.get('counts') or {})
+            self._saved_counts[project.project_name] = counts
+            hashes = {}
+            self._saved_hashes[project.project_name] = hashes
+            hashes[MANIFEST_FILE] = _hash_text(
+                json.dumps(self._manifest_data(project, counts), ensure_ascii=False, sort_keys=True)
+            )
+
+        for section in SECTION_NAMES:
+            file_path = project_dir / SECTION_FILES[section]
+            if file_path.exists():
+                project.set_lazy_field(section, self._section_loader(hashes, section, file_path))
+        return project
+
+    def _section_loader(self, hashes: Dict[str, str], name: str, file_path: Path) -> Callable:
+        """部分ファイルを読み込む関数を作成（読み込んだ内容のハッシュも記録する）"""
+        def load():
+            with open(file_path, 'rb') as f:
+                payload, storage_format = serialization.unpack(f.read())
+            with self._lock:
+                hashes[name] = _hash_bytes(payload)
+            return section_from_data(
+                name, serialization.decode(payload, storage_format, text=name == "novel_text")
+            )
+        return load
+
+    def _migrate_legacy(self, legacy_path: Path) -> Optional[NovelProject]:
+        """1ファイル形式のプロジェクトを読み込み、フォルダ形式で保存し直す
+
+        ファイルの中身が壊れている場合は LEGACY_PARSE_ERRORS の例外を送出する。
+        書き込みに失敗した場合は None を返し、元のファイルは次の移行のためにそのまま残す。
+        """
+        with open(legacy_path, 'r', encoding='utf-8') as f:
+            project = NovelProject.from_json(f.read())
+
+        with self._lock:
+            if self._resolve_project_dir(project.project_name):
+                # 同じ名前のフォルダ形式のほうが新しいので、古い内容では上書きしない
+                legacy_path.replace(legacy_path.with_suffix('.json.bak'))
+                print(f"{legacy_path.name} は同じ名前のプロジェクトがあるため移行せずに残しました")
+                return None
+            migrated = self._write(project)
+        if not migrated:
+            return None
+        # 元のファイルは念のため残しておく
+        legacy_path.replace(legacy_path.with_suffix('.json.bak'))
+        return project
+
+    def _resolve_project_dir(self, project_name: str) -> Optional[Path]:
+        """既存のプロジェクトフォルダを探す（名前だけのフォルダなら現在の名前に移す）"""
+        project_dir = self._get_project_dir(project_name)
+        if (project_dir / MANIFEST_FILE).exists():
+            return project_dir
+
+        # 記号を置き換えただけのフォルダ名は別の名前と重なりうるので中身の名前も確認する
+        old_dir = self.base_dir / _safe_name(project_name)
+        if (old_dir / MANIFEST_FILE).exists() and _read_manifest(old_dir).get('project_name') == project_name:
+            old_dir.rename(project_dir)
+            return project_dir
+        return None
+
+    def _current_index(self) -> Dict[str, Dict]:
+        """索引を取得（フォルダの中身と食い違っていれば作り直す）
+
+        フォルダの中身は、索引のファイルかフォルダ自体が前回の確認から変わったときだけ調べる。
+        """
+        if self._folder_state() == self._verified_state:
+            return self._read_index()
+
+        index = self._read_index()
+        indexed = {entry['dir'] for entry in index.values()}
+        on_disk = {
+            name for name in os.listdir(self.base_dir)
+            if not name.startswith('.') and name not in (INDEX_FILE, INDEX_LOG_FILE)
+        }
+        # 索引にない名前だけ、プロジェクトかどうかを確かめる
+        unknown = [
+            name for name in on_disk - indexed
+            if name.endswith('.json') or (self.base_dir / name / MANIFEST_FILE).exists()
+        ]
+        if unknown or not indexed <= on_disk:
+            index = self._rebuild_index()
+            if self._legacy_paths():
+                # 書き込みに失敗して残った古い形式のファイルは、次の一覧表示で移行をやり直す
+                return index
+        self._verified_state = self._folder_state()
+        return index
+
+    def _folder_state(self) -> tuple:
+        """索引のファイルの状態とフォルダの更新時刻（項目が増減すると変わる）"""
+        return (*self._index_file_signature(), os.stat(self.base_dir).st_mtime_ns)
+
+    def _read_index(self) -> Dict[str, Dict]:
+        """索引を読み込む（前回からファイルが変わっていなければ読み直さない）
+
+        索引ファイルの内容に、追記ファイルの更新を順に当てはめたものが現在の索引。
+        """
+        signature = self._index_file_signature()
+        if signature == self._index_signature:
+            return self._index
+
+        index = {}
+        try:
+            with open(self.base_dir / INDEX_FILE, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == INDEX_VERSION:
+                index = data.get('projects', {})
+        except (FileNotFoundError, ValueError):
+            pass
+
+        self._index_log_lines = 0
+        self._index_log_torn = False
+        try:
+            with open(self.base_dir / INDEX_LOG_FILE, 'r', encoding='utf-8') as f:
+                for line in f:
+                    self._index_log_torn = not line.endswith("\n")
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 書き込み途中で止まった行は無視する
+                        continue
+                    _apply_index_record(index, record['name'], record.get('entry'))
+                    self._index_log_lines += 1
+        except FileNotFoundError:
+            pass
+
+        self._index = index
+        self._index_signature = signature
+        return self._index
+
+    def _write_index(self, index: Dict[str, Dict]) -> None:
+        """索引ファイル全体を書き直し、追記ファイルを空にする"""
+        data = {'version': INDEX_VERSION, 'projects': index}
+        _atomic_write_text(self.base_dir / INDEX_FILE, json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+        try:
+            os.unlink(self.base_dir / INDEX_LOG_FILE)
+        except FileNotFoundError:
+            pass
+        self._index = index
+        self._index_log_lines = 0
+        self._index_signature = self._index_file_signature()
+
+    def _update_index(self, project_name: str, entry: Optional[Dict]) -> None:
+        """索引のプロジェクト1件を更新（entry が None なら削除）
+
+        索引全体は書き直さず、追記ファイルに1行追加する。
+        """
+        index = self._read_index()
+        if entry is None and project_name not in index:
+            return
+
+        record = json.dumps({'name': project_name, 'entry': entry}, ensure_ascii=False)
+        with open(self.base_dir / INDEX_LOG_FILE, 'a', encoding='utf-8') as f:
+            # 途中で止まった行があれば、その行とつながらないよう改行してから書く
+            f.write(("\n" if self._index_log_torn else "") + record + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        _apply_index_record(index, project_name, entry)
+        self._index_log_lines += 1
+        self._index_log_torn = False
+
+        if self._index_log_lines >= INDEX_LOG_COMPACT_LINES:
+            self._write_index(index)
+        else:
+            self._index_signature = self._index_file_signature()
+
+    def _index_file_signature(self) -> tuple:
+        """索引ファイルの更新時刻と追記ファイルの大きさ（ファイルがなければ None）"""
+        signature = []
+        for file_name, attribute in ((INDEX_FILE, 'st_mtime_ns'), (INDEX_LOG_FILE, 'st_size')):
+            try:
+                signature.append(getattr(os.stat(self.base_dir / file_name), attribute))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _legacy_paths(self) -> List[Path]:
+        """まだ移行していない1ファイル形式のプロジェクト"""
+        return [path for path in self.base_dir.glob("*.json") if path.name != INDEX_FILE]
+
+    def _rebuild_index(self) -> Dict[str, Dict]:
+        """各プロジェクトの基本情報から索引を作り直す（古い形式のプロジェクトはここで移行する）"""
+        for legacy_path in self._legacy_paths():
+            try:
+                self._migrate_legacy(legacy_path)
+            except LEGACY_PARSE_ERRORS as e:
+                # 読めないファイルは一覧を表示するたびに移行をやり直さないよう、名前を変えて残す
+                failed_path = legacy_path.with_suffix('.json.failed')
+                legacy_path.replace(failed_path)
+                print(f"プロジェクト移行エラー: {legacy_path.name}: {e}")
+                print(f"移行できなかったファイルを {failed_path.name} に移しました")
+            except Exception as e:
+                # 書き込みの失敗（ディスクの空き不足など）は一時的なものとして次の一覧表示でやり直す
+                print(f"プロジェクト移行エラー: {legacy_path.name}: {e}")
+
+        index = {}
+        for project_dir in self.base_dir.iterdir():
+            if not (project_dir / MANIFEST_FILE).exists():
+                continue
+            name = _read_manifest(project_dir)['project_name']
+            if project_dir.name != self._get_project_dir(name).name:
+                project_dir = self._resolve_project_dir(name) or project_dir
+
+            manifest = _read_manifest(project_dir)
+            if 'counts' not in manifest:
+                # 件数を記録していなかった頃の形式は、一度すべて読み込んで保存し直す
+                project = self._load_from_dir(project_dir)
+                for section in SECTION_NAMES:
+                    getattr(project, section)
+                self._write(project)
+                manifest = _read_manifest(project_dir)
+            index[name] = _index_entry(project_dir.name, manifest)
+
+        self._write_index(index)
+        return index
+
+    @staticmethod
+    def _manifest_data(project: NovelProject, counts: Dict[str, int]) -> Dict:
+        """基本情報（更新日時を除く）"""
+        return {
+            'format_version': STORAGE_FORMAT_VERSION,
+            'schema_version': SCHEMA_VERSION,
+            'project_name': project.project_name,
+            'created_at': project.created_at,
+            'selected_setting_index': project.selected_setting_index,
+            'selected_plot_index': project.selected_plot_index,
+            'writing_config': asdict(project.writing_config) if project.writing_config else None,
+            'novel_summary': asdict(project.novel_summary) if project.novel_summary else None,
+            'counts': dict(counts),
+            'extra': dict(project.extra),
+        }
+
+    def _get_project_dir(self, project_name: str) -> Path:
+        """プロジェクトフォルダのパスを取得
+
+        記号の置き換えで別の名前と重ならないよう、名前のハッシュを付ける。
+        """
+        digest = hashlib.sha1(project_name.encode('utf-8')).hexdigest()[:8]
+        return self.base_dir / f"{_safe_name(project_name)[:80]}-{digest}"
+
+    def _get_legacy_path(self, project_name: str) -> Path:
+        """1ファイル形式のプロジェクトファイルのパスを取得"""
+        return self.base_dir / f"{_safe_name(project_name)}.json"
+
+
+def create_storage() -> BaseProjectStorage:
+    """環境変数で選んだ保存先のストレージを作成
+
+    AI_NOVELIST_STORAGE が "sqlite" なら SQLite（AI_NOVELIST_SQLITE_PATH）、
+    それ以外はプロジェクトごとのフォルダ（data/projects）に保存する。
+    """
+    backend = os.getenv("AI_NOVELIST_STORAGE", "files").strip().lower()
+    if backend == "sqlite":
+        from .sqlite_storage import SQLiteProjectStorage
+        return SQLiteProjectStorage(os.getenv("AI_NOVELIST_SQLITE_PATH", "data/projects.db"))
+    if backend != "files":
+        raise ValueError(f"不明なストレージの種類です: {backend}")
+    return ProjectStorage()
+
+
+def _safe_name(project_name: str) -> str:
+    """ファイル名に使えない文字を置換"""
+    return "".join(
+        c if c.isalnum() or c in (' ', '_', '-') else '_'
+        for c in project_name
+    )
+
+
+def _read_manifest(project_dir: Path) -> Dict:
+    with open(project_dir / MANIFEST_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _legacy_project_name(legacy_path: Path) -> Optional[str]:
+    with open(legacy_path, 'r', encoding='utf-8') as f:
+        return json.load(f).get('project_name')
+
+
+def _loaded_counts(project: NovelProject) -> Dict[str, int]:
+    """読み込み済みの部分の件数"""
+    return {
+        section: len(getattr(project, section))
+        for section in SECTION_NAMES
+        if project.is_loaded(section)
+    }
+
+
+def _index_entry(dir_name: str, manifest: Dict) -> Dict:
+    """基本情報から索引の1件分を作成"""
+    return {
+        'dir': dir_name,
+        'created_at': manifest.get('created_at', ''),
+        'updated_at': manifest.get('updated_at', ''),
+        'counts': manifest.get('counts', {}),
+        'has_writing_config': bool(manifest.get('writing_config')),
+    }
+
+
+def _apply_index_record(index: Dict[str, Dict], project_name: str, entry: Optional[Dict]) -> None:
+    if entry is None:
+        index.pop(project_name, None)
+    else:
+        index[project_name] = entry
+
+
+def _info_from_entry(name: str, entry: Dict) -> ProjectInfo:
+    return ProjectInfo(
+        name=name,
+        created_at=entry.get('created_at', ''),
+        updated_at=entry.get('updated_at', ''),
+        counts=dict(entry.get('counts', {})),
+        has_writing_config=entry.get('has_writing_config', False)
+    )
+
+
+def _hash_text(content: str) -> str:
+    return _hash_bytes(content.encode('utf-8'))
+
+
+def _hash_bytes(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def _atomic_write_text(file_path: Path, content: str) -> None:
+    """一時ファイルに書き込んでからリネームし、書きかけのファイルを残さない"""
+    _atomic_write_bytes(file_path, content.encode('utf-8'))
+
+
+def _atomic_write_bytes(file_path: Path, content: bytes) -> None:
+    """一時ファイルに書き込んでからリネームし、書きかけのファイルを残さない"""
+    fd, tmp_path = tempfile.mkstemp(dir=file_path.parent, prefix=f".{file_path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
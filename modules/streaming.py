@@ -0,0 +1,77 @@
+"""
+ストリーミング執筆の補助
+生成中のテキストを逐次表示しつつ、途中経過をプロジェクトに保存する
+"""
+import time
+from typing import Callable, Iterable, Optional
+
+from .data_models import NovelProject
+from .storage import BaseProjectStorage
+
+
+# 途中経過を保存する間隔（文字数・秒数のどちらかを超えたら保存）
+DEFAULT_CHECKPOINT_CHARS = 500
+DEFAULT_CHECKPOINT_SECONDS = 5.0
+
+
+class StreamInterrupted(Exception):
+    """ストリームの途中で失敗した（error は元の例外）
+
+    received_chars は今回受け取って保存した文字数。0 なら本文は書き換えていない。
+    """
+
+    def __init__(self, error: Exception, received_chars: int):
+        self.error = error
+        self.received_chars = received_chars
+        super().__init__(str(error))
+
+
+def stream_into_project(
+    chunks: Iterable[str],
+    project: NovelProject,
+    storage: BaseProjectStorage,
+    on_update: Optional[Callable[[str], None]] = None,
+    checkpoint_chars: int = DEFAULT_CHECKPOINT_CHARS,
+    checkpoint_seconds: float = DEFAULT_CHECKPOINT_SECONDS,
+    base: str = ""
+) -> str:
+    """ストリームを読み込み、novel_text に途中経過を保存しながら全文を返す
+
+    base を指定すると、生成したテキストを base の後ろに続けて novel_text にする
+    （on_update には生成した部分だけを渡す）。
+    ストリームの途中で例外が発生した場合は、それまでのテキストを保存してから
+    StreamInterrupted を送出する。接続が切れても生成済みの本文は失われない。
+    """
+    # 受け取った断片はこの文字列に直接つなげる（断片ごとに join し直すと全体で文字数の2乗の時間がかかる）
+    generated = ""
+    saved_at = 0
+    last_save_time = time.monotonic()
+
+    def checkpoint(text: str) -> str:
+        nonlocal saved_at, last_save_time
+        project.novel_text = base + text
+        storage.save_project(project)
+        saved_at = len(text)
+        last_save_time = time.monotonic()
+        return project.novel_text
+
+    try:
+        for chunk in chunks:
+            if not chunk:
+                continue
+            generated += chunk
+
+            if on_update:
+                on_update(generated)
+
+            if (len(generated) - saved_at >= checkpoint_chars
+                    or time.monotonic() - last_save_time >= checkpoint_seconds):
+                checkpoint(generated)
+    except BaseException as e:
+        if len(generated) > saved_at:
+            checkpoint(generated)
+        if isinstance(e, Exception):
+            raise StreamInterrupted(e, len(generated)) from e
+        raise
+
+    return checkpoint(generated)
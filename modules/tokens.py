@@ -0,0 +1,190 @@
+"""
+トークン数と料金の見積もり
+API を呼び出さずに、日本語のテキストのトークン数をプロバイダーごとの目安で見積もる
+
+トークナイザーはプロバイダーごとに異なり、日本語は特に差が大きいため、
+文字の種類（漢字・かな・英数字など）ごとに1文字あたりのトークン数を持たせている。
+"""
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+
+@dataclass(frozen=True)
+class TokenRates:
+    """文字の種類ごとの1文字あたりのトークン数"""
+    kanji: float
+    kana: float
+    ascii: float
+    space: float
+    other: float  # 句読点・記号・全角英数字など
+    overhead: int = 10  # 1回の呼び出しごとに加わるトークン数（メッセージの区切りなど）
+
+
+# プロバイダーごとの目安（日本語の小説・プロンプトで数えた値の平均に近づけたもの）
+TOKEN_RATES = {
+    "anthropic": TokenRates(kanji=1.1, kana=0.9, ascii=0.3, space=0.2, other=0.9),
+    "gemini": TokenRates(kanji=0.75, kana=0.5, ascii=0.25, space=0.15, other=0.6),
+    "openai": TokenRates(kanji=0.8, kana=0.6, ascii=0.25, space=0.15, other=0.7),
+}
+DEFAULT_PROVIDER = "anthropic"
+
+# 小説の本文に含まれる文字の種類の割合（出力のトークン数の見積もりに使う）
+PROSE_MIX = {"kanji": 0.3, "kana": 0.58, "other": 0.1, "space": 0.02}
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    """モデルの上限と料金（料金は100万トークンあたりの米ドル）"""
+    provider: str
+    context_window: int
+    max_output_tokens: int
+    input_price: float
+    output_price: float
+
+
+# API のモデル名ごとの上限と料金
+MODEL_SPECS = {
+    "claude-3-5-haiku-20241022": ModelSpec("anthropic", 200_000, 8_192, 0.80, 4.00),
+    "claude-sonnet-4-20250514": ModelSpec("anthropic", 200_000, 64_000, 3.00, 15.00),
+    # 実験版は無料だが、予算の目安として正式版の料金で見積もる
+    "gemini-2.0-flash-exp": ModelSpec("gemini", 1_048_576, 8_192, 0.10, 0.40),
+    "gemini-2.0-flash-thinking-exp-1219": ModelSpec("gemini", 32_767, 8_192, 0.10, 0.40),
+}
+
+# 登録されていないモデルの上限（小さめに見積もる）
+FALLBACK_SPEC = ModelSpec(DEFAULT_PROVIDER, 32_000, 4_096, 3.00, 15.00)
+
+_KANJI = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff々〆]")
+_KANA = re.compile(r"[\u3040-\u30ff\uff66-\uff9f]")
+_ASCII = re.compile(r"[A-Za-z0-9]")
+_SPACE = re.compile(r"\s")
+
+
+@dataclass
+class CallEstimate:
+    """1回の呼び出しの見積もり"""
+    model: str
+    input_tokens: int
+    output_tokens: int
+    max_output_tokens: int
+    context_window: int
+    cost_usd: float
+
+    @property
+    def fits_context(self) -> bool:
+        """入力と出力の上限がコンテキストに収まるか"""
+        return self.input_tokens + self.max_output_tokens <= self.context_window
+
+    @property
+    def output_may_truncate(self) -> bool:
+        """期待する出力が出力の上限を超え、途中で打ち切られそうか"""
+        return self.output_tokens > self.max_output_tokens
+
+
+def model_spec(model: str) -> ModelSpec:
+    """API のモデル名からモデルの上限と料金を取得"""
+    return MODEL_SPECS.get(model, FALLBACK_SPEC)
+
+
+def estimate_tokens(text: str, provider: str = DEFAULT_PROVIDER) -> int:
+    """テキストのトークン数を見積もる"""
+    rates = TOKEN_RATES.get(provider, TOKEN_RATES[DEFAULT_PROVIDER])
+    kanji = len(_KANJI.findall(text))
+    kana = len(_KANA.findall(text))
+    ascii_chars = len(_ASCII.findall(text))
+    space = len(_SPACE.findall(text))
+    other = len(text) - kanji - kana - ascii_chars - space
+    tokens = (
+        kanji * rates.kanji
+        + kana * rates.kana
+        + ascii_chars * rates.ascii
+        + space * rates.space
+        + other * rates.other
+    )
+    return int(tokens + 0.5) + rates.overhead
+
+
+def estimate_prose_tokens(chars: int, provider: str = DEFAULT_PROVIDER) -> int:
+    """chars 文字の日本語の小説の本文のトークン数を見積もる"""
+    rates = TOKEN_RATES.get(provider, TOKEN_RATES[DEFAULT_PROVIDER])
+    per_char = sum(getattr(rates, kind) * share for kind, share in PROSE_MIX.items())
+    return int(chars * per_char + 0.5)
+
+
+def estimate_call(
+    model: str,
+    prompt: str,
+    expected_output_chars: int,
+    max_output_tokens: Optional[int] = None,
+    spec: Optional[ModelSpec] = None
+) -> CallEstimate:
+    """1回の呼び出しの入力・出力のトークン数と料金を見積もる
+
+    max_output_tokens は呼び出し時に指定する出力の上限（省略するとモデルの上限）。
+    spec は MODEL_SPECS にないモデル（ローカルのモデルなど）の上限と料金。
+    """
+    spec = spec or model_spec(model)
+    input_tokens = estimate_tokens(prompt, spec.provider)
+    output_tokens = estimate_prose_tokens(expected_output_chars, spec.provider)
+    max_output = min(max_output_tokens or spec.max_output_tokens, spec.max_output_tokens)
+    return CallEstimate(
+        model=model,
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        max_output_tokens=max_output,
+        context_window=spec.context_window,
+        cost_usd=_cost(spec, input_tokens, min(output_tokens, max_output))
+    )
+
+
+def cost_usd(model: str, input_tokens: int, output_tokens: int) -> float:
+    """トークン数から料金（米ドル）を計算"""
+    return _cost(model_spec(model), input_tokens, output_tokens)
+
+
+def _cost(spec: ModelSpec, input_tokens: int, output_tokens: int) -> float:
+    return (input_tokens * spec.input_price + output_tokens * spec.output_price) / 1_000_000
+
+
+def split_to_token_budget(text: str, budget: int, provider: str = DEFAULT_PROVIDER) -> List[str]:
+    """テキストを1つあたり budget トークン以内になるよう、段落（なければ文字数）で分割"""
+    if estimate_tokens(text, provider) <= budget:
+        return [text]
+
+    rates = TOKEN_RATES.get(provider, TOKEN_RATES[DEFAULT_PROVIDER])
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = rates.overhead
+    for paragraph in text.splitlines(keepends=True):
+        tokens = estimate_tokens(paragraph, provider) - rates.overhead
+        if current and current_tokens + tokens > budget:
+            chunks.append("".join(current))
+            current, current_tokens = [], rates.overhead
+        if rates.overhead + tokens > budget:
+            # 1段落で上限を超える場合は文字数で切る
+            step = max(1, len(paragraph) * (budget - rates.overhead) // tokens)
+            chunks.extend(paragraph[i:i + step] for i in range(0, len(paragraph), step))
+            continue
+        current.append(paragraph)
+        current_tokens += tokens
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def format_estimate(estimate: CallEstimate) -> str:
+    """画面に表示する見積もり"""
+    return (
+        f"入力 約{estimate.input_tokens:,}トークン / 出力 約{estimate.output_tokens:,}トークン"
+        f"（上限 {estimate.max_output_tokens:,}） / 約${estimate.cost_usd:.4f}"
+    )
+
+
+def summarize_estimates(estimates: List[CallEstimate]) -> Dict[str, float]:
+    """複数の呼び出しの見積もりを合計"""
+    return {
+        "input_tokens": sum(e.input_tokens for e in estimates),
+        "output_tokens": sum(min(e.output_tokens, e.max_output_tokens) for e in estimates),
+        "cost_usd": sum(e.cost_usd for e in estimates),
+    }
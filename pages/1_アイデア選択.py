@@ -4,6 +4,9 @@ AIが提示するフレーズから選んでアイデアを膨らませる
 """
 import streamlit as st
 from modules.data_models import IdeaFragment
+from modules.dedup import FragmentIndex
+from modules.jobs import sync_session_project
+from modules.retry import AIClientError
 
 st.set_page_config(page_title="アイデア選択", page_icon="💡", layout="wide")
 
@@ -15,7 +18,8 @@ if 'current_project' not in st.session_state or st.session_state.current_project
         st.switch_page("app.py")
     st.stop()
 
-project = st.session_state.current_project
+# バックグラウンドのジョブが完了していれば、保存された結果を読み直す
+project = sync_session_project(st.session_state, st.session_state.job_runner, st.session_state.storage)
 ai_client = st.session_state.ai_client
 storage = st.session_state.storage
 
@@ -31,26 +35,69 @@ with tab1:
     col1, col2 = st.columns([3, 1])
     with col1:
         fragment_count = st.slider("生成する断片の数", 10, 30, 20)
+        accumulate = st.checkbox(
+            "これまでの断片に追加する（似た断片は除外）",
+            value=True,
+            key="accumulate_fragments"
+        )
+        force_fresh = False
+        if ai_client.cache:
+            force_fresh = st.checkbox(
+                "キャッシュを使わずに新しく生成",
+                help="同じ条件で生成済みの結果があっても、新しいバリエーションを生成します",
+                key="force_fresh_fragments"
+            )
     with col2:
-        if st.button("生成", type="primary", use_container_width=True):
-            with st.spinner("AIがアイデアを生成中..."):
-                fragments = ai_client.generate_idea_fragments(fragment_count)
-
-                # IdeaFragmentオブジェクトに変換
-                project.idea_fragments = [
-                    IdeaFragment(text=f, selected=False)
-                    for f in fragments
-                ]
-                storage.save_project(project)
-                st.success(f"{len(fragments)}個のアイデア断片を生成しました")
+        generate_clicked = st.button("生成", type="primary", use_container_width=True)
+
+    if generate_clicked:
+        existing = project.idea_fragments if accumulate else []
+        index = FragmentIndex(f.text for f in existing)
+        new_fragments = []
+        skipped_count = 0
+
+        # 番号付きの行が届くたびに表示する
+        st.caption("AIがアイデアを生成中...")
+        live_placeholder = st.empty()
+        generation_error = None
+        try:
+            for text in ai_client.generate_idea_fragments_stream(
+                fragment_count,
+                force_fresh=force_fresh,
+                exclude=[f.text for f in existing]
+            ):
+                if index.add(text):
+                    new_fragments.append(IdeaFragment(text=text, selected=False))
+                    live_placeholder.markdown("\n".join(f"- {f.text}" for f in new_fragments))
+                else:
+                    skipped_count += 1
+        except AIClientError as e:
+            generation_error = e
+            st.error(f"アイデアの生成に失敗しました: {e}")
+
+        if new_fragments:
+            if not accumulate:
+                # 番号で管理しているチェックボックスの状態をリセット
+                for key in [k for k in st.session_state if str(k).startswith("fragment_")]:
+                    del st.session_state[key]
+            project.idea_fragments = existing + new_fragments
+            storage.save_project(project)
+            message = f"{len(new_fragments)}個のアイデア断片を追加しました"
+            if skipped_count:
+                message += f"（似た断片{skipped_count}個を除外）"
+            st.success(message)
+            if generation_error is None:
                 st.rerun()
+        elif generation_error is None:
+            st.warning(f"新しいアイデア断片はありませんでした（似た断片{skipped_count}個を除外）")
 
     # 生成されたフレーズを表示＆選択
     if project.idea_fragments:
-        st.markdown("### 生成されたアイデア断片")
+        st.markdown(f"### 生成されたアイデア断片（{len(project.idea_fragments)}個）")
         st.markdown("興味深いものにチェックを入れてください（複数選択可）")
 
         # チェックボックスで選択
+        selection_changed = False
         for i, fragment in enumerate(project.idea_fragments):
             key = f"fragment_{i}"
             checked = st.checkbox(
@@ -58,14 +105,30 @@ with tab1:
                 value=fragment.selected,
                 key=key
             )
-            project.idea_fragments[i].selected = checked
-
-        # 選択を保存
-        if st.button("選択を保存", use_container_width=True):
-            storage.save_project(project)
-            st.success("選択を保存しました")
-            selected_count = sum(1 for f in project.idea_fragments if f.selected)
-            st.info(f"{selected_count}個のアイデアを選択中")
+            if checked != fragment.selected:
+                project.idea_fragments[i].selected = checked
+                selection_changed = True
+
+        # 選択の変更は自動保存（連続した変更はまとめて書き込む）
+        if selection_changed:
+            storage.request_save(project)
+
+        col1, col2 = st.columns(2)
+        with col1:
+            # 選択を保存
+            if st.button("選択を保存", use_container_width=True):
+                storage.save_project(project)
+                st.success("選択を保存しました")
+                selected_count = sum(1 for f in project.idea_fragments if f.selected)
+                st.info(f"{selected_count}個のアイデアを選択中")
+        with col2:
+            # 未選択の断片を整理
+            if st.button("未選択の断片を削除", use_container_width=True):
+                project.idea_fragments = [f for f in project.idea_fragments if f.selected]
+                for key in [k for k in st.session_state if str(k).startswith("fragment_")]:
+                    del st.session_state[key]
+                storage.save_project(project)
+                st.rerun()
 
 with tab2:
     st.subheader("選択したアイデアを膨らませる")
@@ -82,13 +145,25 @@ with tab2:
             for fragment in selected_fragments:
                 st.write(f"- {fragment.text}")
 
+        force_fresh = False
+        if ai_client.cache:
+            force_fresh = st.checkbox(
+                "キャッシュを使わずに新しく生成",
+                help="同じ条件で生成済みの結果があっても、新しいバリエーションを生成します",
+                key="force_fresh_expand"
+            )
+
         if st.button("アイデアを膨らませる", type="primary", use_container_width=True):
             with st.spinner("AIがアイデアを膨らませています..."):
                 selected_texts = [f.text for f in selected_fragments]
-                expanded_idea = ai_client.expand_ideas(selected_texts)
+                try:
+                    expanded_idea = ai_client.expand_ideas(selected_texts, force_fresh=force_fresh)
+                except AIClientError as e:
+                    st.error(f"アイデアを膨らませられませんでした: {e}")
+                    expanded_idea = None
 
                 # 膨らませたアイデアをリストに追加
-                if expanded_idea not in project.expanded_ideas:
+                if expanded_idea and expanded_idea not in project.expanded_ideas:
                     project.expanded_ideas.append(expanded_idea)
                     storage.save_project(project)
                     st.success("アイデアを膨らませました")
@@ -3,7 +3,9 @@
 膨らませたアイデアから物語の基本設定を決める
 """
 import streamlit as st
-from modules.data_models import Setting
+from modules.data_models import Setting, setting_revision_key
+from modules.jobs import sync_session_project
+from modules.retry import AIClientError
 
 st.set_page_config(page_title="設定決定", page_icon="⚙️", layout="wide")
 
@@ -14,8 +16,10 @@ if 'current_project' not in st.session_state or st.session_state.current_project
         st.switch_page("app.py")
     st.stop()
 
-project = st.session_state.current_project
+# バックグラウンドのジョブが完了していれば、保存された結果を読み直す
+project = sync_session_project(st.session_state, st.session_state.job_runner, st.session_state.storage)
 ai_client = st.session_state.ai_client
+async_ai_client = st.session_state.async_ai_client
 storage = st.session_state.storage
 
 st.title("⚙️ ステップ2: 設定決定")
@@ -47,17 +51,51 @@ st.divider()
 st.subheader("設定を生成")
 
 col1, col2 = st.columns([4, 1])
+with col1:
+    variant_count = st.number_input(
+        "同時に生成する数",
+        min_value=1,
+        max_value=5,
+        value=1,
+        help="複数の設定を並列に生成して比較できます",
+        key="variant_count_setting"
+    )
+    force_fresh = False
+    if ai_client.cache:
+        force_fresh = st.checkbox(
+            "キャッシュを使わずに新しく生成",
+            help="同じ条件で生成済みの結果があっても、新しいバリエーションを生成します",
+            key="force_fresh_setting"
+        )
 with col2:
     if st.button("設定を生成", type="primary", use_container_width=True):
         with st.spinner("AIが設定を生成中..."):
-            setting_text = ai_client.generate_setting(selected_idea)
+            if variant_count > 1:
+                # 複数のバリエーションを同時に生成
+                results = async_ai_client.run_variants(
+                    "generate_setting", variant_count, selected_idea, return_exceptions=True
+                )
+            else:
+                try:
+                    results = [ai_client.generate_setting(selected_idea, force_fresh=force_fresh)]
+                except AIClientError as e:
+                    results = [e]
+
+            setting_texts = [r for r in results if isinstance(r, str)]
+            errors = [r for r in results if not isinstance(r, str)]
 
             # 設定を追加
-            new_setting = Setting(text=setting_text)
-            project.settings.append(new_setting)
-            storage.save_project(project)
-            st.success("設定を生成しました")
-            st.rerun()
+            for setting_text in setting_texts:
+                new_setting = Setting(text=setting_text)
+                project.settings.append(new_setting)
+
+            if errors:
+                st.error(f"設定の生成に失敗しました: {errors[0]}")
+            if setting_texts:
+                storage.save_project(project)
+                st.success(f"設定を{len(setting_texts)}件生成しました")
+                if not errors:
+                    st.rerun()
 
 # 手動で設定を追加
 with st.expander("手動で設定を入力"):
@@ -93,8 +131,9 @@ if project.settings:
                 # この設定を選択
                 is_selected = (project.selected_setting_index == i)
                 if st.checkbox("この設定を使用", value=is_selected, key=f"select_setting_{i}"):
-                    project.selected_setting_index = i
-                    storage.save_project(project)
+                    if not is_selected:
+                        project.selected_setting_index = i
+                        storage.request_save(project)
 
             with col2:
                 if st.button("編集", key=f"edit_setting_{i}"):
@@ -102,7 +141,8 @@ if project.settings:
 
             with col3:
                 if st.button("削除", key=f"delete_setting_{i}"):
-                    project.settings.pop(i)
+                    removed = project.settings.pop(i)
+                    project.revisions.pop(setting_revision_key(removed), None)
                     if project.selected_setting_index == i:
                         project.selected_setting_index = None
                     elif project.selected_setting_index and project.selected_setting_index > i:
@@ -121,7 +161,7 @@ if project.settings:
                 col_a, col_b = st.columns(2)
                 with col_a:
                     if st.button("保存", key=f"save_edit_{i}"):
-                        project.settings[i].text = edited_text
+                        project.edit_text(setting_revision_key(setting), edited_text, label="手動編集")
                         storage.save_project(project)
                         st.session_state[f"editing_setting_{i}"] = False
                         st.rerun()
@@ -130,6 +170,27 @@ if project.settings:
                         st.session_state[f"editing_setting_{i}"] = False
                         st.rerun()
 
+                # 編集の履歴から戻す
+                revision_key = setting_revision_key(setting)
+                revisions = project.list_revisions(revision_key)
+                if len(revisions) > 1:
+                    revision_index = st.selectbox(
+                        "以前の版",
+                        list(reversed(range(len(revisions)))),
+                        format_func=lambda n, revisions=revisions: (
+                            f"版{n + 1}: {revisions[n].created_at[:16].replace('T', ' ')}"
+                            f"（{revisions[n].label or '編集'}）"
+                        ),
+                        key=f"setting_revision_{i}"
+                    )
+                    with st.expander("選択した版の内容"):
+                        st.write(project.get_revision(revision_key, revision_index))
+                    if st.button("この版に戻す", key=f"restore_setting_{i}"):
+                        project.restore_revision(revision_key, revision_index)
+                        storage.save_project(project)
+                        st.session_state[f"editing_setting_{i}"] = False
+                        st.rerun()
+
     # 選択状態の表示
     if project.selected_setting_index is not None:
         st.success(f"設定 {project.selected_setting_index + 1} を使用します")
@@ -3,7 +3,9 @@
 物語の流れを組み立てる
 """
 import streamlit as st
-from modules.data_models import Plot
+from modules.data_models import Plot, plot_revision_key
+from modules.jobs import sync_session_project
+from modules.retry import AIClientError
 
 st.set_page_config(page_title="プロット作成", page_icon="📋", layout="wide")
 
@@ -14,9 +16,12 @@ if 'current_project' not in st.session_state or st.session_state.current_project
         st.switch_page("app.py")
     st.stop()
 
-project = st.session_state.current_project
+# バックグラウンドのジョブが完了していれば、保存された結果を読み直す
+project = sync_session_project(st.session_state, st.session_state.job_runner, st.session_state.storage)
 ai_client = st.session_state.ai_client
+async_ai_client = st.session_state.async_ai_client
 storage = st.session_state.storage
+job_runner = st.session_state.job_runner
 
 st.title("📋 ステップ3: プロット作成")
 st.markdown("設定を基に、物語の流れを作成します。")
@@ -41,18 +46,89 @@ st.divider()
 st.subheader("プロットを生成")
 
 col1, col2 = st.columns([4, 1])
+with col1:
+    variant_count = st.number_input(
+        "同時に生成する数",
+        min_value=1,
+        max_value=5,
+        value=1,
+        help="複数のプロットを並列に生成して比較できます",
+        key="variant_count_plot"
+    )
+    force_fresh = False
+    if ai_client.cache:
+        force_fresh = st.checkbox(
+            "キャッシュを使わずに新しく生成",
+            help="同じ条件で生成済みの結果があっても、新しいバリエーションを生成します",
+            key="force_fresh_plot"
+        )
 with col2:
     if st.button("プロットを生成", type="primary", use_container_width=True):
         with st.spinner("AIがプロットを生成中..."):
-            plot_text = ai_client.generate_plot(selected_setting.text)
+            if variant_count > 1:
+                # 複数のバリエーションを同時に生成
+                results = async_ai_client.run_variants(
+                    "generate_plot", variant_count, selected_setting.text, return_exceptions=True
+                )
+            else:
+                try:
+                    results = [ai_client.generate_plot(selected_setting.text, force_fresh=force_fresh)]
+                except AIClientError as e:
+                    results = [e]
+
+            plot_texts = [r for r in results if isinstance(r, str)]
+            errors = [r for r in results if not isinstance(r, str)]
 
             # プロットを追加
-            new_plot = Plot(text=plot_text)
-            project.plots.append(new_plot)
-            storage.save_project(project)
-            st.success("プロットを生成しました")
+            for plot_text in plot_texts:
+                new_plot = Plot(text=plot_text)
+                project.plots.append(new_plot)
+
+            if errors:
+                st.error(f"プロットの生成に失敗しました: {errors[0]}")
+            if plot_texts:
+                storage.save_project(project)
+                st.success(f"プロットを{len(plot_texts)}件生成しました")
+                if not errors:
+                    st.rerun()
+
+    if st.button(
+        "バックグラウンドで生成",
+        use_container_width=True,
+        help="生成中も他のページで作業を続けられます。完了するとプロットに追加されます"
+    ):
+        for _ in range(variant_count):
+            job_runner.submit(project.project_name, "plot", {
+                "setting": selected_setting.text,
+                "force_fresh": force_fresh or variant_count > 1
+            })
+        st.rerun()
+
+
+def show_jobs():
+    """バックグラウンドの生成の状態"""
+    for job in job_runner.list_jobs(project.project_name, kinds=["plot"], limit=5):
+        col1, col2 = st.columns([5, 1])
+        elapsed = f"（{job.elapsed:.0f}秒）" if job.elapsed is not None else ""
+        col1.caption(f"{job.label}: {job.status_label}{elapsed} {job.error or job.result}")
+        if job.active and col2.button("取り消す", key=f"cancel_job_{job.id}"):
+            job_runner.cancel(job.id)
             st.rerun()
 
+
+@st.fragment(run_every=2)
+def poll_jobs():
+    """実行中のジョブの状態を2秒ごとに確認し、完了したらページ全体を更新して結果を表示する"""
+    if job_runner.last_finished_at(project.project_name) > st.session_state.jobs_synced_at.get(project.project_name, 0.0):
+        st.rerun()
+    show_jobs()
+
+
+if any(job.active for job in job_runner.list_jobs(project.project_name, kinds=["plot"], limit=5)):
+    poll_jobs()
+else:
+    show_jobs()
+
 # 手動でプロットを追加
 with st.expander("手動でプロットを入力"):
     manual_plot = st.text_area(
@@ -87,8 +163,9 @@ if project.plots:
                 # このプロットを選択
                 is_selected = (project.selected_plot_index == i)
                 if st.checkbox("このプロットを使用", value=is_selected, key=f"select_plot_{i}"):
-                    project.selected_plot_index = i
-                    storage.save_project(project)
+                    if not is_selected:
+                        project.selected_plot_index = i
+                        storage.request_save(project)
 
             with col2:
                 if st.button("編集", key=f"edit_plot_{i}"):
@@ -96,7 +173,8 @@ if project.plots:
 
             with col3:
                 if st.button("削除", key=f"delete_plot_{i}"):
-                    project.plots.pop(i)
+                    removed = project.plots.pop(i)
+                    project.revisions.pop(plot_revision_key(removed), None)
                     if project.selected_plot_index == i:
                         project.selected_plot_index = None
                     elif project.selected_plot_index and project.selected_plot_index > i:
@@ -115,7 +193,7 @@ if project.plots:
                 col_a, col_b = st.columns(2)
                 with col_a:
                     if st.button("保存", key=f"save_edit_{i}"):
-                        project.plots[i].text = edited_text
+                        project.edit_text(plot_revision_key(plot), edited_text, label="手動編集")
                         storage.save_project(project)
                         st.session_state[f"editing_plot_{i}"] = False
                         st.rerun()
@@ -124,6 +202,27 @@ if project.plots:
                         st.session_state[f"editing_plot_{i}"] = False
                         st.rerun()
 
+                # 編集の履歴から戻す
+                revision_key = plot_revision_key(plot)
+                revisions = project.list_revisions(revision_key)
+                if len(revisions) > 1:
+                    revision_index = st.selectbox(
+                        "以前の版",
+                        list(reversed(range(len(revisions)))),
+                        format_func=lambda n, revisions=revisions: (
+                            f"版{n + 1}: {revisions[n].created_at[:16].replace('T', ' ')}"
+                            f"（{revisions[n].label or '編集'}）"
+                        ),
+                        key=f"plot_revision_{i}"
+                    )
+                    with st.expander("選択した版の内容"):
+                        st.write(project.get_revision(revision_key, revision_index))
+                    if st.button("この版に戻す", key=f"restore_plot_{i}"):
+                        project.restore_revision(revision_key, revision_index)
+                        storage.save_project(project)
+                        st.session_state[f"editing_plot_{i}"] = False
+                        st.rerun()
+
     # 選択状態の表示
     if project.selected_plot_index is not None:
         st.success(f"プロット {project.selected_plot_index + 1} を使用します")
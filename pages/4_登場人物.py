@@ -4,6 +4,8 @@
 """
 import streamlit as st
 from modules.data_models import Character
+from modules.jobs import sync_session_project
+from modules.retry import AIClientError
 
 st.set_page_config(page_title="登場人物", page_icon="👥", layout="wide")
 
@@ -14,9 +16,11 @@ if 'current_project' not in st.session_state or st.session_state.current_project
         st.switch_page("app.py")
     st.stop()
 
-project = st.session_state.current_project
+# バックグラウンドのジョブが完了していれば、保存された結果を読み直す
+project = sync_session_project(st.session_state, st.session_state.job_runner, st.session_state.storage)
 ai_client = st.session_state.ai_client
 storage = st.session_state.storage
+job_runner = st.session_state.job_runner
 
 st.title("👥 ステップ4: 登場人物")
 st.markdown("物語のキャラクターを作成します。")
@@ -46,29 +50,88 @@ st.subheader("キャラクターを生成")
 col1, col2, col3 = st.columns([2, 2, 1])
 with col1:
     character_count = st.number_input("生成する人数", min_value=1, max_value=10, value=3)
+with col2:
+    force_fresh = False
+    if ai_client.cache:
+        force_fresh = st.checkbox(
+            "キャッシュを使わずに新しく生成",
+            help="同じ条件で生成済みの結果があっても、新しいバリエーションを生成します",
+            key="force_fresh_characters"
+        )
 with col3:
-    if st.button("キャラクター生成", type="primary", use_container_width=True):
-        with st.spinner("AIがキャラクターを生成中..."):
-            characters = ai_client.generate_characters(
-                selected_setting.text,
-                selected_plot.text,
-                character_count
-            )
+    generate_clicked = st.button("キャラクター生成", type="primary", use_container_width=True)
+    if st.button(
+        "バックグラウンドで生成",
+        use_container_width=True,
+        help="生成中も他のページで作業を続けられます。完了すると登場人物に追加されます"
+    ):
+        job_runner.submit(project.project_name, "characters", {
+            "setting": selected_setting.text,
+            "plot": selected_plot.text,
+            "count": character_count,
+            "force_fresh": force_fresh
+        })
+        st.rerun()
+
+if generate_clicked:
+    # キャラクターのJSONが閉じるたびに表示する
+    st.caption("AIがキャラクターを生成中...")
+    live_placeholder = st.empty()
+    new_characters = []
+    generation_error = None
+    try:
+        for char_data in ai_client.generate_characters_stream(
+            selected_setting.text,
+            selected_plot.text,
+            character_count,
+            force_fresh=force_fresh
+        ):
+            new_characters.append(Character(**char_data))
+            live_placeholder.markdown("\n".join(
+                f"- **{c.name}** ({c.role or '役割なし'}): {c.personality}"
+                for c in new_characters
+            ))
+    except AIClientError as e:
+        generation_error = e
+        st.error(f"キャラクターの生成に失敗しました: {e}")
+
+    if new_characters:
+        # キャラクターを追加
+        project.characters.extend(new_characters)
+        storage.save_project(project)
+        if len(new_characters) < character_count:
+            st.warning(f"{character_count}人中{len(new_characters)}人のキャラクターを生成しました")
+        else:
+            st.success(f"{len(new_characters)}人のキャラクターを生成しました")
+        if generation_error is None:
+            st.rerun()
 
-            # キャラクターを追加
-            for char_data in characters:
-                new_character = Character(
-                    name=char_data.get("name", "名前なし"),
-                    personality=char_data.get("personality", ""),
-                    background=char_data.get("background", ""),
-                    role=char_data.get("role", "")
-                )
-                project.characters.append(new_character)
 
-            storage.save_project(project)
-            st.success(f"{len(characters)}人のキャラクターを生成しました")
+
+def show_jobs():
+    """バックグラウンドの生成の状態"""
+    for job in job_runner.list_jobs(project.project_name, kinds=["characters"], limit=5):
+        col1, col2 = st.columns([5, 1])
+        elapsed = f"（{job.elapsed:.0f}秒）" if job.elapsed is not None else ""
+        col1.caption(f"{job.label}: {job.status_label}{elapsed} {job.error or job.result}")
+        if job.active and col2.button("取り消す", key=f"cancel_job_{job.id}"):
+            job_runner.cancel(job.id)
             st.rerun()
 
+
+@st.fragment(run_every=2)
+def poll_jobs():
+    """実行中のジョブの状態を2秒ごとに確認し、完了したらページ全体を更新して結果を表示する"""
+    if job_runner.last_finished_at(project.project_name) > st.session_state.jobs_synced_at.get(project.project_name, 0.0):
+        st.rerun()
+    show_jobs()
+
+
+if any(job.active for job in job_runner.list_jobs(project.project_name, kinds=["characters"], limit=5)):
+    poll_jobs()
+else:
+    show_jobs()
+
 # 手動でキャラクターを追加
 with st.expander("手動でキャラクターを追加"):
     col1, col2 = st.columns(2)
@@ -4,6 +4,7 @@
 """
 import streamlit as st
 from modules.data_models import WritingConfig
+from modules.jobs import sync_session_project
 
 st.set_page_config(page_title="執筆設定", page_icon="✍️", layout="wide")
 
@@ -14,7 +15,8 @@ if 'current_project' not in st.session_state or st.session_state.current_project
         st.switch_page("app.py")
     st.stop()
 
-project = st.session_state.current_project
+# バックグラウンドのジョブが完了していれば、保存された結果を読み直す
+project = sync_session_project(st.session_state, st.session_state.job_runner, st.session_state.storage)
 storage = st.session_state.storage
 
 st.title("✍️ ステップ5: 執筆設定")
@@ -71,16 +73,23 @@ with col2:
         index=["明るい", "暗い", "ミステリアス", "感動的", "コミカル", "緊張感のある", "ノスタルジック"].index(default_tone) if default_tone in ["明るい", "暗い", "ミステリアス", "感動的", "コミカル", "緊張感のある", "ノスタルジック"] else 0
     )
 
-    # 使用するAIモデル
+    # 使用するAIモデル（ローカルモデルは AI_LOCAL_BASE_URL を設定した場合だけ選べる）
+    model_labels = {
+        "haiku3.5": "Claude 3.5 Haiku (高速・コスト効率)",
+        "sonnet4.5": "Claude Sonnet 4.5 (高品質)",
+        "gemini2.5pro": "Gemini 2.5 Pro (思考型・高品質)",
+        "local": "ローカルモデル (OpenAI互換サーバー)"
+    }
+    ai_client = st.session_state.get('ai_client')
+    model_options = [
+        m for m in model_labels
+        if m != "local" or (ai_client and ai_client.provider_available("local"))
+    ]
     ai_model = st.selectbox(
         "使用するAIモデル（執筆用）",
-        ["haiku3.5", "sonnet4.5", "gemini2.5pro"],
-        index=["haiku3.5", "sonnet4.5", "gemini2.5pro"].index(default_model),
-        format_func=lambda x: {
-            "haiku3.5": "Claude 3.5 Haiku (高速・コスト効率)",
-            "sonnet4.5": "Claude Sonnet 4.5 (高品質)",
-            "gemini2.5pro": "Gemini 2.5 Pro (思考型・高品質)"
-        }[x]
+        model_options,
+        index=model_options.index(default_model) if default_model in model_options else 0,
+        format_func=lambda x: model_labels[x]
     )
 
 st.divider()
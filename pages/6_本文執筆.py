@@ -3,6 +3,15 @@
 チャットAI用のプロンプトを生成
 """
 import streamlit as st
+from modules.continuation import ContinuationWriter
+from modules.jobs import sync_session_project
+from modules.long_form import LongFormWriter
+from modules.retry import AIClientError
+from modules.streaming import StreamInterrupted, stream_into_project
+from modules.tokens import estimate_tokens, format_estimate, summarize_estimates
+
+# プロンプトを貼り付けるチャットAIのトークン数の数え方
+PLATFORM_PROVIDERS = {"claude": "anthropic", "chatgpt": "openai", "gemini": "gemini"}
 
 st.set_page_config(page_title="本文執筆", page_icon="📝", layout="wide")
 
@@ -13,9 +22,11 @@ if 'current_project' not in st.session_state or st.session_state.current_project
         st.switch_page("app.py")
     st.stop()
 
-project = st.session_state.current_project
+# バックグラウンドのジョブが完了していれば、保存された結果を読み直す
+project = sync_session_project(st.session_state, st.session_state.job_runner, st.session_state.storage)
 ai_client = st.session_state.ai_client
 storage = st.session_state.storage
+job_runner = st.session_state.job_runner
 
 st.title("📝 ステップ6: 本文執筆")
 st.markdown("設定をまとめて、チャットAI用のプロンプトを生成します。")
@@ -33,6 +44,17 @@ selected_plot = project.plots[project.selected_plot_index]
 characters = project.characters
 writing_config = project.writing_config
 
+# キャラクター情報を辞書に変換
+characters_data = [
+    {
+        "name": char.name,
+        "role": char.role,
+        "personality": char.personality,
+        "background": char.background
+    }
+    for char in characters
+]
+
 # 設定の確認
 with st.expander("執筆に使用する設定を確認"):
     st.markdown("### 設定")
@@ -84,17 +106,6 @@ with tab1:
         st.session_state.generated_prompt = None
 
     if st.button("📝 プロンプトを生成", type="primary", use_container_width=True):
-        # キャラクター情報を辞書に変換
-        characters_data = [
-            {
-                "name": char.name,
-                "role": char.role,
-                "personality": char.personality,
-                "background": char.background
-            }
-            for char in characters
-        ]
-
         # プロンプト生成
         prompt = ai_client.generate_novel_prompt(
             setting=selected_setting.text,
@@ -119,8 +130,11 @@ with tab1:
             key="prompt_display"
         )
 
-        # 文字数表示
-        st.caption(f"文字数: {len(st.session_state.generated_prompt):,}文字")
+        # 文字数とトークン数の目安を表示
+        prompt_tokens = estimate_tokens(
+            st.session_state.generated_prompt, PLATFORM_PROVIDERS.get(ai_platform, "anthropic")
+        )
+        st.caption(f"文字数: {len(st.session_state.generated_prompt):,}文字 / 推定 約{prompt_tokens:,}トークン")
 
         col1, col2, col3 = st.columns(3)
 
@@ -191,43 +205,264 @@ with tab2:
     st.warning("""
     **注意**: API経由での執筆には以下の制限があります：
 
-    - Claude Haiku: 最大8,192トークン（約4,000-6,000文字程度）
+    - 1回の出力はモデルの出力上限（トークン数）までで打ち切られます
     - コストが発生します
-    - 長編小説には不向きです
+    - 長編小説は一度に書き切れないため、「章ごとに執筆」を使用してください
 
     **推奨**: 「プロンプト生成」タブを使用してください。
     """)
 
-    if st.button("🤖 API経由で執筆する", use_container_width=True):
-        with st.spinner(f"AIが小説を執筆中... ({writing_config.ai_model} を使用)"):
-            # キャラクター情報を辞書に変換
-            characters_data = [
-                {
-                    "name": char.name,
-                    "role": char.role,
-                    "personality": char.personality,
-                    "background": char.background
-                }
-                for char in characters
-            ]
+    # 送信前にトークン数と料金を見積もる
+    novel_estimate = ai_client.estimate_novel(
+        setting=selected_setting.text,
+        plot=selected_plot.text,
+        characters=characters_data,
+        length=writing_config.length,
+        style=writing_config.style,
+        tone=writing_config.tone,
+        model=writing_config.ai_model
+    )
+    st.caption(f"見積もり（{writing_config.ai_model}）: {format_estimate(novel_estimate)}")
+    if not novel_estimate.fits_context:
+        st.error("入力がモデルの上限を超えるため、このモデルでは執筆できません。設定やプロットを短くしてください。")
+    elif novel_estimate.output_may_truncate:
+        st.warning(
+            f"{writing_config.length}の分量は出力上限（{novel_estimate.max_output_tokens:,}トークン）を"
+            "超える見込みのため、途中で打ち切られる可能性があります。"
+        )
 
-            # 小説を執筆
-            novel_text = ai_client.write_novel(
-                setting=selected_setting.text,
-                plot=selected_plot.text,
-                characters=characters_data,
-                length=writing_config.length,
-                style=writing_config.style,
-                tone=writing_config.tone,
-                model=writing_config.ai_model
-            )
+    force_fresh = False
+    if ai_client.cache:
+        force_fresh = st.checkbox(
+            "キャッシュを使わずに新しく生成",
+            help="同じ条件で生成済みの結果があっても、新しいバリエーションを生成します",
+            key="force_fresh_novel"
+        )
 
-            # 小説を保存
-            project.novel_text = novel_text
-            storage.save_project(project)
+    stream_mode = st.toggle(
+        "ストリーミング表示（生成中の本文を逐次表示・途中経過を自動保存）",
+        value=True
+    )
 
-            st.success("小説の執筆が完了しました！")
+    if st.button("🤖 API経由で執筆する", use_container_width=True, disabled=not novel_estimate.fits_context):
+        # 書き直す前の本文を履歴に残す
+        if project.novel_text and not project.novel_text.startswith("[生成プロンプト]"):
+            project.record_revision("novel_text", label="再執筆前")
+
+        if stream_mode:
+            st.caption(f"AIが小説を執筆中... ({writing_config.ai_model} を使用)")
+            with st.container(border=True):
+                stream_placeholder = st.empty()
+
+            try:
+                chunks = ai_client.write_novel_stream(
+                    setting=selected_setting.text,
+                    plot=selected_plot.text,
+                    characters=characters_data,
+                    length=writing_config.length,
+                    style=writing_config.style,
+                    tone=writing_config.tone,
+                    model=writing_config.ai_model,
+                    force_fresh=force_fresh
+                )
+                stream_into_project(
+                    chunks,
+                    project,
+                    storage,
+                    on_update=stream_placeholder.markdown
+                )
+            except StreamInterrupted as e:
+                # 最初の断片の前に失敗した場合、本文は前の版のまま
+                if e.received_chars:
+                    st.error(f"執筆中にエラーが発生しました: {e}（{e.received_chars:,}文字まで保存済み）")
+                else:
+                    st.error(f"執筆中にエラーが発生しました: {e}")
+            except Exception as e:
+                st.error(f"執筆中にエラーが発生しました: {e}")
+            else:
+                project.record_revision("novel_text", label="AI執筆")
+                storage.save_project(project)
+                st.success("小説の執筆が完了しました！")
+                st.rerun()
+        else:
+            with st.spinner(f"AIが小説を執筆中... ({writing_config.ai_model} を使用)"):
+                # 小説を執筆
+                try:
+                    novel_text = ai_client.write_novel(
+                        setting=selected_setting.text,
+                        plot=selected_plot.text,
+                        characters=characters_data,
+                        length=writing_config.length,
+                        style=writing_config.style,
+                        tone=writing_config.tone,
+                        model=writing_config.ai_model,
+                        force_fresh=force_fresh
+                    )
+                except AIClientError as e:
+                    st.error(f"執筆中にエラーが発生しました: {e}")
+                else:
+                    # 小説を保存
+                    project.novel_text = novel_text
+                    project.record_revision("novel_text", label="AI執筆")
+                    storage.save_project(project)
+
+                    st.success("小説の執筆が完了しました！")
+                    st.rerun()
+
+    if st.button(
+        "⏳ バックグラウンドで執筆する",
+        use_container_width=True,
+        disabled=not novel_estimate.fits_context,
+        help="執筆中も他のページで作業を続けられます。途中経過も本文に保存されます"
+    ):
+        job_runner.submit(project.project_name, "novel", {
+            "setting": selected_setting.text,
+            "plot": selected_plot.text,
+            "characters": characters_data,
+            "length": writing_config.length,
+            "style": writing_config.style,
+            "tone": writing_config.tone,
+            "model": writing_config.ai_model,
+            "force_fresh": force_fresh
+        })
+        st.rerun()
+
+    def show_jobs():
+        """バックグラウンドの執筆の状態"""
+        for job in job_runner.list_jobs(project.project_name, kinds=["novel"], limit=3):
+            col1, col2 = st.columns([5, 1])
+            elapsed = f"（{job.elapsed:.0f}秒）" if job.elapsed is not None else ""
+            col1.caption(f"{job.label}: {job.status_label}{elapsed} {job.error or job.result}")
+            if job.active and col2.button("取り消す", key=f"cancel_job_{job.id}"):
+                job_runner.cancel(job.id)
+                st.rerun()
+            if job.active and job.partial:
+                with st.container(border=True):
+                    st.caption(f"受信済み {len(job.partial):,}文字")
+                    st.markdown(job.partial[-1000:])
+
+    @st.fragment(run_every=2)
+    def poll_jobs():
+        """実行中のジョブの状態を2秒ごとに確認し、完了したらページ全体を更新して結果を表示する"""
+        if job_runner.last_finished_at(project.project_name) > st.session_state.jobs_synced_at.get(project.project_name, 0.0):
             st.rerun()
+        show_jobs()
+
+    if any(job.active for job in job_runner.list_jobs(project.project_name, kinds=["novel"], limit=3)):
+        poll_jobs()
+    else:
+        show_jobs()
+
+    # 執筆済みの本文の続きを書き足す（章ごとに執筆した本文は対象外）
+    if (project.novel_text and not project.novel_text.startswith("[生成プロンプト]")
+            and not any(chapter.text for chapter in project.chapters)):
+        st.markdown("---")
+        st.subheader("➕ 続きを執筆")
+        st.caption("本文全体ではなく、これまでのあらすじと直前の本文の末尾だけを送って続きを書き足します。本文が長くなっても1回あたりの料金と待ち時間はほぼ変わりません。")
+
+        direction = st.text_input(
+            "続きの方向性（任意）",
+            placeholder="例: 主人公が手紙の差出人に会いに行く",
+            key="continuation_direction"
+        )
+        continuation_estimate = ai_client.estimate_continuation(
+            setting=selected_setting.text,
+            plot=selected_plot.text,
+            characters=characters_data,
+            style=writing_config.style,
+            tone=writing_config.tone,
+            direction=direction,
+            model=writing_config.ai_model
+        )
+        st.caption(f"見積もり（{writing_config.ai_model}・あらすじの更新を除く）: {format_estimate(continuation_estimate)}")
+
+        if st.button("➕ 続きを執筆する", use_container_width=True, disabled=not continuation_estimate.fits_context):
+            st.caption(f"AIが続きを執筆中... ({writing_config.ai_model} を使用)")
+            with st.container(border=True):
+                continuation_placeholder = st.empty()
+
+            try:
+                ContinuationWriter(ai_client, storage).continue_novel(
+                    project,
+                    direction=direction,
+                    on_update=continuation_placeholder.markdown,
+                    force_fresh=force_fresh
+                )
+            except StreamInterrupted as e:
+                if e.received_chars:
+                    st.error(f"続きの執筆中にエラーが発生しました: {e}（続きの{e.received_chars:,}文字まで保存済み）")
+                else:
+                    st.error(f"続きの執筆中にエラーが発生しました: {e}")
+            except Exception as e:
+                st.error(f"続きの執筆中にエラーが発生しました: {e}")
+            else:
+                st.success("続きを追加しました！")
+                st.rerun()
+
+    # 長編は章ごとに執筆（1回の出力上限を超えるため）
+    if writing_config.length == "長編":
+        st.markdown("---")
+        st.subheader("📚 章ごとに執筆（長編向け）")
+        st.caption("プロットを章に分け、あらすじを引き継ぎながら1章ずつ執筆します。章が終わるたびに保存されるため、失敗しても続きから再開できます。")
+
+        col1, col2 = st.columns([2, 1])
+        with col1:
+            chapter_count = st.number_input("章の数", min_value=2, max_value=20, value=max(len(project.chapters), 4))
+        with col2:
+            if st.button("章立てを作成", use_container_width=True):
+                with st.spinner("AIが章立てを作成中..."):
+                    LongFormWriter(ai_client, storage).plan_chapters(project, int(chapter_count), force_fresh=force_fresh)
+                st.rerun()
+
+        if project.chapters:
+            done_count = sum(1 for chapter in project.chapters if chapter.text)
+            st.progress(done_count / len(project.chapters), text=f"{done_count}/{len(project.chapters)}章 執筆済み")
+
+            for i, chapter in enumerate(project.chapters):
+                status = f"✓ {len(chapter.text):,}文字" if chapter.text else "未執筆"
+                with st.expander(f"第{i + 1}章 {chapter.title}（{status}）"):
+                    st.write(chapter.beat)
+
+            # 未執筆の章の見積もり（要約の呼び出しは含まない）
+            remaining = [
+                estimate
+                for chapter, estimate in zip(project.chapters, ai_client.estimate_chapters(
+                    setting=selected_setting.text,
+                    plot=selected_plot.text,
+                    characters=characters_data,
+                    style=writing_config.style,
+                    tone=writing_config.tone,
+                    chapters=[{"title": c.title, "beat": c.beat} for c in project.chapters],
+                    model=writing_config.ai_model
+                ))
+                if not chapter.text
+            ]
+            if remaining:
+                total = summarize_estimates(remaining)
+                st.caption(
+                    f"残り{len(remaining)}章の見積もり: 入力 約{total['input_tokens']:,}トークン /"
+                    f" 出力 約{total['output_tokens']:,}トークン / 約${total['cost_usd']:.4f}"
+                )
+
+            button_label = "章ごとに執筆を再開する" if done_count else "章ごとに執筆する"
+            if done_count < len(project.chapters) and st.button(f"📚 {button_label}", type="primary", use_container_width=True):
+                status_placeholder = st.empty()
+
+                def show_chapter_start(index, chapter):
+                    status_placeholder.info(f"第{index + 1}章「{chapter.title}」を執筆中... ({writing_config.ai_model} を使用)")
+
+                try:
+                    LongFormWriter(ai_client, storage).write(
+                        project,
+                        on_chapter_start=show_chapter_start,
+                        force_fresh=force_fresh
+                    )
+                except Exception as e:
+                    status_placeholder.empty()
+                    st.error(f"執筆中にエラーが発生しました: {e}（執筆済みの章は保存されています）")
+                else:
+                    st.success("すべての章の執筆が完了しました！")
+                    st.rerun()
 
     # 執筆された小説を表示
     if project.novel_text and not project.novel_text.startswith("[生成プロンプト]"):
@@ -254,7 +489,7 @@ with tab2:
             col1, col2 = st.columns(2)
             with col1:
                 if st.button("変更を保存", type="primary"):
-                    project.novel_text = edited_text
+                    project.edit_text("novel_text", edited_text, label="手動編集")
                     storage.save_project(project)
                     st.success("変更を保存しました")
                     st.rerun()
@@ -262,6 +497,32 @@ with tab2:
                 if st.button("元に戻す"):
                     st.rerun()
 
+        # 編集の履歴
+        revisions = project.list_revisions("novel_text")
+        if len(revisions) > 1:
+            with st.expander(f"編集の履歴（{len(revisions)}版）"):
+                revision_index = st.selectbox(
+                    "版を選択",
+                    list(reversed(range(len(revisions)))),
+                    format_func=lambda i: (
+                        f"版{i + 1}: {revisions[i].created_at[:16].replace('T', ' ')}"
+                        f"（{revisions[i].label or '編集'}, {revisions[i].length:,}文字）"
+                    ),
+                    key="novel_revision"
+                )
+                diff_text = project.diff_revisions("novel_text", revision_index, -1)
+                if diff_text:
+                    st.caption("選択した版から最新の版への変更")
+                    st.code(diff_text, language="diff")
+                else:
+                    st.caption("最新の版と同じ内容です")
+
+                if st.button("この版に戻す", key="restore_novel_revision"):
+                    project.restore_revision("novel_text", revision_index)
+                    storage.save_project(project)
+                    st.success(f"版{revision_index + 1}に戻しました")
+                    st.rerun()
+
         # ダウンロード機能
         st.divider()
         st.subheader("エクスポート")
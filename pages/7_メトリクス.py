@@ -0,0 +1,151 @@
+"""
+メトリクス
+AI API の呼び出しごとの応答時間・トークン数・失敗数を表示する
+"""
+import os
+
+import streamlit as st
+from modules.metrics import MetricsRegistry
+from modules.prompts import PROMPTS
+
+st.set_page_config(page_title="メトリクス", page_icon="📊", layout="wide")
+
+# セッション状態の確認
+if 'ai_client' not in st.session_state:
+    st.error("メインページから開いてください")
+    if st.button("メインページに戻る"):
+        st.switch_page("app.py")
+    st.stop()
+
+ai_client = st.session_state.ai_client
+metrics = ai_client.metrics
+
+st.title("📊 メトリクス")
+st.markdown("AI API の呼び出しごとの応答時間・トークン数・失敗数を集計しています。")
+
+
+def seconds(value):
+    return f"{value:.2f}秒" if value is not None else "-"
+
+
+def rate(value):
+    return f"{value:,.1f}" if value is not None else "-"
+
+
+# 集計の対象
+sources = ["起動後（このサーバー）"]
+if metrics.log_path:
+    sources.append("記録ファイル全体")
+source = st.radio("集計の対象", sources, horizontal=True)
+if source == "記録ファイル全体":
+    registry = MetricsRegistry.from_log(str(metrics.log_path))
+    st.caption(f"記録ファイル: {metrics.log_path}")
+else:
+    registry = metrics
+    st.caption(f"集計開始: {registry.started_at[:19].replace('T', ' ')}")
+    if not metrics.log_path:
+        st.caption("AI_METRICS_LOG を指定すると、呼び出しごとの記録をファイルに残せます。")
+
+stats = registry.snapshot()
+if not stats:
+    st.info("まだ呼び出しの記録がありません")
+    st.stop()
+
+# モデルごとの比較
+st.subheader("モデルごとの比較")
+st.dataframe(
+    [
+        {
+            "モデル": model,
+            "呼び出し": s.calls,
+            "失敗率": f"{s.failure_rate:.1%}",
+            "応答時間(中央値)": seconds(s.latency.quantile(0.5)),
+            "応答時間(95%)": seconds(s.latency.quantile(0.95)),
+            "最初の断片まで(中央値)": seconds(s.ttft.quantile(0.5)),
+            "出力トークン/秒": rate(s.output_tokens_per_second),
+            "出力文字/秒": rate(s.chars_per_second),
+            "キャッシュ": s.cache_hits,
+            "プロンプトキャッシュ率": f"{s.prompt_cache_rate:.0%}" if s.prompt_cache_rate is not None else "-",
+        }
+        for model, s in sorted(registry.by_model().items())
+    ],
+    use_container_width=True,
+    hide_index=True
+)
+
+# メソッドごとの詳細
+st.subheader("メソッドごとの詳細")
+st.dataframe(
+    [
+        {
+            "メソッド": method,
+            "モデル": model,
+            "呼び出し": s.calls,
+            "失敗": s.failures,
+            "失敗の内訳": "、".join(f"{kind}: {count}" for kind, count in sorted(s.errors.items())) or "-",
+            "応答時間(平均)": seconds(s.latency.mean),
+            "応答時間(中央値)": seconds(s.latency.quantile(0.5)),
+            "応答時間(95%)": seconds(s.latency.quantile(0.95)),
+            "最初の断片まで(中央値)": seconds(s.ttft.quantile(0.5)),
+            "入力トークン": f"{s.input_tokens:,}",
+            "出力トークン": f"{s.output_tokens:,}",
+            "キャッシュ読込トークン": f"{s.cache_read_tokens:,}",
+            "キャッシュ書込トークン": f"{s.cache_write_tokens:,}",
+            "キャッシュ": s.cache_hits,
+        }
+        for (method, model), s in sorted(stats.items())
+    ],
+    use_container_width=True,
+    hide_index=True
+)
+st.caption(
+    "中央値・95%は応答時間のヒストグラムからの推定値です。トークン数はAPIが返した値の合計です。"
+    "「キャッシュ」は応答のキャッシュから返した回数、キャッシュ読込・書込トークンはプロバイダー側のプロンプトキャッシュの入力トークン数です。"
+)
+
+# プロンプトの大きさ
+prompt_stats = PROMPTS.stats()
+if prompt_stats:
+    st.subheader("プロンプトの大きさ")
+    st.dataframe(
+        [
+            {
+                "テンプレート": name,
+                "組み立て": s.renders,
+                "平均文字数": f"{s.mean_chars:,.0f}",
+                "前半の割合": f"{s.prefix_share:.0%}",
+            }
+            for name, s in sorted(prompt_stats.items())
+        ],
+        use_container_width=True,
+        hide_index=True
+    )
+    st.caption("前半は同じ種類の呼び出しで繰り返し使われる部分で、キャッシュで再利用されやすい部分です。起動後の集計です。")
+
+# 書き出し
+st.subheader("書き出し")
+col1, col2, col3 = st.columns(3)
+
+with col1:
+    prometheus_path = os.getenv("AI_METRICS_PROMETHEUS_PATH", "data/metrics/ai_client.prom")
+    if st.button("Prometheus形式で保存", use_container_width=True):
+        try:
+            path = registry.export_prometheus(prometheus_path)
+        except OSError as e:
+            st.error(f"保存に失敗しました: {e}")
+        else:
+            st.success(f"保存しました: {path}")
+
+with col2:
+    st.download_button(
+        label="Prometheus形式でダウンロード",
+        data=registry.to_prometheus(),
+        file_name="ai_client.prom",
+        mime="text/plain",
+        use_container_width=True
+    )
+
+with col3:
+    if st.button("集計をリセット", use_container_width=True, disabled=registry is not metrics):
+        metrics.reset()
+        st.rerun()
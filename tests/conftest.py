@@ -0,0 +1,8 @@
+"""
+テストの共通設定
+リポジトリのルートから modules を読み込めるようにする
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,66 @@
+"""
+AIClient の初期化のテスト
+"""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+from modules.ai_client import AIClient
+from modules.providers import Capabilities, FakeProvider
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+class JSONModeProvider(FakeProvider):
+    """JSON モードで {"characters": [...]} を数文字ずつ返し、返した断片を記録するプロバイダー"""
+
+    def __init__(self, characters, size=7):
+        super().__init__("gemini", latency=0)
+        self.capabilities = Capabilities(json_mode=True)
+        self.text = json.dumps({"characters": characters}, ensure_ascii=False)
+        self.size = size
+        self.sent = ""
+        self.json_modes = []
+
+    def stream(self, model, prompt, max_tokens=None, json_mode=False):
+        self.json_modes.append(json_mode)
+        for i in range(0, len(self.text), self.size):
+            self.sent = self.text[:i + self.size]
+            yield self.text[i:i + self.size]
+
+
+def test_sdks_are_not_imported_until_first_call(monkeypatch):
+    """AIClient を作っただけでは Gemini・Anthropic の SDK を読み込まない"""
+    monkeypatch.setenv("GOOGLE_API_KEY", "test-key")
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    script = (
+        "import sys\n"
+        "from modules.ai_client import AIClient\n"
+        "AIClient()\n"
+        "loaded = [m for m in ('anthropic', 'google.generativeai') if m in sys.modules]\n"
+        "print(','.join(loaded))\n"
+    )
+
+    result = subprocess.run(
+        [sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+
+    assert result.stdout.strip() == ""
+
+
+def test_characters_stream_unwraps_json_mode_output():
+    characters = [
+        {"name": "灯", "personality": "明るい", "background": "港町育ち", "role": "主人公"},
+        {"name": "湊", "personality": "慎重", "background": "灯台守", "role": "相棒"},
+    ]
+    provider = JSONModeProvider(characters)
+    client = AIClient(cache=None, providers={"gemini": provider}, draft_model="flash")
+
+    stream = client.generate_characters_stream("設定", "プロット", count=2)
+
+    assert next(stream) == characters[0]
+    # 1人目は包んでいるオブジェクトが閉じる前に返る
+    assert len(provider.sent) < len(provider.text)
+    assert list(stream) == characters[1:]
+    assert provider.json_modes == [True]
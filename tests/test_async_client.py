@@ -0,0 +1,74 @@
+"""
+非同期AIクライアントのテスト
+"""
+import threading
+import time
+
+from modules.ai_client import AIClient
+from modules.async_client import AsyncAIClient
+
+
+class SlowClient:
+    """呼び出しに少し時間がかかり、同時に実行中の呼び出しの数を記録するクライアント"""
+
+    def __init__(self):
+        # 呼び出し先の決め方は AIClient と同じ（下書きは gemini）
+        self.route = AIClient(cache=None, providers={}).route
+        self.draft = self.route("flash")
+        self.calls = []
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def _call(self, **kwargs):
+        with self._lock:
+            self.calls.append(kwargs)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.05)
+        with self._lock:
+            self.running -= 1
+        return f"結果{len(self.calls)}"
+
+    def generate_setting(self, ideas, force_fresh=False):
+        return self._call(ideas=ideas, force_fresh=force_fresh)
+
+    def write_novel(self, setting, model="haiku3.5", force_fresh=False):
+        return self._call(setting=setting, model=model, force_fresh=force_fresh)
+
+
+def test_variants_are_generated_fresh():
+    client = SlowClient()
+
+    results = AsyncAIClient(client).run_variants("generate_setting", 3, "アイデア")
+
+    assert len(results) == 3
+    assert all(call == {"ideas": "アイデア", "force_fresh": True} for call in client.calls)
+
+
+def test_single_variant_may_use_cache():
+    client = SlowClient()
+
+    AsyncAIClient(client).run_variants("generate_setting", 1, "アイデア")
+
+    assert client.calls == [{"ideas": "アイデア", "force_fresh": False}]
+
+
+def test_concurrency_is_limited_per_provider():
+    client = SlowClient()
+
+    AsyncAIClient(client, concurrency={"gemini": 2}).run_variants("generate_setting", 6, "アイデア")
+
+    assert len(client.calls) == 6
+    assert client.max_running == 2
+
+
+def test_writing_methods_use_the_model_provider(monkeypatch):
+    monkeypatch.setenv("AI_CONCURRENCY_ANTHROPIC", "1")
+    client = SlowClient()
+    async_client = AsyncAIClient(client)
+
+    async_client.run_variants("write_novel", 3, "設定", model="haiku3.5")
+
+    assert async_client.concurrency["anthropic"] == 1
+    assert client.max_running == 1
@@ -0,0 +1,101 @@
+"""
+バッチ生成のテスト
+偽プロバイダーで種のファイルを処理し、集計・再開・引数のエラーを確かめる
+"""
+import argparse
+
+import pytest
+
+from modules.batch import STEPS, BatchRunner, fake_client, main, parse_concurrency, read_seeds
+from modules.storage import ProjectStorage
+
+SEEDS = """\
+# 種のファイル
+灯台守 / 失われた手紙
+
+古い時計 / 雨の街 / 約束
+記憶を売る店
+"""
+
+
+@pytest.fixture
+def seeds(tmp_path):
+    path = tmp_path / "seeds.txt"
+    path.write_text(SEEDS, encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # 本文以外の生成は gemini の偽プロバイダーで行う
+    monkeypatch.delenv("AI_DRAFT_MODEL", raising=False)
+    client = fake_client(latency=0)
+    for provider in client.providers.values():
+        provider.sleep = lambda seconds: None
+    return client
+
+
+def test_read_seeds_names_projects_by_line(seeds):
+    items = read_seeds(seeds, prefix="種")
+
+    assert [item.name for item in items] == ["種0002", "種0004", "種0005"]
+    assert items[1].ideas == ["古い時計", "雨の街", "約束"]
+
+
+def test_read_seeds_rejects_lines_without_ideas(tmp_path):
+    path = tmp_path / "seeds.txt"
+    path.write_text("灯台守\n / \n", encoding="utf-8")
+
+    with pytest.raises(ValueError, match="2行目"):
+        read_seeds(str(path))
+
+
+def test_parse_concurrency():
+    assert parse_concurrency(["gemini=4", " local =2"]) == {"gemini": 4, "local": 2}
+    for value in ("gemini", "gemini=x", "=3", "gemini=0"):
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_concurrency([value])
+
+
+def test_report_counts_failures_and_resumes(seeds, client, tmp_path):
+    storage = ProjectStorage(str(tmp_path / "projects"), debounce_seconds=0)
+    items = read_seeds(seeds)
+    # 再試行しない失敗を1回だけ起こす（最初の「膨らませる」の呼び出しが失敗する）
+    client.providers["gemini"].errors.append(ValueError("blocked by safety filter"))
+
+    report = BatchRunner(client, storage, workers=1).run(items)
+
+    data = report.to_dict()
+    assert (data["projects"], data["done"], data["skipped"], data["failed"]) == (3, 2, 0, 1)
+    assert data["failures"] == {"invalid_response": 1}
+    failed = [r for r in report.results if r.status == "failed"]
+    assert failed[0].steps == [] and "blocked" in failed[0].error
+    assert all(r.chars > 0 for r in report.results if r.status == "done")
+    for step in STEPS:
+        stats = data["steps"][step]
+        assert stats["calls"] == 2
+        assert 0 <= stats["median_seconds"] <= stats["p95_seconds"]
+    assert "失敗の内訳: invalid_response 1" in report.format()
+
+    # もう一度実行すると、失敗したプロジェクトだけを生成する
+    report = BatchRunner(client, storage, workers=2).run(items)
+
+    data = report.to_dict()
+    assert (data["done"], data["skipped"], data["failed"]) == (1, 2, 0)
+    assert all(stats["calls"] == 1 for stats in data["steps"].values())
+    assert all(storage.load_project(item.name).novel_text for item in items)
+
+
+@pytest.mark.parametrize("argv", [
+    ["missing.txt", "--provider", "fake"],
+    ["{seeds}", "--provider", "fake", "--concurrency", "gemini"],
+])
+def test_main_reports_argument_errors(argv, seeds, tmp_path, capsys):
+    argv = [arg.format(seeds=seeds) for arg in argv] + ["--projects-dir", str(tmp_path / "projects")]
+
+    with pytest.raises(SystemExit) as info:
+        main(argv)
+
+    assert info.value.code == 2
+    assert "error:" in capsys.readouterr().err
+    assert not (tmp_path / "projects").exists()
@@ -0,0 +1,56 @@
+"""
+生成結果のキャッシュのテスト
+"""
+import os
+import time
+
+from modules.cache import ResponseCache
+
+
+def test_entry_expires_by_age_even_if_read(tmp_path, monkeypatch):
+    """よく読まれるエントリも、保存から max_age_seconds を過ぎたら破棄する"""
+    cache = ResponseCache(str(tmp_path), max_age_seconds=100)
+    now = time.time()
+    monkeypatch.setattr("modules.cache.time.time", lambda: now)
+    cache.put("key", "本文")
+
+    for elapsed in (30, 60, 90):
+        monkeypatch.setattr("modules.cache.time.time", lambda: now + elapsed)
+        assert cache.get("key") == "本文"
+
+    monkeypatch.setattr("modules.cache.time.time", lambda: now + 101)
+    assert cache.get("key") is None
+    assert not list(tmp_path.glob("*.json"))
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    """合計サイズが上限を超えたら、最後に使われた時刻が古いものから削除する"""
+    cache = ResponseCache(str(tmp_path), max_bytes=250)
+    cache.put("a", "あ" * 20)
+    cache.put("b", "い" * 20)
+    now = time.time()
+    os.utime(cache._get_entry_path("a"), (now - 20, now - 20))
+    os.utime(cache._get_entry_path("b"), (now - 10, now - 10))
+    assert cache.get("a")
+
+    cache.put("c", "う" * 20)
+
+    assert cache.get("a") and cache.get("c")
+    assert cache.get("b") is None
+
+
+def test_directory_is_scanned_only_when_over_the_cap(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path), max_bytes=10_000)
+    cache.put("first", "本文")
+    scans = []
+    original = cache._scan
+    monkeypatch.setattr(cache, "_scan", lambda: scans.append(1) or original())
+
+    for i in range(20):
+        cache.put(f"key{i}", "本文")
+    assert scans == []
+
+    cache.put("large", "あ" * 5000)
+    assert scans == [1]
+    assert cache._total_bytes == sum(p.stat().st_size for p in tmp_path.glob("*.json"))
+    assert cache._total_bytes <= 10_000
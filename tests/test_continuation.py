@@ -0,0 +1,95 @@
+"""
+続きの執筆のテスト
+AI の代わりに決まった応答を返すクライアントで、送る内容とあらすじの更新を確かめる
+"""
+import pytest
+
+from modules.ai_client import CONTINUATION_TAIL_CHARS
+from modules.continuation import PARAGRAPH_SEPARATOR, ContinuationWriter, summary_is_current
+from modules.data_models import NovelProject, Plot, Setting, WritingConfig
+from modules.storage import ProjectStorage
+
+
+class ScriptedClient:
+    """あらすじと続きを決まった形で返し、受け取った内容を記録するクライアント"""
+
+    def __init__(self):
+        self.summarized = []
+        self.continue_calls = []
+
+    def summarize_story(self, previous_summary, new_text):
+        self.summarized.append(new_text)
+        return f"{previous_summary}+{len(new_text)}"
+
+    def continue_novel_stream(self, **kwargs):
+        self.continue_calls.append(kwargs)
+        yield "続き"
+        yield "です。"
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return ProjectStorage(str(tmp_path / "projects"), debounce_seconds=0)
+
+
+def make_project(novel_text: str) -> NovelProject:
+    return NovelProject(
+        project_name="テスト",
+        settings=[Setting("設定")],
+        selected_setting_index=0,
+        plots=[Plot("プロット")],
+        selected_plot_index=0,
+        writing_config=WritingConfig("短編", "文学的", "明るい"),
+        novel_text=novel_text
+    )
+
+
+def test_only_new_text_is_summarized(storage):
+    client = ScriptedClient()
+    writer = ContinuationWriter(client, storage)
+    project = make_project("あ" * (CONTINUATION_TAIL_CHARS + 500))
+
+    assert writer.update_summary(project) == "+500"
+    assert writer.update_summary(project) == "+500"
+
+    project.novel_text += "い" * 300
+    assert writer.update_summary(project) == "+500+300"
+    assert [len(text) for text in client.summarized] == [500, 300]
+    assert storage.load_project("テスト").novel_summary == project.novel_summary
+
+
+def test_rewritten_text_is_summarized_again(storage):
+    client = ScriptedClient()
+    writer = ContinuationWriter(client, storage)
+    project = make_project("あ" * (CONTINUATION_TAIL_CHARS + 500))
+    writer.update_summary(project)
+
+    project.novel_text = "う" + project.novel_text[1:]
+
+    assert not summary_is_current(project.novel_summary, project.novel_text)
+    assert writer.update_summary(project) == "+500"
+    assert [len(text) for text in client.summarized] == [500, 500]
+
+
+def test_short_text_needs_no_summary(storage):
+    client = ScriptedClient()
+
+    assert ContinuationWriter(client, storage).update_summary(make_project("短い本文")) == ""
+    assert client.summarized == []
+
+
+def test_continue_sends_summary_and_tail_only(storage):
+    client = ScriptedClient()
+    text = "あ" * 3000 + "い" * CONTINUATION_TAIL_CHARS + "\n"
+    project = make_project(text)
+
+    added = ContinuationWriter(client, storage).continue_novel(project, direction="旅に出る")
+
+    call, = client.continue_calls
+    assert call["previous_tail"] == "い" * CONTINUATION_TAIL_CHARS
+    assert call["summary"] == "+3000"
+    assert call["direction"] == "旅に出る"
+    assert added == "続きです。"
+    assert project.novel_text == text.rstrip() + PARAGRAPH_SEPARATOR + added
+    assert [r.label for r in project.list_revisions("novel_text")] == ["続きの執筆前", "続きを執筆"]
+    assert storage.load_project("テスト").novel_text == project.novel_text
@@ -0,0 +1,172 @@
+"""
+データモデルのテスト
+"""
+import pytest
+
+from modules.data_models import (
+    Chapter, IdeaFragment, NovelProject, Plot, Setting, SCHEMA_VERSION,
+    migrate_data, plot_revision_key, schema_version_of, setting_revision_key
+)
+from modules.sqlite_storage import SQLiteProjectStorage
+from modules.storage import ProjectStorage
+
+
+def test_unversioned_data_is_dated_by_keys():
+    assert schema_version_of({"project_name": "テスト"}) == 1
+    assert schema_version_of({"chapters": []}) == 2
+    assert schema_version_of({"chapters": [], "revisions": {}}) == 3
+
+
+def test_downgraded_data_loads_in_current_version():
+    project = NovelProject("テスト", novel_text="本文", chapters=[Chapter(title="第1章", beat="出会い")])
+    project.edit_text("novel_text", "書き直した本文")
+
+    data = project.to_dict(schema_version=1)
+
+    assert not {"chapters", "revisions", "schema_version"} & data.keys()
+    loaded = NovelProject.from_dict(data)
+    assert loaded.novel_text == "書き直した本文"
+    assert loaded.chapters == [] and loaded.revisions == {}
+
+
+def test_newer_data_is_left_as_is():
+    data = {"schema_version": 99, "project_name": "テスト", "new_section": [1]}
+
+    assert migrate_data(data) == data
+
+
+def test_unknown_keys_are_kept():
+    data = {
+        "project_name": "テスト",
+        "future_key": {"a": 1},
+        "writing_config": {"length": "短編", "style": "文学的", "tone": "明るい", "temperature": 0.7},
+        "chapters": [{"title": "第1章", "beat": "出会い", "word_goal": 3000}],
+    }
+
+    project = NovelProject.from_dict(data)
+
+    assert project.writing_config.length == "短編"
+    assert project.chapters[0].title == "第1章"
+    assert project.to_dict()["future_key"] == {"a": 1}
+
+
+def test_sections_are_hydrated_on_first_access():
+    project = NovelProject("テスト", idea_fragments=[IdeaFragment(f"断片{i}") for i in range(100)])
+
+    loaded = NovelProject.from_dict(project.to_dict())
+
+    assert loaded.is_loaded("idea_fragments") and not loaded.is_hydrated("idea_fragments")
+    assert loaded.to_dict()["idea_fragments"] == project.to_dict()["idea_fragments"]
+    assert isinstance(loaded.idea_fragments[0], IdeaFragment)
+    assert loaded.is_hydrated("idea_fragments")
+
+
+@pytest.mark.parametrize("backend", ["files", "sqlite"])
+def test_unknown_keys_survive_storage(backend, tmp_path):
+    if backend == "files":
+        storage = ProjectStorage(str(tmp_path / "projects"), debounce_seconds=0)
+    else:
+        storage = SQLiteProjectStorage(str(tmp_path / "projects.db"), debounce_seconds=0)
+    storage.save_project(NovelProject.from_dict({"project_name": "テスト", "future_key": [1, 2]}))
+
+    assert storage.load_project("テスト").to_dict()["future_key"] == [1, 2]
+
+
+def test_same_timestamp_settings_have_separate_histories():
+    """作成日時が同じ設定でも、それぞれの履歴を別々に編集できる"""
+    project = NovelProject("テスト")
+    first = Setting("設定A", timestamp=1700000000.0)
+    second = Setting("設定B", timestamp=1700000000.0)
+    project.settings = [first, second]
+    assert first.created_at == second.created_at
+    assert setting_revision_key(first) != setting_revision_key(second)
+
+    project.edit_text(setting_revision_key(first), "設定A改")
+    project.edit_text(setting_revision_key(second), "設定B改")
+
+    assert [s.text for s in project.settings] == ["設定A改", "設定B改"]
+    assert len(project.list_revisions(setting_revision_key(first))) == 2
+    assert project.get_revision(setting_revision_key(first), 0) == "設定A"
+    assert project.get_revision(setting_revision_key(second), 0) == "設定B"
+
+
+def test_ids_survive_roundtrip():
+    """id は保存して読み込み直しても変わらない"""
+    project = NovelProject("テスト")
+    project.plots = [Plot("プロット", timestamp=1700000000.0), Plot("別のプロット", timestamp=1700000000.0)]
+    project.edit_text(plot_revision_key(project.plots[1]), "別のプロット改")
+
+    loaded = NovelProject.from_json(project.to_json())
+
+    assert [p.id for p in loaded.plots] == [p.id for p in project.plots]
+    assert loaded.get_revision(plot_revision_key(loaded.plots[1]), 0) == "別のプロット"
+
+
+def test_legacy_data_keeps_history():
+    """id のない以前のデータは作成日時を id にし、作成日時のキーの履歴を引き継ぐ"""
+    project = NovelProject("テスト")
+    project.settings = [Setting("設定A", timestamp=1700000000.0), Setting("設定B", timestamp=1700000000.0)]
+    project.edit_text(setting_revision_key(project.settings[0]), "設定A改")
+    data = project.to_dict(schema_version=4)
+    assert "id" not in data["settings"][0]
+
+    legacy = NovelProject.from_dict(data)
+
+    first, second = legacy.settings
+    assert first.id == first.created_at
+    assert second.id != first.id
+    assert [r.label for r in legacy.list_revisions(setting_revision_key(first))] == ["編集前", None]
+    assert not legacy.list_revisions(setting_revision_key(second))
+
+    legacy.edit_text(setting_revision_key(second), "設定B改")
+    assert [s.text for s in legacy.settings] == ["設定A改", "設定B改"]
+
+
+def test_downgrade_restores_created_at_keys():
+    """古いバージョンの形式では、履歴のキーを作成日時に戻す"""
+    project = NovelProject("テスト")
+    setting = Setting("設定")
+    project.settings = [setting]
+    project.edit_text(setting_revision_key(setting), "設定改")
+
+    data = project.to_dict(schema_version=4)
+
+    assert "id" not in data["settings"][0]
+    assert list(data["revisions"]) == [f"setting:{setting.created_at}"]
+    assert project.to_dict()["schema_version"] == SCHEMA_VERSION
+
+
+def test_storages_persist_ids(tmp_path):
+    """ファイル・SQLite のどちらの保存でも id と履歴を読み込み直せる"""
+    for storage in (ProjectStorage(str(tmp_path / "projects"), debounce_seconds=0),
+                    SQLiteProjectStorage(str(tmp_path / "projects.db"), debounce_seconds=0)):
+        project = NovelProject("テスト")
+        project.settings = [Setting("設定A", timestamp=1700000000.0), Setting("設定B", timestamp=1700000000.0)]
+        project.edit_text(setting_revision_key(project.settings[1]), "設定B改")
+        assert storage.save_project(project)
+
+        loaded = storage.load_project("テスト")
+
+        assert [s.id for s in loaded.settings] == [s.id for s in project.settings]
+        assert loaded.get_revision(setting_revision_key(loaded.settings[1]), 0) == "設定B"
+        assert loaded.settings[0].text == "設定A"
+
+
+def test_created_at_can_be_passed_as_before():
+    """以前と同じく2番目の引数（または created_at=）で作成日時を渡せる"""
+    positional = Setting("設定", "2024-05-01T10:00:00")
+    keyword = Plot(text="プロット", created_at="2024-05-01T10:00:00")
+
+    assert positional.created_at == keyword.created_at == "2024-05-01T10:00:00"
+    assert positional.id != keyword.id
+    with pytest.raises(TypeError):
+        Setting("設定", 1700000000.0, "id")
+
+
+@pytest.mark.parametrize("created_at", ["2024-05-01T10:00:00+09:00", "2024-05-01T01:00:00+00:00"])
+def test_timezone_offset_is_kept(created_at):
+    setting = Setting.from_dict({"text": "設定", "created_at": created_at, "id": "a"})
+
+    assert setting.created_at == created_at
+    assert Setting.from_dict(setting.to_dict()) == setting
+    assert setting.timestamp == 1714525200.0
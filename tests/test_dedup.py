@@ -0,0 +1,72 @@
+"""
+アイデアの断片の重複判定・ストリーミングでの取り出しのテスト
+"""
+import pytest
+
+from modules.ai_client import AIClient, parse_numbered_line
+from modules.dedup import FragmentIndex, char_bigrams, normalize_text
+from modules.providers import FakeProvider
+
+
+class ChunkProvider(FakeProvider):
+    """決まった断片を順に返すプロバイダー"""
+
+    def __init__(self, chunks):
+        super().__init__("gemini", latency=0)
+        self.chunks = chunks
+
+    def stream(self, model, prompt, max_tokens=None, json_mode=False):
+        yield from self.chunks
+
+
+def test_normalize_text_ignores_width_punctuation_and_spaces():
+    assert normalize_text("ＡＩの　時計、止まった！") == normalize_text("aiの時計止まった")
+
+
+def test_char_bigrams():
+    assert char_bigrams("時計台") == {"時計", "計台"}
+    assert char_bigrams("猫") == {"猫"}
+    assert char_bigrams("") == set()
+
+
+def test_near_duplicates_are_rejected():
+    index = FragmentIndex(["雨の夜に届いた差出人不明の手紙"])
+
+    assert not index.add("雨の夜に届いた、差出人不明の手紙。")
+    assert not index.add("雨の夜に届いた差出人不明の古い手紙")
+    assert index.add("灯台守が見つけた古い地図")
+    assert len(index) == 2
+
+
+def test_blank_text_counts_as_duplicate():
+    assert FragmentIndex().is_duplicate("・・・")
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("1. 失われた手紙", "失われた手紙"),
+    ("  12．時計塔の約束", "時計塔の約束"),
+    ("**3)** 記憶を売る店", "記憶を売る店"),
+    ("4、 雨の街", "雨の街"),
+    ("見出し", None),
+    ("5. ", None),
+])
+def test_parse_numbered_line(line, expected):
+    assert parse_numbered_line(line) == expected
+
+
+def test_stream_yields_fragments_as_lines_complete():
+    chunks = ["1. 失われ", "た手紙\n2. 時計", "塔の約束\n前置き\n3. 記憶を", "売る店"]
+    client = AIClient(cache=None, providers={"gemini": ChunkProvider(chunks)}, draft_model="flash")
+
+    assert list(client.generate_idea_fragments_stream(3)) == ["失われた手紙", "時計塔の約束", "記憶を売る店"]
+    assert list(client.generate_idea_fragments_stream(2)) == ["失われた手紙", "時計塔の約束"]
+
+
+def test_prompt_lists_only_recent_excluded_fragments():
+    client = AIClient(cache=None)
+    exclude = [f"断片{i}" for i in range(40)]
+
+    prompt = client._build_idea_fragments_prompt(10, exclude)
+
+    assert "- 断片39" in prompt and "- 断片10" in prompt
+    assert "- 断片9\n" not in prompt
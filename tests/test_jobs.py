@@ -0,0 +1,151 @@
+"""
+バックグラウンドのジョブのテスト
+"""
+import json
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from modules import jobs
+from modules.ai_client import AIClient
+from modules.data_models import NovelProject
+from modules.jobs import HEARTBEAT_TIMEOUT, JobRunner
+from modules.metrics import MetricsRegistry
+from modules.providers import FakeProvider
+from modules.retry import RequestExecutor, RetryPolicy
+from modules.storage import ProjectStorage
+
+NOVEL_PARAMS = {
+    "setting": "設定", "plot": "プロット", "characters": [],
+    "length": "短編", "style": "文学的", "tone": "明るい", "model": "haiku3.5",
+}
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = ProjectStorage(str(tmp_path / "projects"), debounce_seconds=0)
+    storage.save_project(NovelProject("テスト", novel_text="前の版の本文"))
+    return storage
+
+
+def make_runner(tmp_path, storage, provider: FakeProvider) -> JobRunner:
+    client = AIClient(
+        cache=None,
+        executor=RequestExecutor(policy=RetryPolicy(max_attempts=1)),
+        metrics=MetricsRegistry(),
+        providers={"anthropic": provider, "gemini": FakeProvider("gemini", sleep=lambda seconds: None)}
+    )
+    return JobRunner(client, storage, db_path=str(tmp_path / "jobs.db"), max_workers=1)
+
+
+def wait(runner: JobRunner, job_id: int):
+    deadline = time.monotonic() + 10
+    while runner.get(job_id).active:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    return runner.get(job_id)
+
+
+def test_novel_job_saves_text(tmp_path, storage):
+    runner = make_runner(tmp_path, storage, FakeProvider("anthropic", sleep=lambda seconds: None))
+
+    job = wait(runner, runner.submit("テスト", "novel", NOVEL_PARAMS))
+
+    project = storage.load_project("テスト")
+    assert job.status == "done"
+    assert project.novel_text and project.novel_text != "前の版の本文"
+    assert [r.label for r in project.list_revisions("novel_text")] == ["再執筆前", "AI執筆"]
+
+
+def test_stream_error_is_kept_when_partial_save_fails(tmp_path, storage, monkeypatch):
+    provider = FakeProvider("anthropic", interrupt_after_chunks=2, sleep=lambda seconds: None)
+    runner = make_runner(tmp_path, storage, provider)
+    monkeypatch.setattr(storage, "save_project", lambda project: False)
+
+    job = wait(runner, runner.submit("テスト", "novel", NOVEL_PARAMS))
+
+    assert job.status == "failed"
+    assert "接続できませんでした" in job.error
+    assert "保存できませんでした" not in job.error
+
+
+class GatedProvider(FakeProvider):
+    """最初の断片を返した後、gate が開くまで待つプロバイダー"""
+
+    def __init__(self):
+        super().__init__("anthropic", sleep=lambda seconds: None)
+        self.gate = threading.Event()
+
+    def stream(self, model, prompt, max_tokens=None, json_mode=False):
+        yield "途中まで"
+        assert self.gate.wait(10)
+        yield "の本文"
+
+
+def test_partial_text_is_saved_while_running(tmp_path, storage, monkeypatch):
+    monkeypatch.setattr(jobs, "PROGRESS_CHARS", 1)
+    provider = GatedProvider()
+    runner = make_runner(tmp_path, storage, provider)
+    job_id = runner.submit("テスト", "novel", NOVEL_PARAMS)
+
+    deadline = time.monotonic() + 10
+    while storage.load_project("テスト").novel_text != "途中まで":
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert runner.get(job_id).status == "running"
+
+    provider.gate.set()
+    assert wait(runner, job_id).status == "done"
+    project = storage.load_project("テスト")
+    assert project.novel_text == "途中までの本文"
+    assert [r.label for r in project.list_revisions("novel_text")] == ["再執筆前", "AI執筆"]
+
+
+def insert_job(db_path, status: str, owner: str = "", heartbeat_at=None) -> int:
+    with sqlite3.connect(db_path) as conn:
+        cursor = conn.execute(
+            "INSERT INTO jobs (project, kind, params, status, created_at, started_at, owner, heartbeat_at) "
+            "VALUES ('テスト', 'plot', ?, ?, ?, ?, ?, ?)",
+            (json.dumps({"setting": "設定"}), status, time.time(), heartbeat_at, owner, heartbeat_at)
+        )
+    return cursor.lastrowid
+
+
+def test_recover_fails_only_stale_jobs(tmp_path, storage):
+    provider = FakeProvider("anthropic", sleep=lambda seconds: None)
+    make_runner(tmp_path, storage, provider).shutdown()
+    db_path = tmp_path / "jobs.db"
+    stale = insert_job(db_path, "running", "落ちたプロセス", time.time() - HEARTBEAT_TIMEOUT - 1)
+    alive = insert_job(db_path, "running", "別のプロセス", time.time())
+    queued = insert_job(db_path, "queued")
+
+    runner = make_runner(tmp_path, storage, provider)
+
+    assert runner.get(stale).status == "failed"
+    assert runner.get(alive).status == "running"
+    job = wait(runner, queued)
+    assert job.status == "done"
+    assert job.owner == runner.owner
+
+
+def test_old_database_gets_owner_columns(tmp_path, storage):
+    db_path = tmp_path / "jobs.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            "CREATE TABLE jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, project TEXT NOT NULL, "
+            "kind TEXT NOT NULL, params TEXT NOT NULL, status TEXT NOT NULL, "
+            "result TEXT NOT NULL DEFAULT '', error TEXT NOT NULL DEFAULT '', "
+            "partial TEXT NOT NULL DEFAULT '', created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        conn.execute(
+            "INSERT INTO jobs (project, kind, params, status, created_at, started_at) "
+            "VALUES ('テスト', 'plot', '{}', 'running', 0, 0)"
+        )
+
+    runner = make_runner(tmp_path, storage, FakeProvider("anthropic", sleep=lambda seconds: None))
+
+    job = runner.get(1)
+    assert job.status == "failed"
+    assert job.owner == "" and job.heartbeat_at is None
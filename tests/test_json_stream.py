@@ -0,0 +1,76 @@
+"""
+ストリーミングJSONの抽出のテスト
+"""
+import json
+
+from modules.data_models import Character
+from modules.json_stream import JSONObjectExtractor, validate_fields
+
+
+def feed_in_chunks(text: str, size: int = 3) -> list[list[dict]]:
+    """size 文字ずつ渡し、断片ごとに取り出したオブジェクトを返す（最後は finish の結果）"""
+    extractor = JSONObjectExtractor()
+    results = [extractor.feed(text[i:i + size]) for i in range(0, len(text), size)]
+    results.append(extractor.finish())
+    return results
+
+
+def extract(text: str) -> list[dict]:
+    return [obj for objects in feed_in_chunks(text) for obj in objects]
+
+
+def test_fenced_block_with_surrounding_text():
+    text = '以下の通りです。\n```json\n[\n  {"name": "灯"},\n  {"name": "湊"}\n]\n```\nいかがでしょうか。'
+
+    assert extract(text) == [{"name": "灯"}, {"name": "湊"}]
+
+
+def test_brackets_inside_strings_are_ignored():
+    text = '[{"name": "灯", "personality": "口癖は「}」と{笑う」\\"こと"}, {"name": "湊"}]'
+
+    assert extract(text) == [{"name": "灯", "personality": "口癖は「}」と{笑う」\"こと"}, {"name": "湊"}]
+
+
+def test_truncated_tail_keeps_closed_objects():
+    text = '[{"name": "灯", "role": "主人公"}, {"name": "湊", "role": "相'
+
+    assert extract(text) == [{"name": "灯", "role": "主人公"}]
+
+
+def test_trailing_comma_is_tolerated():
+    assert extract('{"name": "灯", "role": "主人公",}') == [{"name": "灯", "role": "主人公"}]
+
+
+def test_wrapper_object_yields_items_as_they_close():
+    characters = [{"name": "灯"}, {"name": "湊"}, {"name": "凪"}]
+    text = json.dumps({"characters": characters}, ensure_ascii=False)
+    first_end = text.index("}") + 1
+
+    extractor = JSONObjectExtractor()
+    assert extractor.feed(text[:first_end]) == [{"name": "灯"}]
+    assert extractor.feed(text[first_end:]) == characters[1:]
+    assert extractor.finish() == []
+
+
+def test_truncated_wrapper_does_not_repeat_items():
+    text = '{"characters": [{"name": "灯"}, {"name": "湊"}, {"name": "凪", "ro'
+
+    assert extract(text) == [{"name": "灯"}, {"name": "湊"}]
+
+
+def test_object_with_list_of_objects_is_kept_whole():
+    """配列が最初の値でなければ、包んでいる形とはみなさない"""
+    character = {"name": "灯", "relationships": [{"name": "湊", "relation": "幼なじみ"}]}
+
+    assert extract(json.dumps([character], ensure_ascii=False)) == [character]
+
+
+def test_validate_fields():
+    character = validate_fields(
+        {"name": " 灯 ", "personality": ["明るい", "頑固"], "role": "", "unknown": 1}, Character
+    )
+
+    assert character == {
+        "name": "灯", "personality": '["明るい", "頑固"]', "background": None, "role": None
+    }
+    assert validate_fields({"name": "灯"}, Character) is None
@@ -0,0 +1,113 @@
+"""
+長編の章ごと執筆のテスト
+AI の代わりに決まった応答を返すクライアントで、章立て・引き継ぎ・再開を確かめる
+"""
+import pytest
+
+from modules.data_models import NovelProject, Plot, Setting, WritingConfig
+from modules.long_form import PREVIOUS_TAIL_CHARS, LongFormWriter, split_plot_into_beats, stitch_chapters
+from modules.storage import ProjectStorage
+
+PLOT = "発端\n\n旅立ち\n\n試練\n\n再会\n\n結末"
+
+
+class ScriptedClient:
+    """章ごとに決まった本文を返すクライアント（fail_at の章で失敗する）"""
+
+    def __init__(self, beats=None, fail_at=None, chapter_chars=1000):
+        self.beats = beats
+        self.fail_at = fail_at
+        self.chapter_chars = chapter_chars
+        self.chapter_calls = []
+        self.summaries = []
+
+    def generate_chapter_beats(self, setting, plot, chapter_count, **kwargs):
+        if self.beats is None:
+            raise RuntimeError("章立てに失敗")
+        return self.beats
+
+    def write_chapter(self, **kwargs):
+        self.chapter_calls.append(kwargs)
+        if kwargs["chapter_index"] == self.fail_at:
+            raise RuntimeError("執筆に失敗")
+        return str(kwargs["chapter_index"] + 1) * self.chapter_chars
+
+    def summarize_story(self, previous_summary, new_text):
+        self.summaries.append(previous_summary)
+        return f"{previous_summary}+{new_text[0]}"
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return ProjectStorage(str(tmp_path / "projects"))
+
+
+def make_project() -> NovelProject:
+    return NovelProject(
+        project_name="テスト",
+        settings=[Setting("設定")],
+        selected_setting_index=0,
+        plots=[Plot(PLOT)],
+        selected_plot_index=0,
+        writing_config=WritingConfig("長編", "文学的", "明るい")
+    )
+
+
+def test_split_plot_into_beats_keeps_paragraph_order():
+    beats = split_plot_into_beats(PLOT, 3)
+
+    assert [b["title"] for b in beats] == ["第1章", "第2章", "第3章"]
+    assert "\n".join(b["beat"] for b in beats).split("\n") == ["発端", "旅立ち", "試練", "再会", "結末"]
+
+
+def test_split_plot_into_beats_with_more_chapters_than_paragraphs():
+    beats = split_plot_into_beats("発端\n\n結末", 4)
+
+    assert len(beats) == 4
+    assert all(b["beat"] for b in beats)
+
+
+def test_plan_chapters_falls_back_to_plot_paragraphs(storage):
+    project = make_project()
+
+    chapters = LongFormWriter(ScriptedClient(beats=None), storage).plan_chapters(project, 2)
+
+    assert [c.title for c in chapters] == ["第1章", "第2章"]
+    assert storage.load_project("テスト").chapters == chapters
+
+
+def test_write_carries_summary_and_bounded_tail(storage):
+    project = make_project()
+    client = ScriptedClient(beats=[{"title": f"章{i}", "beat": "展開"} for i in range(3)])
+    writer = LongFormWriter(client, storage)
+    writer.plan_chapters(project, 3)
+
+    text = writer.write(project)
+
+    assert [call["summary"] for call in client.chapter_calls] == ["", "+1", "+1+2"]
+    assert client.chapter_calls[0]["previous_tail"] == ""
+    assert client.chapter_calls[1]["previous_tail"] == "1" * PREVIOUS_TAIL_CHARS
+    # 最終章のあらすじは次の章がないので作らない
+    assert len(client.summaries) == 2
+    assert text == stitch_chapters(project.chapters)
+    assert text.startswith("## 章0\n\n111")
+    assert storage.load_project("テスト").novel_text == text
+
+
+def test_write_resumes_from_failed_chapter(storage):
+    project = make_project()
+    beats = [{"title": f"章{i}", "beat": "展開"} for i in range(3)]
+    writer = LongFormWriter(ScriptedClient(beats=beats, fail_at=1), storage)
+    writer.plan_chapters(project, 3)
+
+    with pytest.raises(RuntimeError):
+        writer.write(project)
+
+    saved = storage.load_project("テスト")
+    assert [bool(c.text) for c in saved.chapters] == [True, False, False]
+
+    client = ScriptedClient(beats=beats)
+    LongFormWriter(client, storage).write(saved)
+
+    assert [call["chapter_index"] for call in client.chapter_calls] == [1, 2]
+    assert all(c.text for c in storage.load_project("テスト").chapters)
@@ -0,0 +1,116 @@
+"""
+API呼び出しの計測のテスト
+"""
+import pytest
+
+from modules.metrics import Histogram, MetricsRegistry, instrumented, record_usage
+
+
+class Client:
+    """計測対象のメソッドを持つクライアント（AIClient と同じ使い方）"""
+
+    def __init__(self, metrics: MetricsRegistry):
+        self.metrics = metrics
+
+    @instrumented
+    def generate(self, text: str) -> str:
+        with self.metrics.call("model-a") as record:
+            record_usage(10, 5)
+            record.output_chars = len(text)
+        return text
+
+    @instrumented
+    def generate_twice(self, text: str) -> str:
+        # 内側のメソッドも外側の名前で記録される
+        return self.generate(text) + self.generate(text)
+
+    @instrumented
+    def stream(self, chunks: list):
+        return self.metrics.stream("model-b", iter(chunks))
+
+    @instrumented
+    def fail(self):
+        with self.metrics.call("model-a"):
+            error = RuntimeError("失敗")
+            error.kind = "rate_limit"
+            raise error
+
+
+def test_calls_are_recorded_under_outermost_method():
+    metrics = MetricsRegistry()
+    client = Client(metrics)
+
+    client.generate("あいう")
+    client.generate_twice("え")
+
+    stats = metrics.snapshot()
+    assert set(stats) == {("generate", "model-a"), ("generate_twice", "model-a")}
+    assert stats[("generate", "model-a")].calls == 1
+    assert stats[("generate", "model-a")].output_chars == 3
+    assert stats[("generate_twice", "model-a")].calls == 2
+    assert stats[("generate_twice", "model-a")].input_tokens == 20
+
+
+def test_stream_records_first_chunk_and_chars():
+    metrics = MetricsRegistry()
+
+    assert "".join(Client(metrics).stream(["あい", "うえお"])) == "あいうえお"
+
+    stats = metrics.snapshot()[("stream", "model-b")]
+    assert stats.calls == 1
+    assert stats.ttft.count == 1
+    assert stats.output_chars == 5
+
+
+def test_failures_are_counted_by_kind():
+    metrics = MetricsRegistry()
+    client = Client(metrics)
+    client.generate("あ")
+
+    with pytest.raises(RuntimeError):
+        client.fail()
+
+    stats = metrics.by_model()["model-a"]
+    assert stats.errors == {"rate_limit": 1}
+    assert stats.failure_rate == 0.5
+
+
+def test_log_can_be_replayed(tmp_path):
+    log_path = tmp_path / "metrics.jsonl"
+    metrics = MetricsRegistry(log_path=str(log_path))
+    client = Client(metrics)
+    client.generate("あいう")
+    "".join(client.stream(["え"]))
+    metrics.record_cache_hit("model-a")
+    with log_path.open("a", encoding="utf-8") as f:
+        f.write("{壊れた行\n")
+
+    replayed = MetricsRegistry.from_log(str(log_path))
+
+    for key, stats in metrics.snapshot().items():
+        assert replayed.snapshot()[key].calls == stats.calls
+        assert replayed.snapshot()[key].output_chars == stats.output_chars
+    assert replayed.by_model()["model-a"].cache_hits == 1
+
+
+def test_histogram_quantile():
+    histogram = Histogram(buckets=(1.0, 2.0, 4.0))
+    for value in (0.5, 1.5, 1.5, 3.0):
+        histogram.observe(value)
+
+    assert histogram.counts == [1, 2, 1, 0]
+    assert histogram.quantile(0.5) == pytest.approx(1.5)
+    assert histogram.quantile(1.0) == pytest.approx(4.0)
+    assert Histogram().quantile(0.5) is None
+
+
+def test_prometheus_text(tmp_path):
+    metrics = MetricsRegistry()
+    Client(metrics).generate("あ")
+
+    text = metrics.to_prometheus()
+
+    assert 'ai_client_calls_total{method="generate",model="model-a"} 1' in text
+    assert 'ai_client_latency_seconds_bucket{method="generate",model="model-a",le="+Inf"} 1' in text
+    path = metrics.export_prometheus(str(tmp_path / "metrics.prom"))
+    assert path.read_text(encoding="utf-8") == text
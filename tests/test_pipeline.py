@@ -0,0 +1,153 @@
+"""
+パイプライン全体のテスト
+偽プロバイダーで アイデア → 設定 → プロット → 登場人物 → プロンプト → 本文 を通しで実行し、
+各ステップの結果と保存したプロジェクトを確かめる
+"""
+import pytest
+
+from modules.ai_client import AIClient
+from modules.continuation import ContinuationWriter
+from modules.data_models import Character, IdeaFragment, NovelProject, Plot, Setting, WritingConfig
+from modules.long_form import LongFormWriter
+from modules.metrics import MetricsRegistry
+from modules.providers import FakeProvider, Provider
+from modules.retry import RequestExecutor
+from modules.storage import ProjectStorage
+from modules.streaming import stream_into_project
+
+
+@pytest.fixture
+def client():
+    # 待ち時間なしで応答する偽プロバイダー
+    return AIClient(
+        cache=None,
+        executor=RequestExecutor(),
+        metrics=MetricsRegistry(),
+        providers={
+            name: FakeProvider(name=name, seed=i, sleep=lambda seconds: None)
+            for i, name in enumerate(["gemini", "anthropic", "local"])
+        }
+    )
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return ProjectStorage(str(tmp_path / "projects"), debounce_seconds=0)
+
+
+def make_project(client, storage, name="テスト") -> NovelProject:
+    """6ステップを画面と同じ順序で進めて保存したプロジェクト"""
+    project = NovelProject(project_name=name)
+
+    # 1. アイデア
+    fragments = list(client.generate_idea_fragments_stream(10))
+    assert len(fragments) == 10 and all(fragments)
+    project.idea_fragments = [IdeaFragment(text, selected=i < 3) for i, text in enumerate(fragments)]
+    expanded = client.expand_ideas([f.text for f in project.idea_fragments if f.selected])
+    assert expanded
+    project.expanded_ideas.append(expanded)
+    assert storage.save_project(project)
+
+    # 2. 設定
+    setting = client.generate_setting(expanded)
+    assert setting
+    project.settings.append(Setting(setting))
+    project.selected_setting_index = 0
+    assert storage.save_project(project)
+
+    # 3. プロット
+    plot = client.generate_plot(setting)
+    assert plot
+    project.plots.append(Plot(plot))
+    project.selected_plot_index = 0
+    assert storage.save_project(project)
+
+    # 4. 登場人物
+    characters = client.generate_characters(setting, plot, 3)
+    assert len(characters) == 3
+    assert all(c["name"] and c["personality"] for c in characters)
+    project.characters = [Character(**c) for c in characters]
+    assert storage.save_project(project)
+
+    # 5. プロンプト
+    project.writing_config = WritingConfig("短編", "文学的", "ミステリアス", "haiku3.5")
+    character_data = [c.to_dict() for c in project.characters]
+    prompt = client.generate_novel_prompt(setting, plot, character_data, "短編", "文学的", "ミステリアス")
+    assert setting in prompt and plot in prompt
+    assert all(c.name in prompt for c in project.characters)
+    assert storage.save_project(project)
+
+    # 6. 本文
+    chunks = client.write_novel_stream(setting, plot, character_data, "短編", "文学的", "ミステリアス", "haiku3.5")
+    text = stream_into_project(chunks, project, storage)
+    assert text and project.novel_text == text
+    return project
+
+
+def test_six_steps_are_saved(client, storage):
+    project = make_project(client, storage)
+
+    loaded = storage.load_project("テスト")
+
+    assert [f.text for f in loaded.idea_fragments] == [f.text for f in project.idea_fragments]
+    assert sum(f.selected for f in loaded.idea_fragments) == 3
+    assert loaded.expanded_ideas == project.expanded_ideas
+    assert [s.text for s in loaded.settings] == [project.settings[0].text]
+    assert [p.text for p in loaded.plots] == [project.plots[0].text]
+    assert [c.name for c in loaded.characters] == [c.name for c in project.characters]
+    assert loaded.writing_config == project.writing_config
+    assert loaded.novel_text == project.novel_text
+    assert storage.list_projects() == ["テスト"]
+
+
+def test_long_form_chapters_carry_summaries(client, storage):
+    project = make_project(client, storage)
+    writer = LongFormWriter(client, storage)
+
+    chapters = writer.plan_chapters(project, 3)
+    assert len(chapters) == 3
+    text = writer.write(project)
+
+    loaded = storage.load_project("テスト")
+    assert all(chapter.text for chapter in loaded.chapters)
+    assert all(chapter.summary for chapter in loaded.chapters[:-1])
+    assert loaded.novel_text == text
+    assert all(f"## {chapter.title}" in text for chapter in loaded.chapters)
+
+
+def test_continuation_appends_and_keeps_summary_current(client, storage):
+    project = make_project(client, storage)
+    original = project.novel_text.rstrip()
+    writer = ContinuationWriter(client, storage)
+
+    added = writer.continue_novel(project, direction="旅に出る")
+    first_summary = project.novel_summary
+    writer.continue_novel(project)
+
+    loaded = storage.load_project("テスト")
+    assert added and loaded.novel_text.startswith(original + "\n\n" + added)
+    assert loaded.novel_summary == project.novel_summary
+    assert loaded.novel_summary.covered_chars > first_summary.covered_chars
+    assert [r.label for r in loaded.list_revisions("novel_text")][-1] == "続きを執筆"
+
+
+def test_continuation_refuses_chapter_novels(client, storage):
+    project = make_project(client, storage)
+    writer = LongFormWriter(client, storage)
+    writer.plan_chapters(project, 2)
+    writer.write(project)
+
+    with pytest.raises(ValueError):
+        ContinuationWriter(client, storage).continue_novel(project)
+
+
+def test_providers_must_implement_all_methods():
+    class GenerateOnly(Provider):
+        def available(self):
+            return True
+
+        def generate(self, model, prompt, max_tokens=None, json_mode=False):
+            return "本文"
+
+    with pytest.raises(TypeError):
+        GenerateOnly()
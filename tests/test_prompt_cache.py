@@ -0,0 +1,157 @@
+"""
+Anthropic のプロンプトキャッシュのテスト
+ローカルの Messages API のモックに送られたリクエストと、記録されたトークン数を確かめる
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("anthropic")
+
+from modules.ai_client import AIClient
+from modules.metrics import MetricsRegistry
+from modules.prompts import RenderedPrompt
+from modules.providers import AnthropicProvider, FakeProvider
+from modules.retry import RequestExecutor
+from modules.tokens import estimate_tokens
+
+
+class MessagesAPI(BaseHTTPRequestHandler):
+    """Messages API のモック（cache_control 付きの system ブロックを覚えて、usage を返す）"""
+
+    requests: list = []
+    cached: set = set()
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["content-length"])))
+        self.requests.append(body)
+
+        cache_read = cache_write = 0
+        for block in body.get("system") or []:
+            if block.get("cache_control"):
+                if block["text"] in self.cached:
+                    cache_read += 1000
+                else:
+                    self.cached.add(block["text"])
+                    cache_write += 1000
+        usage = {
+            "input_tokens": 100,
+            "output_tokens": 5,
+            "cache_read_input_tokens": cache_read,
+            "cache_creation_input_tokens": cache_write,
+        }
+        message = {
+            "id": "msg", "type": "message", "role": "assistant", "model": body["model"],
+            "content": [], "stop_reason": None, "stop_sequence": None, "usage": usage,
+        }
+
+        if body.get("stream"):
+            self.send_response(200)
+            self.send_header("content-type", "text/event-stream")
+            self.end_headers()
+            for event in (
+                {"type": "message_start", "message": message},
+                {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}},
+                {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": "続きです。"}},
+                {"type": "content_block_stop", "index": 0},
+                {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                 "usage": {"output_tokens": 5}},
+                {"type": "message_stop"},
+            ):
+                self.wfile.write(f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode())
+            return
+
+        data = json.dumps({
+            **message, "content": [{"type": "text", "text": "本文です。"}], "stop_reason": "end_turn"
+        }).encode()
+        self.send_response(200)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def messages_api(monkeypatch):
+    MessagesAPI.requests = []
+    MessagesAPI.cached = set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MessagesAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("ANTHROPIC_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}")
+    yield MessagesAPI
+    server.shutdown()
+
+
+@pytest.fixture
+def client(messages_api):
+    return AIClient(
+        cache=None,
+        executor=RequestExecutor(),
+        metrics=MetricsRegistry(),
+        providers={"anthropic": AnthropicProvider("test-key"), "gemini": FakeProvider("gemini", latency=0)}
+    )
+
+
+def prefix_with_tokens(tokens: int) -> str:
+    """見積もりのトークン数がちょうど tokens になる前半"""
+    text = ""
+    while estimate_tokens(text, "anthropic") < tokens:
+        text += "物"
+    return text
+
+
+@pytest.mark.parametrize("model, threshold", [
+    ("claude-sonnet-4-20250514", 1024),
+    ("claude-3-5-haiku-20241022", 2048),
+])
+def test_cache_control_only_at_or_above_threshold(model, threshold):
+    provider = AnthropicProvider("test-key")
+    prefix = prefix_with_tokens(threshold)
+    assert estimate_tokens(prefix[:-1], "anthropic") < threshold
+
+    params = provider._message_params(model, RenderedPrompt(prefix, "指示"), None)
+    assert params["system"] == [{"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}}]
+    assert params["messages"] == [{"role": "user", "content": "指示"}]
+
+    params = provider._message_params(model, RenderedPrompt(prefix[:-1], "指示"), None)
+    assert "system" not in params
+    assert params["messages"] == [{"role": "user", "content": prefix[:-1] + "指示"}]
+
+
+def test_prompt_cache_can_be_disabled():
+    provider = AnthropicProvider("test-key", prompt_cache=False)
+    prefix = prefix_with_tokens(4096)
+
+    assert "system" not in provider._message_params("claude-sonnet-4-20250514", RenderedPrompt(prefix, "指示"), None)
+
+
+def test_story_block_is_shared_and_usage_recorded(client, messages_api):
+    story = {
+        "setting": "海辺の町。" * 100,
+        "plot": "主人公は失った記憶を探して旅に出る。" * 150,
+        "characters": [{"name": f"人物{i}", "personality": "複雑な過去を持つ。" * 20} for i in range(6)],
+    }
+    style = {"style": "文学的", "tone": "暗い", "model": "sonnet4.5"}
+
+    client.write_chapter(**story, **style, chapter_index=0, chapter_count=3, title="出会い", beat="二人が出会う")
+    client.write_novel(**story, **style, length="短編")
+    client.write_novel(**story, **style, length="短編", force_fresh=True)
+    "".join(client.continue_novel_stream(**story, **style, summary="これまでのあらすじ", previous_tail="直前の本文"))
+
+    systems = [request["system"] for request in messages_api.requests]
+    assert len(systems) == 4
+    assert all(system == systems[0] for system in systems)
+    assert systems[0][0]["cache_control"] == {"type": "ephemeral"}
+    assert all(story["plot"] not in request["messages"][0]["content"] for request in messages_api.requests)
+
+    stats = client.metrics.snapshot()
+    assert stats[("write_chapter", "claude-sonnet-4-20250514")].cache_write_tokens == 1000
+    assert stats[("write_chapter", "claude-sonnet-4-20250514")].cache_read_tokens == 0
+    assert stats[("write_novel", "claude-sonnet-4-20250514")].cache_read_tokens == 2000
+    assert stats[("continue_novel_stream", "claude-sonnet-4-20250514")].cache_read_tokens == 1000
+    assert sum(s.input_tokens for s in stats.values()) == 400
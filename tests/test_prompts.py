@@ -0,0 +1,80 @@
+"""
+プロンプトのテンプレートのテスト
+"""
+import pytest
+
+from modules.prompts import PROMPTS, PromptRegistry, RenderedPrompt, format_characters
+
+CHAPTER_VALUES = {
+    "story": PROMPTS.render("story", setting="海辺の町", plot="記憶を探す旅", characters="- 灯: 無口"),
+    "chapter_count": 3, "summary": "", "previous_tail": "", "title": "出会い", "beat": "二人が出会う",
+    "length_guide": "3000-4000文字程度", "style": "文学的", "tone": "暗い", "ending": "",
+}
+
+
+@pytest.mark.parametrize("template", ["{count:>3}", "{a.b}", "{items[0]}", "{name!r}"])
+def test_invalid_placeholders_fail_at_registration(template):
+    with pytest.raises(ValueError, match="プレースホルダー"):
+        PromptRegistry().register("bad", template)
+
+
+def test_duplicate_names_are_rejected():
+    registry = PromptRegistry()
+    registry.register("same", "前半")
+
+    with pytest.raises(ValueError, match="すでに登録"):
+        registry.register("same", "別の前半")
+
+
+def test_missing_values_are_named():
+    registry = PromptRegistry()
+    registry.register("story", "{setting}\n", "{plot}と{tone}")
+
+    with pytest.raises(ValueError, match="plot, tone"):
+        registry.render("story", setting="設定")
+
+
+def test_rendered_prompt_is_a_str_with_prefix_and_suffix():
+    registry = PromptRegistry()
+    registry.register("story", "【設定】{setting}\n", "【指示】{instruction}")
+
+    prompt = registry.render("story", setting="海辺の町", instruction="書いてください")
+
+    assert isinstance(prompt, str) and isinstance(prompt, RenderedPrompt)
+    assert prompt == "【設定】海辺の町\n【指示】書いてください"
+    assert prompt.prefix == "【設定】海辺の町\n"
+    assert prompt.suffix == "【指示】書いてください"
+    assert prompt.template == "story"
+    stats = registry.stats()["story"]
+    assert (stats.renders, stats.prefix_chars, stats.suffix_chars) == (1, len(prompt.prefix), len(prompt.suffix))
+
+
+def test_template_without_placeholders_renders_as_is():
+    registry = PromptRegistry()
+    registry.register("static", "決まった指示文", "")
+
+    assert registry.render("static") == "決まった指示文"
+
+
+def test_chapter_prompts_share_prefix_across_chapters():
+    first = PROMPTS.render("chapter", chapter_number=1, **CHAPTER_VALUES)
+    second = PROMPTS.render("chapter", chapter_number=2, **dict(CHAPTER_VALUES, title="別れ", summary="あらすじ"))
+
+    assert first.prefix == second.prefix == CHAPTER_VALUES["story"]
+    assert "第1章「出会い」" in first.suffix and "第2章「別れ」" in second.suffix
+
+
+def test_all_registered_templates_render():
+    for name in PROMPTS.names():
+        template = PROMPTS.get(name)
+        prompt = template.render(**{field: f"<{field}>" for field in template.fields})
+        assert all(f"<{field}>" in prompt for field in template.fields)
+
+
+def test_format_characters():
+    characters = [{"name": "灯", "personality": "無口", "role": "主人公", "background": "灯台守"}, {"name": "凪"}]
+
+    assert format_characters(characters) == "- 灯: 無口\n- 凪: "
+    assert format_characters(characters, detailed=True).splitlines()[:3] == [
+        "- **灯** (主人公)", "  - 性格: 無口", "  - 背景: 灯台守"
+    ]
@@ -0,0 +1,169 @@
+"""
+再試行・レート制限のテスト
+偽プロバイダーで 429 やタイムアウトを起こし、再試行の回数・待ち時間・エラー種別を確かめる
+"""
+import pytest
+
+from modules.providers import FakeProvider, FakeRateLimitError
+from modules.retry import AIClientError, RequestExecutor, RetryPolicy, TokenBucket, classify_error
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": headers or {}})()
+        super().__init__(f"HTTP {status_code}")
+
+
+def make_executor(sleeps, max_attempts=3):
+    return RequestExecutor(
+        policy=RetryPolicy(max_attempts=max_attempts, base_delay=1.0, max_delay=30.0),
+        sleep=sleeps.append
+    )
+
+
+def generate(provider):
+    return lambda: provider.generate("fake", "テスト")
+
+
+def test_rate_limit_waits_retry_after_then_succeeds():
+    sleeps = []
+    provider = FakeProvider(errors=[FakeRateLimitError(retry_after=2.5)], latency=0, sleep=lambda s: None)
+
+    text = make_executor(sleeps).execute("fake", generate(provider))
+
+    assert text
+    assert provider.calls == 2
+    assert sleeps == [2.5]
+
+
+def test_retry_after_longer_than_max_delay_is_not_retried():
+    sleeps = []
+    provider = FakeProvider(errors=[FakeRateLimitError(retry_after=120)], latency=0, sleep=lambda s: None)
+
+    with pytest.raises(AIClientError) as info:
+        make_executor(sleeps).execute("fake", generate(provider))
+
+    assert info.value.kind == "rate_limit"
+    assert info.value.retry_after == 120
+    assert provider.calls == 1
+    assert sleeps == []
+
+
+def test_retry_after_is_waited_in_full():
+    sleeps = []
+    provider = FakeProvider(errors=[FakeRateLimitError(retry_after=29.5)], latency=0, sleep=lambda s: None)
+
+    make_executor(sleeps).execute("fake", generate(provider))
+
+    assert sleeps == [29.5]
+
+
+def test_waits_are_limited_by_total_delay():
+    sleeps = []
+    errors = [FakeRateLimitError(retry_after=25)] * 3
+    provider = FakeProvider(errors=errors, latency=0, sleep=lambda s: None)
+    executor = RequestExecutor(
+        policy=RetryPolicy(max_attempts=4, max_delay=30.0, max_total_delay=60.0), sleep=sleeps.append
+    )
+
+    with pytest.raises(AIClientError) as info:
+        executor.execute("fake", generate(provider))
+
+    assert info.value.kind == "rate_limit"
+    assert provider.calls == 3
+    assert sleeps == [25, 25]
+
+
+def test_timeouts_are_retried_until_max_attempts():
+    sleeps = []
+    provider = FakeProvider(errors=[TimeoutError("read timed out")] * 3, latency=0, sleep=lambda s: None)
+
+    with pytest.raises(AIClientError) as info:
+        make_executor(sleeps, max_attempts=3).execute("fake", generate(provider))
+
+    assert info.value.kind == "timeout"
+    assert info.value.attempts == 3
+    assert provider.calls == 3
+    # 指数バックオフ（フルジッター）: 1回目は 0〜1秒、2回目は 0〜2秒
+    assert len(sleeps) == 2
+    assert 0 <= sleeps[0] <= 1.0
+    assert 0 <= sleeps[1] <= 2.0
+
+
+def test_non_retryable_error_is_raised_immediately():
+    sleeps = []
+    provider = FakeProvider(errors=[HTTPError(401)], latency=0, sleep=lambda s: None)
+
+    with pytest.raises(AIClientError) as info:
+        make_executor(sleeps).execute("fake", generate(provider))
+
+    assert info.value.kind == "auth"
+    assert info.value.status_code == 401
+    assert provider.calls == 1
+    assert sleeps == []
+
+
+def test_stream_is_retried_before_first_chunk():
+    sleeps = []
+    provider = FakeProvider(errors=[FakeRateLimitError(retry_after=1.0)], latency=0, sleep=lambda s: None)
+
+    chunks = list(make_executor(sleeps).stream("fake", lambda: provider.stream("fake", "テスト")))
+
+    assert chunks
+    assert provider.calls == 2
+    assert sleeps == [1.0]
+
+
+def test_stream_is_not_retried_after_first_chunk():
+    sleeps = []
+    provider = FakeProvider(interrupt_after_chunks=1, latency=0, sleep=lambda s: None)
+    received = []
+
+    with pytest.raises(AIClientError) as info:
+        for chunk in make_executor(sleeps).stream("fake", lambda: provider.stream("fake", "テスト")):
+            received.append(chunk)
+
+    assert info.value.kind == "connection"
+    assert len(received) == 1
+    assert provider.calls == 1
+    assert sleeps == []
+
+
+@pytest.mark.parametrize("error, kind", [
+    (HTTPError(429), "rate_limit"),
+    (HTTPError(529), "server"),
+    (HTTPError(503), "server"),
+    (HTTPError(400), "invalid_request"),
+    (HTTPError(403), "auth"),
+    (TimeoutError(), "timeout"),
+    (ConnectionResetError(), "connection"),
+    (ValueError("blocked"), "invalid_response"),
+    (RuntimeError(), "unknown"),
+])
+def test_classify_error(error, kind):
+    assert classify_error("fake", error).kind == kind
+
+
+def test_classify_error_reads_retry_after_header():
+    error = classify_error("fake", HTTPError(429, headers={"retry-after": "3"}))
+
+    assert error.retry_after == 3.0
+    assert error.retryable
+
+
+def test_token_bucket_waits_for_refill(monkeypatch):
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    monkeypatch.setattr("modules.retry.time.monotonic", lambda: now[0])
+    bucket = TokenBucket(rate=2.0, capacity=1.0)
+
+    bucket.acquire(sleep)
+    bucket.acquire(sleep)
+
+    assert sleeps == [0.5]
@@ -0,0 +1,86 @@
+"""
+保存形式のテスト
+"""
+import sys
+from dataclasses import asdict
+
+import pytest
+
+from modules import serialization
+from modules.data_models import Character, NovelProject, Setting
+from modules.storage import ProjectStorage
+
+DATA = {"settings": [{"text": "設定", "created_at": "2024-01-01T00:00:00"}], "count": 3}
+
+
+@pytest.mark.parametrize("storage_format", ["json", "gzip"])
+def test_roundtrip(storage_format):
+    assert serialization.loads(serialization.dumps(DATA, storage_format)) == DATA
+    assert serialization.loads(serialization.dumps("本文", storage_format, text=True), text=True) == "本文"
+
+
+@pytest.mark.parametrize("storage_format, package", [("zstd", "zstandard"), ("msgpack", "msgpack")])
+def test_optional_formats(storage_format, package):
+    pytest.importorskip(package)
+
+    blob = serialization.dumps(DATA, storage_format)
+
+    assert serialization.unpack(blob)[1] == storage_format
+    assert serialization.loads(blob) == DATA
+
+
+@pytest.mark.parametrize("storage_format, package", [("zstd", "zstandard"), ("msgpack", "msgpack")])
+def test_missing_package_is_reported(storage_format, package, monkeypatch):
+    monkeypatch.setitem(sys.modules, package, None)
+
+    with pytest.raises(RuntimeError, match=package):
+        serialization.dumps(DATA, storage_format)
+
+
+def test_format_is_detected_from_leading_bytes():
+    assert serialization.unpack(serialization.dumps(DATA, "gzip"))[1] == "gzip"
+    assert serialization.unpack(serialization.dumps(DATA, "json"))[1] == "json"
+    # msgpack の目印は UTF-8 のテキストの先頭には現れない
+    with pytest.raises(UnicodeDecodeError):
+        serialization.MSGPACK_MAGIC.decode("utf-8")
+
+
+def test_gzip_output_is_stable():
+    assert serialization.dumps(DATA, "gzip") == serialization.dumps(DATA, "gzip")
+
+
+def test_format_from_env(monkeypatch):
+    monkeypatch.setenv("AI_NOVELIST_STORAGE_FORMAT", " GZIP ")
+    assert serialization.format_from_env() == "gzip"
+
+    monkeypatch.setenv("AI_NOVELIST_STORAGE_FORMAT", "bz2")
+    with pytest.raises(ValueError):
+        serialization.format_from_env()
+
+
+def test_to_data_matches_asdict_without_copying():
+    characters = [Character("灯" * 100, "無口")]
+
+    data = serialization.to_data(characters)
+
+    assert data == [asdict(c) for c in characters]
+    assert data[0]["name"] is characters[0].name
+
+
+def test_switching_format_keeps_old_files_readable(tmp_path):
+    base_dir = str(tmp_path / "projects")
+    ProjectStorage(base_dir, debounce_seconds=0, storage_format="json").save_project(
+        NovelProject("テスト", novel_text="本文", settings=[Setting("設定")])
+    )
+
+    storage = ProjectStorage(base_dir, debounce_seconds=0, storage_format="gzip")
+    project = storage.load_project("テスト")
+    assert project.novel_text == "本文"
+
+    project.settings.append(Setting("別の設定"))
+    storage.save_project(project)
+
+    project_dir, = (path for path in (tmp_path / "projects").iterdir() if path.is_dir())
+    assert (project_dir / "settings.json").read_bytes().startswith(serialization.GZIP_MAGIC)
+    assert not (project_dir / "novel_text.txt").read_bytes().startswith(serialization.GZIP_MAGIC)
+    assert [s.text for s in ProjectStorage(base_dir).load_project("テスト").settings] == ["設定", "別の設定"]
@@ -0,0 +1,88 @@
+"""
+SQLiteによるプロジェクトの保存のテスト
+"""
+import pytest
+
+from modules.data_models import Chapter, Character, IdeaFragment, NovelProject, Plot, Setting, WritingConfig
+from modules.sqlite_storage import SQLiteProjectStorage, migrate_from_files
+from modules.storage import ProjectStorage, create_storage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return SQLiteProjectStorage(str(tmp_path / "projects.db"), debounce_seconds=0)
+
+
+def make_project(name="テスト") -> NovelProject:
+    return NovelProject(
+        project_name=name,
+        idea_fragments=[IdeaFragment("断片", selected=True)],
+        expanded_ideas=["膨らませたアイデア"],
+        settings=[Setting("設定A"), Setting("設定B")],
+        selected_setting_index=1,
+        plots=[Plot("プロット")],
+        selected_plot_index=0,
+        characters=[Character("灯", "無口", background="灯台守", role="主人公")],
+        writing_config=WritingConfig("長編", "文学的", "暗い", "sonnet4.5"),
+        novel_text="本文",
+        chapters=[Chapter(title="第1章", beat="出会い", text="本文", summary="あらすじ")]
+    )
+
+
+def test_roundtrip(storage):
+    project = make_project()
+    assert storage.save_project(project)
+
+    loaded = storage.load_project("テスト")
+
+    assert not loaded.is_loaded("novel_text")
+    assert loaded.to_dict() == project.to_dict()
+
+
+def test_list_project_info_counts_without_loading(storage):
+    storage.save_project(make_project("A"))
+    storage.save_project(NovelProject("B"))
+
+    infos = {info.name: info for info in storage.list_project_info()}
+
+    assert storage.list_projects() == ["A", "B"]
+    assert infos["A"].counts["settings"] == 2
+    assert infos["A"].counts["novel_text"] == len("本文")
+    assert infos["A"].has_writing_config
+    assert not infos["B"].has_writing_config
+
+
+def test_delete_removes_item_rows(storage):
+    storage.save_project(make_project())
+
+    assert storage.delete_project("テスト")
+
+    assert not storage.project_exists("テスト")
+    assert storage.load_project("テスト") is None
+    conn = storage._connection()
+    assert conn.execute("SELECT COUNT(*) FROM settings").fetchone() == (0,)
+    assert not storage.delete_project("テスト")
+
+
+def test_migrate_from_files_keeps_updated_at(tmp_path, storage):
+    source = ProjectStorage(str(tmp_path / "projects"), debounce_seconds=0)
+    source.save_project(make_project())
+    updated_at = source.load_project("テスト").updated_at
+
+    assert migrate_from_files(source, storage) == 1
+    assert migrate_from_files(source, storage) == 0
+
+    loaded = storage.load_project("テスト")
+    assert loaded.updated_at == updated_at
+    assert [s.text for s in loaded.settings] == ["設定A", "設定B"]
+    assert loaded.novel_text == "本文"
+
+
+def test_create_storage_selects_backend(tmp_path, monkeypatch):
+    monkeypatch.setenv("AI_NOVELIST_STORAGE", "sqlite")
+    monkeypatch.setenv("AI_NOVELIST_SQLITE_PATH", str(tmp_path / "app.db"))
+    assert isinstance(create_storage(), SQLiteProjectStorage)
+
+    monkeypatch.setenv("AI_NOVELIST_STORAGE", "postgres")
+    with pytest.raises(ValueError):
+        create_storage()
@@ -0,0 +1,165 @@
+"""
+プロジェクトの保存（フォルダ形式）のテスト
+"""
+import json
+
+import pytest
+
+from modules import storage as storage_module
+from modules.data_models import NovelProject, Setting
+from modules.storage import ProjectStorage
+
+
+@pytest.fixture
+def base_dir(tmp_path):
+    return tmp_path / "projects"
+
+
+def file_ids(base_dir) -> dict:
+    """プロジェクトフォルダのファイルごとの inode（アトミックな書き込みで置き換えると変わる）"""
+    project_dir, = (path for path in base_dir.iterdir() if path.is_dir())
+    return {path.name: path.stat().st_ino for path in project_dir.iterdir()}
+
+
+def count_calls(monkeypatch, owner, attribute: str) -> list:
+    """owner.attribute の呼び出しを記録する（元の処理はそのまま行う）"""
+    original = getattr(owner, attribute)
+    calls = []
+
+    def wrapper(*args, **kwargs):
+        calls.append(args)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(owner, attribute, wrapper)
+    return calls
+
+
+def test_only_changed_sections_are_rewritten(base_dir):
+    storage = ProjectStorage(str(base_dir), debounce_seconds=0)
+    project = NovelProject("テスト", novel_text="本文" * 1000)
+    project.settings = [Setting("設定")]
+    storage.save_project(project)
+    before = file_ids(base_dir)
+
+    project.settings.append(Setting("別の設定"))
+    storage.save_project(project)
+    after = file_ids(base_dir)
+
+    changed = {name for name in after if after[name] != before.get(name)}
+    assert changed == {"settings.json", "manifest.json"}
+
+
+def test_sections_are_loaded_on_first_access(base_dir):
+    storage = ProjectStorage(str(base_dir), debounce_seconds=0)
+    storage.save_project(NovelProject("テスト", novel_text="本文"))
+
+    loaded = storage.load_project("テスト")
+
+    assert not loaded.is_loaded("novel_text")
+    before = file_ids(base_dir)
+    storage.save_project(loaded)
+    assert file_ids(base_dir) == before
+    assert loaded.novel_text == "本文"
+    assert loaded.is_loaded("novel_text")
+
+
+def test_legacy_file_is_migrated(base_dir):
+    base_dir.mkdir()
+    (base_dir / "古い.json").write_text(
+        json.dumps({"project_name": "古い", "novel_text": "本文"}, ensure_ascii=False), encoding="utf-8"
+    )
+    storage = ProjectStorage(str(base_dir), debounce_seconds=0)
+
+    assert storage.list_projects() == ["古い"]
+    assert storage.load_project("古い").novel_text == "本文"
+    assert (base_dir / "古い.json.bak").exists()
+
+
+def test_failed_migration_is_not_retried(base_dir, monkeypatch):
+    base_dir.mkdir()
+    (base_dir / "壊れた.json").write_text("{壊れたJSON", encoding="utf-8")
+    storage = ProjectStorage(str(base_dir), debounce_seconds=0)
+    storage.save_project(NovelProject("テスト"))
+
+    assert storage.list_projects() == ["テスト"]
+    assert (base_dir / "壊れた.json.failed").exists()
+    assert not (base_dir / "壊れた.json").exists()
+
+    rebuilds = count_calls(monkeypatch, ProjectStorage, "_rebuild_index")
+    assert storage.list_projects() == ["テスト"]
+    assert ProjectStorage(str(base_dir)).list_projects() == ["テスト"]
+    assert rebuilds == []
+
+
+def test_folder_is_listed_only_when_it_changes(base_dir, monkeypatch):
+    storage = ProjectStorage(str(base_dir), debounce_seconds=0)
+    storage.save_project(NovelProject("テスト"))
+    storage.list_projects()
+    listdirs = count_calls(monkeypatch, storage_module.os, "listdir")
+
+    for _ in range(3):
+        assert storage.list_projects() == ["テスト"]
+    assert listdirs == []
+
+    # 他のプロセスの保存（索引の追記）やフォルダの追加があれば調べ直す
+    ProjectStorage(str(base_dir), debounce_seconds=0).save_project(NovelProject("別のプロジェクト"))
+    assert sorted(storage.list_projects()) == ["テスト", "別のプロジェクト"]
+    assert len(listdirs) == 1
+
+
+def test_legacy_file_is_kept_when_write_fails(base_dir, monkeypatch):
+    base_dir.mkdir()
+    legacy_path = base_dir / "古い.json"
+    legacy_path.write_text(
+        json.dumps({"project_name": "古い", "novel_text": "本文"}, ensure_ascii=False), encoding="utf-8"
+    )
+    storage = ProjectStorage(str(base_dir), debounce_seconds=0)
+    # ディスクの空き不足などの一時的な失敗（_write は失敗を False で返す）
+    monkeypatch.setattr(storage, "_write", lambda project: False)
+
+    assert storage.list_projects() == []
+    assert legacy_path.exists()
+    assert not (base_dir / "古い.json.failed").exists()
+
+    monkeypatch.undo()
+    assert storage.list_projects() == ["古い"]
+    assert storage.load_project("古い").novel_text == "本文"
+
+
+def test_legacy_file_does_not_overwrite_folder(base_dir):
+    storage = ProjectStorage(str(base_dir), debounce_seconds=0)
+    storage.save_project(NovelProject("テスト", novel_text="新しい本文"))
+    (base_dir / "テスト.json").write_text(
+        json.dumps({"project_name": "テスト", "novel_text": "古い本文"}, ensure_ascii=False), encoding="utf-8"
+    )
+
+    assert ProjectStorage(str(base_dir)).list_projects() == ["テスト"]
+    assert storage.load_project("テスト").novel_text == "新しい本文"
+    assert (base_dir / "テスト.json.bak").exists()
+    assert not (base_dir / "テスト.json").exists()
+
+
+def test_requested_save_writes_content_at_request_time(base_dir):
+    storage = ProjectStorage(str(base_dir), debounce_seconds=60)
+    storage.save_project(NovelProject("テスト", novel_text="本文", settings=[Setting("設定")]))
+    project = storage.load_project("テスト")
+    project.settings.append(Setting("別の設定"))
+
+    storage.request_save(project)
+    # 保存待ちの間の編集は、次の保存要求までは書き込まれない
+    project.settings[0].text = "書きかけ"
+    project.novel_text = "書きかけの本文"
+    storage.flush()
+
+    loaded = ProjectStorage(str(base_dir)).load_project("テスト")
+    assert [s.text for s in loaded.settings] == ["設定", "別の設定"]
+    assert loaded.novel_text == "本文"
+
+
+def test_storage_backends_must_implement_all_methods():
+    class PartialStorage(storage_module.BaseProjectStorage):
+        def load_project(self, project_name):
+            return None
+
+    with pytest.raises(TypeError):
+        PartialStorage()
@@ -0,0 +1,57 @@
+"""
+ストリーミング執筆のテスト
+"""
+import pytest
+
+from modules.data_models import NovelProject
+from modules.providers import FakeProvider
+from modules.storage import ProjectStorage
+from modules.streaming import StreamInterrupted, stream_into_project
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return ProjectStorage(str(tmp_path / "projects"), debounce_seconds=0)
+
+
+def make_project(storage) -> NovelProject:
+    project = NovelProject("テスト", novel_text="前の版の本文")
+    storage.save_project(project)
+    return project
+
+
+def test_failure_before_first_chunk_keeps_previous_text(storage):
+    project = make_project(storage)
+    provider = FakeProvider(errors=[ConnectionResetError("reset")], sleep=lambda seconds: None)
+
+    with pytest.raises(StreamInterrupted) as info:
+        stream_into_project(provider.stream("fake", "本文"), project, storage)
+
+    assert info.value.received_chars == 0
+    assert isinstance(info.value.error, ConnectionResetError)
+    assert storage.load_project("テスト").novel_text == "前の版の本文"
+
+
+def test_failure_after_chunks_saves_received_text(storage):
+    project = make_project(storage)
+    provider = FakeProvider(chunk_chars=10, interrupt_after_chunks=3, sleep=lambda seconds: None)
+
+    with pytest.raises(StreamInterrupted) as info:
+        stream_into_project(provider.stream("fake", "本文"), project, storage, base="冒頭\n\n")
+
+    assert info.value.received_chars == 30
+    saved = storage.load_project("テスト").novel_text
+    assert saved.startswith("冒頭\n\n") and len(saved) == len("冒頭\n\n") + 30
+
+
+def test_updates_receive_text_so_far_and_result_is_saved(storage):
+    project = make_project(storage)
+    updates = []
+
+    text = stream_into_project(
+        iter(["あい", "", "うえ", "お"]), project, storage, on_update=updates.append, base="冒頭"
+    )
+
+    assert updates == ["あい", "あいうえ", "あいうえお"]
+    assert text == "冒頭あいうえお"
+    assert storage.load_project("テスト").novel_text == "冒頭あいうえお"
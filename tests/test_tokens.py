@@ -0,0 +1,83 @@
+"""
+トークン数と料金の見積もりのテスト
+"""
+import pytest
+
+from modules.ai_client import AIClient
+from modules.retry import AIClientError
+from modules.tokens import (
+    FALLBACK_SPEC, MODEL_SPECS, TOKEN_RATES, cost_usd, estimate_call, estimate_prose_tokens,
+    estimate_tokens, model_spec, split_to_token_budget
+)
+
+HAIKU = "claude-3-5-haiku-20241022"
+STORY = {"setting": "海辺の町", "plot": "記憶を探す旅", "characters": [], "style": "文学的", "tone": "暗い"}
+
+
+def test_estimate_tokens_by_character_kind():
+    rates = TOKEN_RATES["anthropic"]
+
+    assert estimate_tokens("", "anthropic") == rates.overhead
+    assert estimate_tokens("漢字漢字", "anthropic") == round(4 * rates.kanji) + rates.overhead
+    assert estimate_tokens("abcd", "anthropic") == round(4 * rates.ascii) + rates.overhead
+    # 日本語は Gemini のほうが少ないトークン数で数えられる
+    assert estimate_tokens("吾輩は猫である。" * 50, "gemini") < estimate_tokens("吾輩は猫である。" * 50, "anthropic")
+
+
+def test_unknown_models_use_fallback_spec():
+    assert model_spec("unknown-model") == FALLBACK_SPEC
+    assert model_spec(HAIKU) == MODEL_SPECS[HAIKU]
+
+
+def test_estimate_call_flags_truncation_and_context():
+    long_output = estimate_call(HAIKU, "プロンプト", expected_output_chars=15000)
+    assert long_output.output_tokens == estimate_prose_tokens(15000, "anthropic")
+    assert long_output.output_may_truncate
+    assert long_output.fits_context
+    # 料金は出力の上限までで計算する
+    assert long_output.cost_usd == pytest.approx(
+        cost_usd(HAIKU, long_output.input_tokens, long_output.max_output_tokens)
+    )
+
+    huge_prompt = estimate_call(HAIKU, "物" * 200_000, expected_output_chars=0)
+    assert not huge_prompt.fits_context
+
+
+def test_max_output_tokens_is_capped_by_model():
+    assert estimate_call(HAIKU, "", 0, max_output_tokens=100_000).max_output_tokens == 8_192
+    assert estimate_call(HAIKU, "", 0, max_output_tokens=1000).max_output_tokens == 1000
+
+
+def test_split_to_token_budget():
+    text = "".join(f"第{i}段落。" + "物語が続く。" * 30 + "\n" for i in range(20))
+
+    chunks = split_to_token_budget(text, 500)
+
+    assert len(chunks) > 1
+    assert "".join(chunks) == text
+    assert all(estimate_tokens(chunk) <= 500 for chunk in chunks)
+
+
+def test_split_to_token_budget_cuts_long_paragraphs():
+    chunks = split_to_token_budget("物" * 5000, 500)
+
+    assert "".join(chunks) == "物" * 5000
+    assert all(estimate_tokens(chunk) <= 500 for chunk in chunks)
+
+
+def test_estimate_novel_warns_about_output_limit():
+    client = AIClient(cache=None)
+
+    assert client.estimate_novel(**STORY, length="長編", model="haiku3.5").output_may_truncate
+    assert not client.estimate_novel(**STORY, length="短編", model="haiku3.5").output_may_truncate
+
+
+def test_prompt_too_large_is_refused_before_sending(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    client = AIClient(cache=None)
+    story = dict(STORY, plot="物" * 200_000)
+
+    with pytest.raises(AIClientError) as info:
+        "".join(client.write_novel_stream(**story, length="短編", model="haiku3.5"))
+
+    assert info.value.kind == "prompt_too_large"